@@ -49,12 +49,18 @@ class Authorizer:
     def can_edit_code(self, user_id):
         return self.is_admin(user_id) and self._is_allowed_internal(user_id, self._code_editor_users)
 
-    def is_allowed(self, user_id, allowed_users):
+    def get_groups(self, user_id):
+        return self._groups_provider.get_groups(user_id)
+
+    def is_allowed(self, user_id, allowed_users, user_groups=None):
+        """
+        :param user_groups: precalculated groups of the user (see get_groups), to avoid their lookup on each call
+        """
         normalized_users = _normalize_users(allowed_users)
 
-        return self._is_allowed_internal(user_id, normalized_users)
+        return self._is_allowed_internal(user_id, normalized_users, user_groups)
 
-    def _is_allowed_internal(self, user_id, normalized_allowed_users):
+    def _is_allowed_internal(self, user_id, normalized_allowed_users, user_groups=None):
         if not normalized_allowed_users:
             return False
 
@@ -71,7 +77,8 @@ class Authorizer:
             if _matches_email_domain_pattern(normalized_user, pattern):
                 return True
 
-        user_groups = self._groups_provider.get_groups(user_id)
+        if user_groups is None:
+            user_groups = self._groups_provider.get_groups(user_id)
         if not user_groups:
             return False
 
@@ -204,3 +211,7 @@ def _exclude_unknown_groups_from_admin_users(admin_users, known_groups):
 
 def is_same_user(user_id1, user_id2):
     return _normalize_user(user_id1) == _normalize_user(user_id2)
+
+
+def normalize_user_id(user_id):
+    return _normalize_user(user_id)
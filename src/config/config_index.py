@@ -0,0 +1,192 @@
+import json
+import logging
+import os
+import threading
+
+from utils import file_utils
+
+LOGGER = logging.getLogger('script_server.config_index')
+
+
+def is_config_file(path):
+    lower_path = path.lower()
+    return lower_path.endswith('.json') or lower_path.endswith('.yaml')
+
+
+class IndexedConfig:
+    def __init__(self, path, stamp, config_object, short_config, parsing_failed):
+        self.path = path
+        self.stamp = stamp
+        self.config_object = config_object
+        # None for hidden or invalid configs
+        self.short_config = short_config
+        # True, if the file is not a valid json
+        self.parsing_failed = parsing_failed
+
+
+class ConfigIndex:
+    """
+    In-memory index of script config files: path -> parsed config object and short config.
+
+    On every refresh the folder is listed and files are checked via stat, only new and modified files
+    are read and parsed. Lookups by script name are served from a dictionary.
+
+    When the folder is watched, refresh is skipped until the index is invalidated.
+
+    parse_function(path, content) should return a tuple (config_object, short_config)
+    """
+
+    def __init__(self, configs_folder, parse_function):
+        self._configs_folder = configs_folder
+        self._parse_function = parse_function
+
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._sorted_entries = []
+        self._entries_by_name = {}
+
+        self._watched = False
+        self._dirty = True
+        self._loaded = False
+
+        # incremented on every change of the indexed configs
+        self.version = 0
+
+    def set_watched(self, watched):
+        with self._lock:
+            self._watched = watched
+            self._dirty = True
+
+    def invalidate(self):
+        self._dirty = True
+
+    def refresh(self):
+        """
+        :return: set of script names (old and new), which configs were added, modified or removed
+        """
+        with self._lock:
+            if self._watched and not self._dirty:
+                return set()
+
+            # reset before listing, so that changes during the listing are not lost
+            self._dirty = False
+
+            stamps = self._list_files()
+
+            changed_names = set()
+            changed = False
+
+            for path in list(self._entries.keys()):
+                if path not in stamps:
+                    _add_name(self._entries.pop(path), changed_names)
+                    changed = True
+
+            for path, stamp in stamps.items():
+                entry = self._entries.get(path)
+                if (entry is not None) and (entry.stamp == stamp):
+                    continue
+
+                if entry is not None:
+                    _add_name(entry, changed_names)
+
+                new_entry = self._read_entry(path, stamp)
+                if new_entry is not None:
+                    self._entries[path] = new_entry
+                    _add_name(new_entry, changed_names)
+                else:
+                    self._entries.pop(path, None)
+
+                changed = True
+
+            if changed:
+                self._rebuild_lookups()
+
+            if not self._loaded:
+                # initial loading is not a change
+                self._loaded = True
+                return set()
+
+            return changed_names
+
+    def get_all(self):
+        """
+        :return: all the indexed configs, sorted by path
+        """
+        with self._lock:
+            return self._sorted_entries
+
+    def get(self, path):
+        with self._lock:
+            return self._entries.get(path)
+
+    def find_by_name(self, name):
+        """
+        Parsing-failed configs are not indexed by name, since their name can depend on a user
+        :return: the first (sorted by path) successfully parsed config with the name or None
+        """
+        with self._lock:
+            return self._entries_by_name.get(name)
+
+    def get_failed(self):
+        with self._lock:
+            return [entry for entry in self._sorted_entries if entry.parsing_failed]
+
+    def _list_files(self):
+        stamps = {}
+
+        # Read config file from within directories too
+        for root, _, files in os.walk(self._configs_folder, topdown=True):
+            for name in files:
+                path = os.path.join(root, name)
+                if not is_config_file(path):
+                    continue
+
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    # file was removed during listing
+                    continue
+
+                stamps[path] = (stat.st_mtime_ns, stat.st_size)
+
+        return stamps
+
+    def _read_entry(self, path, stamp):
+        try:
+            content = file_utils.read_file(path)
+        except:
+            LOGGER.exception("Couldn't read the file: " + path)
+            return None
+
+        try:
+            (config_object, short_config) = self._parse_function(path, content)
+            return IndexedConfig(path, stamp, config_object, short_config, False)
+
+        except json.decoder.JSONDecodeError:
+            LOGGER.exception('Cannot parse script config file: ' + path)
+            return IndexedConfig(path, stamp, None, None, True)
+
+        except:
+            LOGGER.exception('Could not load script config: ' + path)
+            return IndexedConfig(path, stamp, None, None, False)
+
+    def _rebuild_lookups(self):
+        self.version += 1
+
+        self._sorted_entries = [self._entries[path] for path in sorted(self._entries.keys())]
+
+        entries_by_name = {}
+        for entry in self._sorted_entries:
+            if entry.short_config is None:
+                continue
+
+            name = entry.short_config.name
+            if name not in entries_by_name:
+                entries_by_name[name] = entry
+
+        self._entries_by_name = entries_by_name
+
+
+def _add_name(entry, names):
+    if entry.short_config is not None:
+        names.add(entry.short_config.name)
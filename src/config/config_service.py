@@ -1,17 +1,26 @@
+import copy
+import hashlib
 import json
 import logging
 import os
 import re
 import shutil
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import NamedTuple, Optional
+from typing import NamedTuple, Optional, List
 
-from auth.authorization import Authorizer
+from auth.authorization import Authorizer, normalize_user_id
+from config.config_index import ConfigIndex
 from config.exceptions import InvalidConfigException
 from model import script_config
+from model.config_template import ConfigTemplate
+from model.script_output_cache import ScriptOutputCache
 from model.model_helper import InvalidFileException
 from model.script_config import get_sorted_config, ShortConfig, create_failed_short_config
-from utils import os_utils, file_utils, process_utils, custom_json, custom_yaml
+from utils import os_utils, file_utils, process_utils, custom_json, custom_yaml, file_watcher
 from utils.file_utils import to_filename
 from utils.process_utils import ProcessInvoker
 from utils.string_utils import is_blank, strip
@@ -25,12 +34,30 @@ WORKING_DIR_FIELD = 'working_directory'
 
 LOGGER = logging.getLogger('config_service')
 
+# a cached list per user and per group set
+_MAX_CACHED_VISIBLE_CONFIGS = 1000
+
+
 class ConfigSearchResult(NamedTuple):
     short_config: ShortConfig
     path: str
     config_object: any
 
 
+class VisibleConfigs(NamedTuple):
+    configs: List[ShortConfig]
+    # hash of the visible configs, which changes only when the list changes
+    etag: str
+
+
+def _calculate_configs_etag(configs):
+    configs_hash = hashlib.sha1()
+    for config in configs:
+        configs_hash.update(repr((config.name, config.group, config.parsing_failed)).encode('utf-8'))
+
+    return configs_hash.hexdigest()
+
+
 def _script_name_to_file_name(script_name):
     filename = _escape_characters_in_filename(script_name)
     return filename + '.json'
@@ -60,18 +87,89 @@ class ConfigService:
             authorizer,
             conf_folder,
             group_scripts_by_folder: bool,
-            process_invoker: ProcessInvoker) -> None:
+            process_invoker: ProcessInvoker,
+            script_output_cache: ScriptOutputCache = None) -> None:
 
         self._authorizer = authorizer  # type: Authorizer
         self._script_configs_folder = os.path.join(conf_folder, 'runners')
         self._scripts_folder = os.path.join(conf_folder, 'scripts')
         self._scripts_deleted_folder = os.path.join(conf_folder, 'deleted')
         self._process_invoker = process_invoker
+        self._script_output_cache = script_output_cache
         self._group_scripts_by_folder = group_scripts_by_folder
 
         file_utils.prepare_folder(self._script_configs_folder)
         file_utils.prepare_folder(self._scripts_deleted_folder)
 
+        self._config_index = ConfigIndex(self._script_configs_folder, self._parse_config_file)
+        self._change_listeners = []
+        self._watcher = None
+
+        self._visible_configs_lock = threading.Lock()
+        self._visible_configs_cache = OrderedDict()
+        self._visible_configs_version = None
+
+        self._config_templates_lock = threading.Lock()
+        self._config_templates = weakref.WeakValueDictionary()
+        self._refresh_executor = None
+
+    def start_watching(self, poll_period_sec=file_watcher.DEFAULT_POLL_PERIOD_SEC):
+        """
+        Keeps configs up to date in background, so that requests don't need to check the configs folder.
+        Change listeners are notified as soon as changes are detected.
+        """
+        if self._watcher is not None:
+            return
+
+        self._refresh_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='config-refresh')
+        self._watcher = file_watcher.watch_folder(
+            self._script_configs_folder,
+            self._on_configs_folder_changed,
+            poll_period_sec)
+        self._config_index.set_watched(True)
+
+    def stop_watching(self):
+        if self._watcher is None:
+            return
+
+        self._config_index.set_watched(False)
+        self._watcher.stop()
+        self._watcher = None
+
+        self._refresh_executor.shutdown(wait=False)
+        self._refresh_executor = None
+
+    def add_change_listener(self, listener):
+        """
+        :param listener: function(changed_names), where changed_names is a set of added/modified/removed script names.
+            Can be called from any thread
+        """
+        self._change_listeners.append(listener)
+
+    def remove_change_listener(self, listener):
+        if listener in self._change_listeners:
+            self._change_listeners.remove(listener)
+
+    def _on_configs_folder_changed(self):
+        self._config_index.invalidate()
+
+        refresh_executor = self._refresh_executor
+        if refresh_executor is not None:
+            refresh_executor.submit(self._refresh_configs)
+
+    def _refresh_configs(self):
+        changed_names = self._config_index.refresh()
+        if not changed_names:
+            return
+
+        LOGGER.info('Script configs changed: ' + str(sorted(changed_names)))
+
+        for listener in list(self._change_listeners):
+            try:
+                listener(changed_names)
+            except:
+                LOGGER.exception('Failed to notify about config changes')
+
     def load_config(self, name, user):
         self._check_admin_access(user)
 
@@ -107,6 +205,7 @@ class ConfigService:
 
         LOGGER.info('Creating new script config "' + name + '" in ' + unique_path)
         self._save_config(config, unique_path)
+        self._config_index.invalidate()
 
     def update_config(self, user, config, filename, uploaded_script):
         self._check_admin_access(user)
@@ -138,6 +237,7 @@ class ConfigService:
 
         LOGGER.info('Updating script config "' + name + '" in ' + original_file_path)
         self._save_config(config, original_file_path)
+        self._config_index.invalidate()
 
     def read_short_config(self, config_json, file_path):
         return script_config.read_short(
@@ -168,6 +268,7 @@ class ConfigService:
             f'Archiving script config "{name}" from {path} to {unique_archive_file_path}'
         )
         shutil.move(path, unique_archive_file_path)
+        self._config_index.invalidate()
 
     def load_script_code(self, script_name, user):
         if not self._authorizer.can_edit_code(user.user_id):
@@ -220,37 +321,82 @@ class ConfigService:
 
         return config_object
 
+    def get_script_output_cache_stats(self):
+        """
+        :return: CacheStats of values scripts outputs or None, if the cache is not used
+        """
+        if self._script_output_cache is None:
+            return None
+
+        return self._script_output_cache.get_stats()
+
     def list_configs(self, user, mode=None):
+        return list(self.list_visible_configs(user, mode).configs)
+
+    def list_visible_configs(self, user, mode=None) -> VisibleConfigs:
+        """
+        Visible configs are cached per user and group set, until any config is changed
+        """
         edit_mode = mode == 'edit'
         if edit_mode:
             self._check_admin_access(user)
 
-        conf_service = self
+        self._refresh_configs()
+        index_version = self._config_index.version
 
         has_admin_rights = self._authorizer.is_admin(user.user_id)
+        user_groups = self._authorizer.get_groups(user.user_id)
+        cache_key = (edit_mode,
+                     has_admin_rights,
+                     normalize_user_id(user.user_id),
+                     frozenset(user_groups) if user_groups else frozenset())
+
+        with self._visible_configs_lock:
+            if self._visible_configs_version != index_version:
+                self._visible_configs_cache.clear()
+                self._visible_configs_version = index_version
+
+            cached_configs = self._visible_configs_cache.get(cache_key)
+            if cached_configs is not None:
+                self._visible_configs_cache.move_to_end(cache_key)
+                return cached_configs
+
+        configs = self._find_visible_configs(user, edit_mode, has_admin_rights, user_groups)
+        visible_configs = VisibleConfigs(configs, _calculate_configs_etag(configs))
+
+        with self._visible_configs_lock:
+            if self._visible_configs_version == index_version:
+                self._visible_configs_cache[cache_key] = visible_configs
+                while len(self._visible_configs_cache) > _MAX_CACHED_VISIBLE_CONFIGS:
+                    self._visible_configs_cache.popitem(last=False)
+
+        return visible_configs
+
+    def _find_visible_configs(self, user, edit_mode, has_admin_rights, user_groups):
+        result = []
+        for indexed_config in self._config_index.get_all():
+            path = indexed_config.path
 
-        def load_script(path, content) -> Optional[ShortConfig]:
             try:
-                config_object = self.load_config_file(path, content)
-                short_config = self.read_short_config(config_object, path)
+                if indexed_config.parsing_failed:
+                    result.append(create_failed_short_config(path, has_admin_rights))
+                    continue
 
+                short_config = indexed_config.short_config
                 if short_config is None:
-                    return None
+                    continue
 
-                if edit_mode and (not conf_service._can_edit_script(user, short_config)):
-                    return None
+                if edit_mode and (not self._can_edit_script(user, short_config, user_groups)):
+                    continue
 
-                if (not edit_mode) and (not conf_service._can_access_script(user, short_config)):
-                    return None
+                if (not edit_mode) and (not self._can_access_script(user, short_config, user_groups)):
+                    continue
 
-                return short_config
-            except json.decoder.JSONDecodeError:
-                LOGGER.exception(CorruptConfigFileException.VERBOSE_ERROR + ': ' + path)
-                return create_failed_short_config(path, has_admin_rights)
+                result.append(short_config)
             except Exception:
                 LOGGER.exception('Could not load script: ' + path)
 
-        return self._visit_script_configs(load_script)
+        return result
 
     def load_config_model(self, name, user, parameter_values=None, skip_invalid_parameters=False):
         search_result = self._find_config(name, user)
@@ -271,72 +417,60 @@ class ConfigService:
             skip_invalid_parameters,
             self._process_invoker,
             self._group_scripts_by_folder,
-            self._script_configs_folder)
-
-    def _visit_script_configs(self, visitor):
-        configs_dir = self._script_configs_folder
-
-        files = []
-        # Read config file from within directories too
-        for _root, _dirs, _files in os.walk(configs_dir, topdown=True):
-            for name in _files:
-                files.append(os.path.join(_root, name))
-
-        configs = [file for file in files if file.lower().endswith(".json") or file.lower().endswith(".yaml")]
-        configs.sort()
-
-        result = []
-
-        for config_path in configs:
-            try:
-                content = file_utils.read_file(config_path)
-
-                visit_result = visitor(config_path, content)
-                if visit_result is not None:
-                    result.append(visit_result)
-
-            except StopIteration as e:
-                if e.value is not None:
-                    result.append(e.value)
-
-            except:
-                LOGGER.exception("Couldn't read the file: " + config_path)
-
-        return result
+            self._script_configs_folder,
+            self._get_config_template(path),
+            self._script_output_cache)
+
+    def _get_config_template(self, path):
+        """
+        Models of the same config file version share a template, which lives while any of the models is alive
+        """
+        indexed_config = self._config_index.get(path)
+        template_key = (path, indexed_config.stamp if indexed_config is not None else None)
+
+        with self._config_templates_lock:
+            template = self._config_templates.get(template_key)
+            if template is None:
+                template = ConfigTemplate(self._process_invoker)
+                self._config_templates[template_key] = template
+
+            return template
+
+    def _parse_config_file(self, path, content):
+        config_object = self.load_config_file(path, content)
+        short_config = self.read_short_config(config_object, path)
+        return config_object, short_config
 
     def _find_config(self, name, user) -> Optional[ConfigSearchResult]:
-        has_admin_rights = self._authorizer.is_admin(user.user_id)
+        self._refresh_configs()
 
-        def find_and_load(path: str, content):
-            try:
-                config_object = self.load_config_file(path, content)
-                short_config = self.read_short_config(config_object, path)
-
-                if short_config is None:
-                    return None
-            except json.decoder.JSONDecodeError:
-                short_config = create_failed_short_config(path, has_admin_rights)
-                config_object = None
+        stripped_name = name.strip()
 
-            except Exception:
-                LOGGER.exception('Could not load script config: ' + path)
-                return None
+        found_config = self._config_index.find_by_name(stripped_name)
 
-            if short_config.name != name.strip():
-                return None
+        failed_configs = self._config_index.get_failed()
+        if failed_configs:
+            has_admin_rights = self._authorizer.is_admin(user.user_id)
 
-            raise StopIteration(ConfigSearchResult(short_config, path, config_object))
+            for failed_config in failed_configs:
+                if (found_config is not None) and (found_config.path < failed_config.path):
+                    break
 
-        configs = self._visit_script_configs(find_and_load)
-        if not configs:
-            return None
+                try:
+                    failed_short_config = create_failed_short_config(failed_config.path, has_admin_rights)
+                except Exception:
+                    LOGGER.exception("Couldn't read the file: " + failed_config.path)
+                    continue
 
-        found_config = configs[0]
+                if failed_short_config.name == stripped_name:
+                    raise CorruptConfigFileException()
 
-        if found_config.short_config.parsing_failed:
-            raise CorruptConfigFileException()
+        if found_config is None:
+            return None
 
-        return found_config
+        # cached object should stay intact, when callers modify the config
+        config_object = copy.deepcopy(found_config.config_object)
+        return ConfigSearchResult(found_config.short_config, found_config.path, config_object)
 
     @staticmethod
     def _load_script_config(
@@ -347,7 +481,9 @@ class ConfigService:
             skip_invalid_parameters,
             process_invoker,
             group_scripts_by_folder,
-            script_configs_folder):
+            script_configs_folder,
+            config_template=None,
+            script_output_cache=None):
 
         if isinstance(content_or_json_dict, str):
             json_object = custom_json.loads(content_or_json_dict)
@@ -361,18 +497,20 @@ class ConfigService:
             group_scripts_by_folder,
             script_configs_folder,
             process_invoker,
-            pty_enabled_default=os_utils.is_pty_supported())
+            pty_enabled_default=os_utils.is_pty_supported(),
+            config_template=config_template,
+            script_output_cache=script_output_cache)
 
         if parameter_values is not None:
             config.set_all_param_values(parameter_values, skip_invalid_parameters)
 
         return config
 
-    def _can_access_script(self, user, short_config):
-        return self._authorizer.is_allowed(user.user_id, short_config.allowed_users)
+    def _can_access_script(self, user, short_config, user_groups=None):
+        return self._authorizer.is_allowed(user.user_id, short_config.allowed_users, user_groups)
 
-    def _can_edit_script(self, user, short_config):
-        return self._authorizer.is_allowed(user.user_id, short_config.admin_users)
+    def _can_edit_script(self, user, short_config, user_groups=None):
+        return self._authorizer.is_allowed(user.user_id, short_config.admin_users, user_groups)
 
     def _check_admin_access(self, user):
         if not self._authorizer.is_admin(user.user_id):
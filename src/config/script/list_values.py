@@ -4,7 +4,7 @@ import re
 
 from model.model_helper import is_empty, fill_parameter_values, InvalidFileException, list_files
 from utils.file_utils import FileMatcher
-from utils.process_utils import ProcessInvoker
+from utils.process_utils import ProcessInvoker, InvocationCancelledException
 
 LOGGER = logging.getLogger('list_values')
 
@@ -94,6 +94,8 @@ class DependantScriptValuesProvider(ValuesProvider):
 
         try:
             script_output = self._process_invoker.invoke(script, shell=self._shell)
+        except InvocationCancelledException:
+            raise
         except Exception as e:
             LOGGER.warning('Failed to execute script. ' + str(e))
             return []
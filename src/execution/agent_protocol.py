@@ -0,0 +1,76 @@
+"""
+Execution agents protocol: newline-delimited json messages over a TCP connection, one connection per execution.
+Messages are not encrypted (including the token), so the connection should be protected by a trusted network or TLS.
+
+Server -> agent:
+    {"type": "start", "token": ..., "command": [...], "working_directory": ..., "env": {...}}
+    {"type": "input", "data": ...}
+    {"type": "stop"}
+    {"type": "kill"}
+
+Agent -> server:
+    {"type": "started", "pid": ...}
+    {"type": "output", "data": ...}
+    {"type": "exit", "code": ...}
+    {"type": "error", "message": ...}
+"""
+import json
+import threading
+
+START = 'start'
+INPUT = 'input'
+STOP = 'stop'
+KILL = 'kill'
+
+STARTED = 'started'
+OUTPUT = 'output'
+EXIT = 'exit'
+ERROR = 'error'
+
+MAX_MESSAGE_SIZE = 10 * 1024 * 1024
+
+
+class AgentProtocolException(Exception):
+    pass
+
+
+class MessageChannel:
+    def __init__(self, sock):
+        self._socket = sock
+        self._reader = sock.makefile('rb')
+        self._write_lock = threading.Lock()
+
+    def send(self, message_type, **fields):
+        message = dict(fields)
+        message['type'] = message_type
+
+        data = (json.dumps(message) + '\n').encode('utf-8')
+        with self._write_lock:
+            self._socket.sendall(data)
+
+    def receive(self):
+        """
+        :return: message dict or None, if the connection is closed
+        """
+        line = self._reader.readline(MAX_MESSAGE_SIZE)
+        if not line:
+            return None
+
+        if not line.endswith(b'\n'):
+            raise AgentProtocolException('Message is too long or incomplete')
+
+        try:
+            message = json.loads(line.decode('utf-8'))
+        except ValueError as e:
+            raise AgentProtocolException('Invalid message: ' + str(e))
+
+        if not isinstance(message, dict) or ('type' not in message):
+            raise AgentProtocolException('Invalid message: ' + str(message))
+
+        return message
+
+    def close(self):
+        try:
+            self._reader.close()
+        finally:
+            self._socket.close()
@@ -0,0 +1,269 @@
+"""
+Execution agent: runs scripts on behalf of script server.
+
+The protocol is not encrypted, the token and all the script data are sent in plain text.
+So an agent should be reachable only via a trusted network or a TLS tunnel (e.g. stunnel or ssh port forwarding).
+By default, the agent listens only on the loopback interface and it refuses to listen on other addresses without a token.
+"""
+import argparse
+import codecs
+import hmac
+import ipaddress
+import logging
+import os
+import signal
+import socketserver
+import subprocess
+import sys
+import threading
+
+from execution import agent_protocol
+from execution.agent_protocol import MessageChannel
+
+LOGGER = logging.getLogger('script_server.agent_server')
+
+_OUTPUT_CHUNK_SIZE = 4096
+
+
+class AgentServer:
+    """
+    A lightweight runner, which executes scripts on behalf of script server and streams output and exit codes back.
+    Each execution uses its own connection. If the connection is lost, the process is killed.
+    """
+
+    def __init__(self, address='127.0.0.1', port=5100, capacity=4, token=None):
+        if (not token) and (not _is_loopback(address)):
+            raise AgentConfigurationException(
+                'Token is required, when listening on non-loopback address ' + address)
+
+        self._capacity = capacity
+        self._token = token
+
+        self._lock = threading.Lock()
+        self._running_count = 0
+        self._serving = False
+
+        agent = self
+
+        class _Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                agent._handle_connection(self.request)
+
+        self._server = socketserver.ThreadingTCPServer((address, port), _Handler, bind_and_activate=False)
+        self._server.daemon_threads = True
+        self._server.allow_reuse_address = True
+        self._server.server_bind()
+        self._server.server_activate()
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def serve_forever(self):
+        self._serving = True
+        self._server.serve_forever()
+
+    def start(self):
+        self._serving = True
+        thread = threading.Thread(target=self._server.serve_forever, name='agent-server', daemon=True)
+        thread.start()
+
+    def stop(self):
+        # shutdown waits for serve_forever, so it would hang, if the server was never started
+        if self._serving:
+            self._server.shutdown()
+        self._server.server_close()
+
+    def _handle_connection(self, sock):
+        channel = MessageChannel(sock)
+        try:
+            self._handle_execution(channel)
+        except:
+            LOGGER.exception('Failed to handle execution request')
+        finally:
+            channel.close()
+
+    def _handle_execution(self, channel: MessageChannel):
+        message = channel.receive()
+        if message is None:
+            return
+
+        if message['type'] != agent_protocol.START:
+            channel.send(agent_protocol.ERROR, message='Expected start message, but got ' + message['type'])
+            return
+
+        if self._token and not _is_valid_token(message.get('token'), self._token):
+            LOGGER.warning('Rejected execution request with invalid token')
+            channel.send(agent_protocol.ERROR, message='Invalid token')
+            return
+
+        with self._lock:
+            if self._running_count >= self._capacity:
+                full = True
+            else:
+                full = False
+                self._running_count += 1
+
+        if full:
+            channel.send(agent_protocol.ERROR, message='Agent is at full capacity')
+            return
+
+        try:
+            self._run_process(channel, message)
+        finally:
+            with self._lock:
+                self._running_count -= 1
+
+    def _run_process(self, channel: MessageChannel, message):
+        command = message.get('command')
+        env_variables = dict(os.environ)
+        for name, value in (message.get('env') or {}).items():
+            env_variables[name] = str(value)
+        if 'PYTHONUNBUFFERED' not in env_variables:
+            env_variables['PYTHONUNBUFFERED'] = '1'
+
+        try:
+            process = subprocess.Popen(command,
+                                       cwd=message.get('working_directory'),
+                                       stdin=subprocess.PIPE,
+                                       stdout=subprocess.PIPE,
+                                       stderr=subprocess.STDOUT,
+                                       start_new_session=True,
+                                       env=env_variables)
+        except Exception as e:
+            LOGGER.exception('Failed to start ' + str(command))
+            channel.send(agent_protocol.ERROR, message='Failed to start the process: ' + str(e))
+            return
+
+        LOGGER.info('Started process ' + str(process.pid) + ': ' + str(command))
+        channel.send(agent_protocol.STARTED, pid=process.pid)
+
+        output_thread = threading.Thread(target=self._pipe_output,
+                                         args=(process, channel),
+                                         name='agent-output-' + str(process.pid),
+                                         daemon=True)
+        output_thread.start()
+
+        process_finished = threading.Event()
+        commands_thread = threading.Thread(target=self._read_commands,
+                                           args=(process, channel, process_finished),
+                                           name='agent-commands-' + str(process.pid),
+                                           daemon=True)
+        commands_thread.start()
+
+        exit_code = process.wait()
+        process_finished.set()
+
+        # the same as for local executions, output is finished, when all the writers (incl. children) are done
+        output_thread.join()
+
+        LOGGER.info('Process ' + str(process.pid) + ' finished with code ' + str(exit_code))
+        try:
+            channel.send(agent_protocol.EXIT, code=exit_code)
+        except OSError:
+            LOGGER.warning('Failed to send exit code of ' + str(process.pid) + ', the server is disconnected')
+
+    @staticmethod
+    def _pipe_output(process, channel: MessageChannel):
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        fd = process.stdout.fileno()
+
+        try:
+            while True:
+                chunk = os.read(fd, _OUTPUT_CHUNK_SIZE)
+                text = decoder.decode(chunk, final=not chunk)
+                if text:
+                    channel.send(agent_protocol.OUTPUT, data=text)
+
+                if not chunk:
+                    break
+        except OSError:
+            LOGGER.warning('Failed to send output of ' + str(process.pid) + ', the server is disconnected')
+        finally:
+            process.stdout.close()
+
+    @staticmethod
+    def _read_commands(process, channel: MessageChannel, process_finished):
+        try:
+            while True:
+                message = channel.receive()
+                if message is None:
+                    break
+
+                message_type = message['type']
+                if message_type == agent_protocol.INPUT:
+                    process.stdin.write(message.get('data', '').encode('utf-8'))
+                    process.stdin.flush()
+                elif message_type == agent_protocol.STOP:
+                    _signal_group(process.pid, signal.SIGTERM)
+                elif message_type == agent_protocol.KILL:
+                    _signal_group(process.pid, signal.SIGKILL)
+                else:
+                    LOGGER.warning('Unknown message type: ' + message_type)
+        except:
+            if not process_finished.is_set():
+                LOGGER.exception('Failed to read commands for process ' + str(process.pid))
+
+        if not process_finished.is_set():
+            LOGGER.warning('Connection to the server is lost, killing process ' + str(process.pid))
+            _signal_group(process.pid, signal.SIGKILL)
+
+
+class AgentConfigurationException(Exception):
+    pass
+
+
+def _is_loopback(address):
+    if address == 'localhost':
+        return True
+
+    try:
+        return ipaddress.ip_address(address).is_loopback
+    except ValueError:
+        # host names are not resolved, so they are treated as public
+        return False
+
+
+def _is_valid_token(actual_token, expected_token):
+    if not isinstance(actual_token, str):
+        return False
+
+    return hmac.compare_digest(actual_token.encode('utf-8'), expected_token.encode('utf-8'))
+
+
+def _signal_group(pid, signal_number):
+    try:
+        os.killpg(os.getpgid(pid), signal_number)
+    except ProcessLookupError:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Launch script-server execution agent. '
+                    'Traffic is not encrypted, use it only in a trusted network or via a TLS tunnel. '
+                    'The token should be set in SCRIPT_SERVER_AGENT_TOKEN environment variable.')
+    parser.add_argument('-a', '--address', default='127.0.0.1',
+                        help='listening address, non-loopback addresses require a token')
+    parser.add_argument('-p', '--port', type=int, default=5100)
+    parser.add_argument('-c', '--capacity', type=int, default=4)
+    args = vars(parser.parse_args())
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(name)s.%(levelname)s] %(message)s')
+
+    token = os.environ.get('SCRIPT_SERVER_AGENT_TOKEN')
+    if not token:
+        LOGGER.warning('SCRIPT_SERVER_AGENT_TOKEN is not set, any local client can execute commands')
+
+    try:
+        server = AgentServer(args['address'], args['port'], args['capacity'], token)
+    except AgentConfigurationException as e:
+        LOGGER.error(str(e) + '. Please set SCRIPT_SERVER_AGENT_TOKEN environment variable')
+        sys.exit(1)
+
+    LOGGER.info('Agent is listening on ' + args['address'] + ':' + str(server.port))
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
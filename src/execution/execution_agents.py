@@ -0,0 +1,74 @@
+import logging
+import threading
+
+LOGGER = logging.getLogger('script_server.execution_agents')
+
+
+class ExecutionAgent:
+    def __init__(self, name, host, port, capacity, labels, token=None):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.capacity = capacity
+        self.labels = set(labels)
+        self.token = token
+
+        # executions, dispatched from this server
+        self.running_count = 0
+
+    def matches(self, labels):
+        return self.labels.issuperset(labels)
+
+    def free_slots(self):
+        return self.capacity - self.running_count
+
+    def __str__(self):
+        return self.name + ' (' + self.host + ':' + str(self.port) + ')'
+
+
+class AgentPool:
+    """
+    Dispatches executions to remote agents. An agent is chosen, if it has all the requested labels,
+    and among such agents the one with the most free slots is preferred.
+    """
+
+    def __init__(self, agents):
+        self._agents = list(agents)
+        self._lock = threading.Lock()
+
+    def has_matching(self, labels):
+        return any(agent.matches(labels) for agent in self._agents)
+
+    def has_free_slot(self, labels):
+        with self._lock:
+            return self._find_free(labels) is not None
+
+    def acquire(self, labels):
+        """
+        :return: ExecutionAgent with a reserved slot or None, if all matching agents are busy
+        """
+        with self._lock:
+            agent = self._find_free(labels)
+            if agent is not None:
+                agent.running_count += 1
+
+            return agent
+
+    def release(self, agent: ExecutionAgent):
+        with self._lock:
+            if agent.running_count <= 0:
+                LOGGER.warning('Agent ' + str(agent) + ' is released more times than acquired')
+                return
+
+            agent.running_count -= 1
+
+    def _find_free(self, labels):
+        best_agent = None
+        for agent in self._agents:
+            if not agent.matches(labels) or (agent.free_slots() <= 0):
+                continue
+
+            if (best_agent is None) or (agent.free_slots() > best_agent.free_slots()):
+                best_agent = agent
+
+        return best_agent
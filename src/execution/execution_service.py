@@ -1,10 +1,13 @@
 import logging
+import threading
 from collections import namedtuple
+from concurrent.futures.thread import ThreadPoolExecutor
 from typing import Optional, Dict, Callable, Any
 
 from auth.authorization import Authorizer, is_same_user
 from auth.user import User
 from config.constants import SHARED_ACCESS_TYPE_ALL
+from execution.execution_agents import AgentPool, ExecutionAgent
 from execution.executor import ScriptExecutor
 from model import script_config
 from model.model_helper import is_empty, AccessProhibitedException
@@ -17,9 +20,43 @@ LOGGER = logging.getLogger('script_server.execution_service')
 _ExecutionInfo = namedtuple('_ExecutionInfo',
                             ['execution_id', 'owner_user', 'audit_name', 'config', 'audit_command'])
 
+PRIORITY_CALLBACK = 0
+PRIORITY_SCHEDULED = 10
+PRIORITY_INTERACTIVE = 20
+
+DEFAULT_PRIORITY = PRIORITY_INTERACTIVE
+
+
+class _QueuedExecution:
+    def __init__(self, execution_id, executor: ScriptExecutor, user: User, priority, sequence_number):
+        self.execution_id = execution_id
+        self.executor = executor
+        self.user = user
+        self.priority = priority
+        self.sequence_number = sequence_number
+
+        # admitted and about to be started
+        self.spawning = False
+        self.cancelled = False
+
+        self.finish_listeners = []
+        # called with True, when the execution is started, or with False, when it's cancelled
+        self.dequeue_listeners = []
+
+    def sort_key(self):
+        return -self.priority, self.sequence_number
+
 
 class ExecutionService:
-    def __init__(self, authorizer, id_generator, env_vars: EnvVariables):
+    def __init__(self,
+                 authorizer,
+                 id_generator,
+                 env_vars: EnvVariables,
+                 output_memory_limit=None,
+                 max_concurrent=None,
+                 max_concurrent_per_user=None,
+                 workers=None,
+                 agent_pool: AgentPool = None):
 
         self._id_generator = id_generator
         self._authorizer = authorizer  # type: Authorizer
@@ -35,6 +72,31 @@ class ExecutionService:
         self._finish_listeners = []
         self._start_listeners = []
         self._env_vars = env_vars
+        self._output_memory_limit = output_memory_limit
+
+        # None means unlimited
+        self._max_concurrent = max_concurrent
+        self._max_concurrent_per_user = max_concurrent_per_user
+
+        # queued mode: all the executions go through the queue and processes are spawned by a worker pool.
+        # A worker is busy only while spawning the process, the number of running executions
+        # is limited by the same number via _can_start
+        self._workers = workers
+        if workers is not None:
+            self._worker_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='execution-worker')
+        else:
+            self._worker_pool = None
+
+        self._admission_lock = threading.RLock()
+        # started, but not yet finished
+        self._running_ids = set()
+        self._queued_executions = {}  # type: Dict[str, _QueuedExecution]
+        self._starting_executions = {}  # type: Dict[str, _QueuedExecution]
+        self._queue_sequence = 0
+
+        # scripts with agent_labels are executed by remote agents, each agent slot is occupied until the end
+        self._agent_pool = agent_pool
+        self._execution_agents = {}  # type: Dict[str, ExecutionAgent]
 
     def get_active_executor(self, execution_id, user):
         self.validate_execution_id(execution_id, user, only_active=False)
@@ -43,44 +105,293 @@ class ExecutionService:
 
         return self._executors.get(execution_id)
 
-    def start_script(self, config, user: User):
+    def start_script(self, config, user: User, priority=DEFAULT_PRIORITY):
+        """
+        Starts the script or puts it to the queue, if any of the concurrency limits is reached.
+        Queued executions are started in the order of priority (higher first), and then in FIFO order.
+
+        In queued mode the script is always put to the queue and the method returns without waiting for
+        the process to be spawned.
+        """
         audit_name = user.get_audit_name()
 
-        executor = ScriptExecutor(config, self._env_vars)
+        if config.agent_labels is not None:
+            if (self._agent_pool is None) or (not self._agent_pool.has_matching(config.agent_labels)):
+                raise Exception('No execution agent is configured for labels ' + str(config.agent_labels))
+
+        executor = ScriptExecutor(config, self._env_vars, self._output_memory_limit)
         execution_id = self._id_generator.next_id()
 
         audit_command = executor.get_secure_command()
-        LOGGER.info('Calling script #%s: %s', execution_id, audit_command)
 
-        executor.start(execution_id)
-        self._executors[execution_id] = executor
         self._execution_infos[execution_id] = _ExecutionInfo(
             execution_id=execution_id,
             owner_user=user,
             audit_name=audit_name,
             audit_command=audit_command,
             config=config)
-        self._active_executor_ids.add(execution_id)
+
+        with self._admission_lock:
+            self._active_executor_ids.add(execution_id)
+
+            if (self._worker_pool is None) and self._can_start(config, user):
+                self._occupy_slot(execution_id, executor)
+                queued = False
+            else:
+                self._queue_sequence += 1
+                self._queued_executions[execution_id] = _QueuedExecution(
+                    execution_id, executor, user, priority, self._queue_sequence)
+                queued = True
+
+        if queued:
+            LOGGER.info('Queued script #%s: %s', execution_id, audit_command)
+
+            if self._worker_pool is not None:
+                self._admit_queued()
+
+            return execution_id
+
+        try:
+            self._start_executor(execution_id, executor, user)
+        except:
+            with self._admission_lock:
+                self._release_slot(execution_id)
+                self._active_executor_ids.discard(execution_id)
+            raise
+
+        return execution_id
+
+    def _start_executor(self, execution_id, executor: ScriptExecutor, user, queued_execution=None):
+        LOGGER.info('Calling script #%s: %s', execution_id, executor.get_secure_command())
+
+        executor.start(execution_id)
+        self._executors[execution_id] = executor
 
         self._fire_execution_started(execution_id, user)
 
         self._add_post_finish_handling(execution_id, executor, user)
 
-        return execution_id
+        if queued_execution is not None:
+            with self._admission_lock:
+                # listeners, added from now on, are attached to the executor directly
+                del self._starting_executions[execution_id]
+
+            for listener in queued_execution.finish_listeners:
+                executor.add_finish_listener(listener)
+
+        self_service = self
+
+        class AdmissionListener:
+            def finished(self):
+                self_service._on_execution_finished(execution_id)
+
+        executor.add_finish_listener(AdmissionListener())
+
+        if queued_execution is not None:
+            self._notify_dequeued(queued_execution, True)
+
+    def _can_start(self, config, user: User):
+        if (self._workers is not None) and (len(self._running_ids) >= self._workers):
+            return False
+
+        if (self._max_concurrent is not None) and (len(self._running_ids) >= self._max_concurrent):
+            return False
+
+        if not self._has_free_agent(config):
+            return False
+
+        max_per_script = config.max_concurrent_executions
+        max_per_user = self._max_concurrent_per_user
+        if (max_per_script is None) and (max_per_user is None):
+            return True
+
+        script_count = 0
+        user_count = 0
+        for running_id in self._running_ids:
+            running_info = self._execution_infos[running_id]
+            if running_info.config.name == config.name:
+                script_count += 1
+            if is_same_user(running_info.owner_user.user_id, user.user_id):
+                user_count += 1
+
+        if (max_per_script is not None) and (script_count >= max_per_script):
+            return False
+
+        if (max_per_user is not None) and (user_count >= max_per_user):
+            return False
+
+        return True
+
+    def _has_free_agent(self, config):
+        if (config.agent_labels is None) or (self._agent_pool is None):
+            return True
+
+        return self._agent_pool.has_free_slot(config.agent_labels)
+
+    def _occupy_slot(self, execution_id, executor: ScriptExecutor):
+        self._running_ids.add(execution_id)
+
+        labels = executor.config.agent_labels
+        if (labels is not None) and (self._agent_pool is not None):
+            agent = self._agent_pool.acquire(labels)
+            self._execution_agents[execution_id] = agent
+            executor.agent = agent
+
+    def _release_slot(self, execution_id):
+        self._running_ids.discard(execution_id)
+
+        agent = self._execution_agents.pop(execution_id, None)
+        if agent is not None:
+            self._agent_pool.release(agent)
+
+    def _on_execution_finished(self, execution_id):
+        with self._admission_lock:
+            self._release_slot(execution_id)
+
+        self._admit_queued()
+
+    def _admit_queued(self):
+        with self._admission_lock:
+            admitted = []
+            for queued_execution in sorted(self._queued_executions.values(), key=_QueuedExecution.sort_key):
+                config = queued_execution.executor.config
+                if not self._can_start(config, queued_execution.user):
+                    continue
+
+                queued_id = queued_execution.execution_id
+                del self._queued_executions[queued_id]
+                self._starting_executions[queued_id] = queued_execution
+                self._occupy_slot(queued_id, queued_execution.executor)
+                admitted.append(queued_execution)
+
+        for queued_execution in admitted:
+            if self._worker_pool is not None:
+                self._worker_pool.submit(self._start_queued, queued_execution)
+            else:
+                self._start_queued(queued_execution)
+
+    def _start_queued(self, queued_execution: _QueuedExecution):
+        with self._admission_lock:
+            if queued_execution.cancelled:
+                return
+
+            queued_execution.spawning = True
+
+        queued_id = queued_execution.execution_id
+        try:
+            self._start_executor(queued_id, queued_execution.executor, queued_execution.user, queued_execution)
+        except:
+            LOGGER.exception('Failed to start queued script #' + queued_id)
+
+            self._remove_from_queue(queued_execution)
+            self._on_execution_finished(queued_id)
+
+    def get_queue_position(self, execution_id, user):
+        """
+        :return: 1-based position in the queue or None, if the execution is not queued
+        """
+        self.validate_execution_id(execution_id, user, only_active=False)
+
+        with self._admission_lock:
+            queued_execution = self._queued_executions.get(execution_id)
+            if queued_execution is None:
+                return None
+
+            sorted_executions = sorted(self._queued_executions.values(), key=_QueuedExecution.sort_key)
+            return sorted_executions.index(queued_execution) + 1
+
+    def is_queued(self, execution_id):
+        return execution_id in self._queued_executions
+
+    def add_dequeue_listener(self, execution_id, callback):
+        """
+        callback(started) is called, when the queued execution is started (True) or cancelled (False)
+        :return: False, if the execution is not queued (so the callback will never be called)
+        """
+        with self._admission_lock:
+            queued_execution = self._find_queued(execution_id)
+            if queued_execution is None:
+                return False
+
+            queued_execution.dequeue_listeners.append(callback)
+            return True
+
+    def _find_queued(self, execution_id):
+        queued_execution = self._queued_executions.get(execution_id)
+        if queued_execution is None:
+            # admitted, but not yet started
+            queued_execution = self._starting_executions.get(execution_id)
+
+        return queued_execution
+
+    def _cancel_queued(self, execution_id):
+        with self._admission_lock:
+            queued_execution = self._queued_executions.pop(execution_id, None)
+
+            if queued_execution is None:
+                # admitted, but a worker didn't pick it up yet
+                starting_execution = self._starting_executions.get(execution_id)
+                if (starting_execution is not None) and (not starting_execution.spawning):
+                    starting_execution.cancelled = True
+                    queued_execution = starting_execution
+
+        if queued_execution is None:
+            return False
+
+        LOGGER.info('Queued script #' + execution_id + ' is cancelled')
+        self._remove_from_queue(queued_execution)
+
+        if queued_execution.cancelled:
+            # release the admitted slot
+            self._on_execution_finished(execution_id)
+
+        return True
+
+    def _remove_from_queue(self, queued_execution: _QueuedExecution):
+        with self._admission_lock:
+            self._queued_executions.pop(queued_execution.execution_id, None)
+            self._starting_executions.pop(queued_execution.execution_id, None)
+            self._active_executor_ids.discard(queued_execution.execution_id)
+
+        self._notify_dequeued(queued_execution, False)
+
+        for listener in queued_execution.finish_listeners:
+            try:
+                listener.finished()
+            except:
+                LOGGER.exception('Failed to notify listener: ' + str(listener))
+
+    @staticmethod
+    def _notify_dequeued(queued_execution: _QueuedExecution, started):
+        for callback in queued_execution.dequeue_listeners:
+            try:
+                callback(started)
+            except:
+                LOGGER.exception('Could not notify dequeue listener (%s), execution: %s',
+                                 str(callback), queued_execution.execution_id)
 
     def stop_script(self, execution_id, user):
         self.validate_execution_id(execution_id, user)
 
+        if self._cancel_queued(execution_id):
+            return
+
         if execution_id in self._executors:
             self._executors[execution_id].stop()
 
     def kill_script(self, execution_id, user):
         self.validate_execution_id(execution_id, user)
 
+        if self._cancel_queued(execution_id):
+            return
+
         if execution_id in self._executors:
             self._executors[execution_id].kill()
 
     def kill_script_by_system(self, execution_id):
+        if self._cancel_queued(execution_id):
+            return
+
         if execution_id in self._executors:
             self._executors[execution_id].kill()
 
@@ -151,11 +462,13 @@ class ExecutionService:
 
     def get_user_parameter_values(self, execution_id):
         return self._get_for_executor(execution_id,
-                                      lambda e: e.get_user_parameter_values())
+                                      lambda e: e.get_user_parameter_values(),
+                                      include_queued=True)
 
     def get_script_parameter_values(self, execution_id):
         return self._get_for_executor(execution_id,
-                                      lambda e: e.get_script_parameter_values())
+                                      lambda e: e.get_script_parameter_values(),
+                                      include_queued=True)
 
     def get_owner(self, execution_id):
         return self._get_for_execution_info(execution_id,
@@ -191,8 +504,14 @@ class ExecutionService:
         return self._get_for_executor(execution_id,
                                       lambda e: e.get_process_id())
 
-    def _get_for_executor(self, execution_id, getter: Callable[[ScriptExecutor], Any]):
+    def _get_for_executor(self, execution_id, getter: Callable[[ScriptExecutor], Any], include_queued=False):
         executor = self._executors.get(execution_id)
+
+        if (executor is None) and include_queued:
+            queued_execution = self._queued_executions.get(execution_id)
+            if queued_execution is not None:
+                executor = queued_execution.executor
+
         if executor is None:
             return None
 
@@ -211,7 +530,16 @@ class ExecutionService:
         except NotFoundException:
             return
 
-        executor = self._executors.get(execution_id)
+        with self._admission_lock:
+            executor = self._executors.get(execution_id)
+
+            if executor is None:
+                if self._find_queued(execution_id) is not None:
+                    raise Exception('Executor ' + execution_id + ' is not yet finished')
+
+                # cancelled before it was started, so there is no process to clean up
+                self._active_executor_ids.discard(execution_id)
+                return
 
         if not executor.is_finished():
             raise Exception('Executor ' + execution_id + ' is not yet finished')
@@ -224,15 +552,21 @@ class ExecutionService:
             self._finish_listeners.append(callback)
 
         else:
+            class FinishListener:
+                def finished(self):
+                    callback()
+
+            with self._admission_lock:
+                queued_execution = self._find_queued(execution_id)
+                if queued_execution is not None:
+                    queued_execution.finish_listeners.append(FinishListener())
+                    return
+
             executor = self._executors.get(execution_id)
             if not executor:
                 LOGGER.error('Failed to find executor for id ' + execution_id)
                 return
 
-            class FinishListener:
-                def finished(self):
-                    callback()
-
             executor.add_finish_listener(FinishListener())
 
     def _add_post_finish_handling(self, execution_id, executor, user):
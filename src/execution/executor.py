@@ -4,6 +4,7 @@ import sys
 from typing import List
 
 from execution import process_popen, process_base
+from execution.output_masking import SecureOutputMasker
 from model import model_helper
 from model.model_helper import read_bool
 from model.parameter_config import ParameterModel
@@ -21,6 +22,11 @@ mock_process = False
 
 
 def create_process_wrapper(executor, command, working_directory, all_env_variables):
+    if executor.agent is not None:
+        from execution import process_remote
+        return process_remote.RemoteProcessWrapper(
+            executor.agent, command, working_directory, executor.script_env_variables, executor.output_memory_limit)
+
     run_pty = executor.config.requires_terminal
     if run_pty and not os_utils.is_pty_supported():
         LOGGER.warning(
@@ -29,9 +35,11 @@ def create_process_wrapper(executor, command, working_directory, all_env_variabl
 
     if run_pty:
         from execution import process_pty
-        process_wrapper = process_pty.PtyProcessWrapper(command, working_directory, all_env_variables)
+        process_wrapper = process_pty.PtyProcessWrapper(
+            command, working_directory, all_env_variables, executor.output_memory_limit)
     else:
-        process_wrapper = process_popen.POpenProcessWrapper(command, working_directory, all_env_variables)
+        process_wrapper = process_popen.POpenProcessWrapper(
+            command, working_directory, all_env_variables, executor.output_memory_limit)
 
     return process_wrapper
 
@@ -46,16 +54,23 @@ def _normalize_working_dir(working_directory):
 
 
 class ScriptExecutor:
-    def __init__(self, config: ConfigModel, env_vars: EnvVariables):
+    def __init__(self, config: ConfigModel, env_vars: EnvVariables, output_memory_limit=None):
         self.config = config
         self._env_vars = env_vars
+        # output chunks above this limit (in characters) are kept on disk, for each replayed stream
+        self.output_memory_limit = output_memory_limit
         self._parameter_values = dict(config.parameter_values)
         self._working_directory = _normalize_working_dir(config.working_directory)
 
         self.script_base_command = process_utils.split_command(
             self.config.script_command,
             self._working_directory)
-        self.secure_replacements = self.__init_secure_replacements()
+        self.secure_values = self.__init_secure_values()
+
+        # ExecutionAgent, when the script is dispatched to a remote agent
+        self.agent = None
+        # script specific variables only, without the server environment
+        self.script_env_variables = None
 
         self.process_wrapper = None  # type: process_base.ProcessWrapper
         self.raw_output_stream = None
@@ -71,6 +86,7 @@ class ScriptExecutor:
         command = self.script_base_command + script_args
         env_variables = _build_env_variables(parameter_values, self.config.parameters, execution_id)
 
+        self.script_env_variables = env_variables
         all_env_variables = self._env_vars.build_env_vars(env_variables)
 
         process_wrapper = _process_creator(self, command, self._working_directory, all_env_variables)
@@ -79,19 +95,20 @@ class ScriptExecutor:
         self.process_wrapper = process_wrapper
 
         output_stream = process_wrapper.output_stream.time_buffered(TIME_BUFFER_MS, _concat_output)
-        self.raw_output_stream = output_stream.replay()
+        self.raw_output_stream = output_stream.replay(self.output_memory_limit)
 
         send_stdin_parameters(self.config.parameters, parameter_values, self.raw_output_stream, process_wrapper)
 
-        if self.secure_replacements:
+        if self.secure_values:
+            masker = SecureOutputMasker(self.secure_values, model_helper.SECURE_MASK)
             self.protected_output_stream = output_stream \
-                .map(self.__replace_secure_variables) \
-                .replay()
+                .map(masker.mask, masker.flush) \
+                .replay(self.output_memory_limit)
         else:
             self.protected_output_stream = self.raw_output_stream
 
-    def __init_secure_replacements(self):
-        word_replacements = {}
+    def __init_secure_values(self):
+        secure_values = []
         for parameter in self.config.parameters:
             if not parameter.secure:
                 continue
@@ -114,21 +131,9 @@ class ScriptExecutor:
                 if not element_string.strip():
                     continue
 
-                value_pattern = r'((?<!\w)|^)' + re.escape(element_string) + r'((?!\w)|$)'
-                word_replacements[value_pattern] = model_helper.SECURE_MASK
-
-        return word_replacements
-
-    def __replace_secure_variables(self, output):
-        result = output
-
-        replacements = self.secure_replacements
-
-        if replacements:
-            for word, replacement in replacements.items():
-                result = re.sub(word, replacement, result)
+                secure_values.append(element_string)
 
-        return result
+        return secure_values
 
     def get_secure_command(self):
         audit_script_args = build_command_args(
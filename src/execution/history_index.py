@@ -0,0 +1,273 @@
+import logging
+import os
+import sqlite3
+import threading
+
+from auth.authorization import normalize_user_id
+from utils.date_utils import ms_to_datetime, to_millis
+
+LOGGER = logging.getLogger('script_server.execution.history_index')
+
+# should be increased on every schema change, the index is rebuilt from log files in this case
+_SCHEMA_VERSION = 2
+
+_ENTRY_COLUMNS = ['execution_id', 'user_name', 'user_id', 'script_name', 'command', 'output_format',
+                  'start_time', 'exit_code']
+
+SORT_FIELDS = ['start_time', 'script_name', 'user_name', 'exit_code']
+
+
+class HistoryEntry:
+    def __init__(self):
+        self.user_name = None
+        self.user_id = None
+        self.start_time = None
+        self.script_name = None
+        self.command = None
+        self.output_format = None
+        self.id = None
+        self.exit_code = None
+
+
+class HistoryFilter:
+    def __init__(self, *,
+                 script_name=None,
+                 user_name=None,
+                 exit_code=None,
+                 start_time_from=None,
+                 start_time_to=None):
+        self.script_name = script_name
+        self.user_name = user_name
+        self.exit_code = exit_code
+        self.start_time_from = start_time_from
+        self.start_time_to = start_time_to
+
+
+class HistoryIndex:
+    """
+    Persistent index of execution log files. Keeps parsed log headers, so history listings
+    don't need to read log files. Files, which are not valid execution logs, are indexed as well
+    (with empty execution_id), to avoid re-parsing them.
+    """
+
+    def __init__(self, db_path=None):
+        if not db_path:
+            db_path = ':memory:'
+
+        self._lock = threading.RLock()
+        self._connection = self._open(db_path)
+
+        # incremented on every change of the index
+        self.version = 0
+
+    @staticmethod
+    def _open(db_path):
+        try:
+            connection = HistoryIndex._connect(db_path)
+        except sqlite3.DatabaseError:
+            if db_path == ':memory:':
+                raise
+
+            LOGGER.exception('Failed to open history index ' + db_path + ', recreating it')
+            os.remove(db_path)
+            connection = HistoryIndex._connect(db_path)
+
+        return connection
+
+    @staticmethod
+    def _connect(db_path):
+        connection = sqlite3.connect(db_path, check_same_thread=False)
+
+        try:
+            version = connection.execute('PRAGMA user_version').fetchone()[0]
+            if version != _SCHEMA_VERSION:
+                connection.execute('DROP TABLE IF EXISTS history')
+
+            connection.execute('CREATE TABLE IF NOT EXISTS history ('
+                               'filename TEXT PRIMARY KEY, '
+                               'execution_id TEXT, '
+                               'user_name TEXT, '
+                               'user_id TEXT, '
+                               'user_key TEXT, '
+                               'script_name TEXT, '
+                               'command TEXT, '
+                               'output_format TEXT, '
+                               'start_time INTEGER, '
+                               'exit_code INTEGER, '
+                               'output_offset INTEGER)')
+            connection.execute('CREATE INDEX IF NOT EXISTS history_execution_id ON history(execution_id)')
+            connection.execute('CREATE INDEX IF NOT EXISTS history_user_key ON history(user_key)')
+            connection.execute('CREATE INDEX IF NOT EXISTS history_start_time ON history(start_time)')
+            connection.execute('PRAGMA user_version = ' + str(_SCHEMA_VERSION))
+            connection.commit()
+        except:
+            connection.close()
+            raise
+
+        return connection
+
+    def get_filenames(self):
+        with self._lock:
+            rows = self._connection.execute('SELECT filename FROM history').fetchall()
+
+        return {row[0] for row in rows}
+
+    def add(self, filename, entry, output_offset=None):
+        values = [filename, None, None, None, None, None, None, None, None, None, None]
+        if entry is not None:
+            start_time = to_millis(entry.start_time) if entry.start_time else None
+            values = [filename,
+                      entry.id,
+                      entry.user_name,
+                      entry.user_id,
+                      normalize_user_id(entry.user_id),
+                      entry.script_name,
+                      entry.command,
+                      entry.output_format,
+                      start_time,
+                      entry.exit_code,
+                      output_offset]
+
+        with self._lock:
+            if entry is not None:
+                # the latest file wins, if ids are duplicated
+                self._connection.execute(
+                    'UPDATE history SET execution_id = NULL WHERE execution_id = ? AND filename <> ?',
+                    (entry.id, filename))
+
+            self._connection.execute('INSERT OR REPLACE INTO history VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', values)
+            self._connection.commit()
+            self.version += 1
+
+    def remove(self, filenames):
+        with self._lock:
+            self._connection.executemany('DELETE FROM history WHERE filename = ?',
+                                         [(filename,) for filename in filenames])
+            self._connection.commit()
+            self.version += 1
+
+    def rename(self, old_filename, new_filename):
+        with self._lock:
+            # new file could be already indexed by folder listing. In this case the execution id
+            # could be moved to the new file (the latest file wins), so it should be kept
+            row = self._connection.execute(
+                'SELECT execution_id FROM history WHERE filename = ?', (new_filename,)).fetchone()
+            new_file_execution_id = row[0] if row is not None else None
+
+            self._connection.execute('DELETE FROM history WHERE filename = ?', (new_filename,))
+            self._connection.execute(
+                'UPDATE history SET filename = ?, execution_id = COALESCE(execution_id, ?) WHERE filename = ?',
+                (new_filename, new_file_execution_id, old_filename))
+            self._connection.commit()
+            self.version += 1
+
+    def set_exit_code(self, filename, exit_code):
+        with self._lock:
+            self._connection.execute('UPDATE history SET exit_code = ? WHERE filename = ?', (exit_code, filename))
+            self._connection.commit()
+            self.version += 1
+
+    def find_log_location(self, execution_id):
+        """
+        :return: tuple (filename, output_offset) or None, if execution is not indexed
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT filename, output_offset FROM history WHERE execution_id = ?', (execution_id,)).fetchone()
+
+        if row is None:
+            return None
+
+        return row[0], row[1]
+
+    def find_entry(self, execution_id):
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT ' + ', '.join(_ENTRY_COLUMNS) + ' FROM history WHERE execution_id = ?',
+                (execution_id,)).fetchone()
+
+        if row is None:
+            return None
+
+        return _row_to_entry(row)
+
+    def find_entries(self, user_id=None, *,
+                     all_users=False,
+                     history_filter: HistoryFilter = None,
+                     sort_by=None,
+                     descending=False,
+                     offset=0,
+                     limit=None):
+        (where_clause, arguments) = _build_where_clause(user_id, all_users, history_filter)
+        query = 'SELECT ' + ', '.join(_ENTRY_COLUMNS) + ' FROM history WHERE ' + where_clause
+
+        direction = ' DESC' if descending else ' ASC'
+        if sort_by is not None:
+            if sort_by not in SORT_FIELDS:
+                raise ValueError('Unsupported sort field: ' + str(sort_by))
+            query += ' ORDER BY ' + sort_by + direction + ', rowid' + direction
+        else:
+            query += ' ORDER BY rowid' + direction
+
+        if (limit is not None) or offset:
+            query += ' LIMIT ? OFFSET ?'
+            arguments.extend([-1 if limit is None else limit, offset])
+
+        with self._lock:
+            rows = self._connection.execute(query, arguments).fetchall()
+
+        return [_row_to_entry(row) for row in rows]
+
+    def count_entries(self, user_id=None, *, all_users=False, history_filter: HistoryFilter = None):
+        (where_clause, arguments) = _build_where_clause(user_id, all_users, history_filter)
+
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM history WHERE ' + where_clause, arguments) \
+                .fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def _build_where_clause(user_id, all_users, history_filter: HistoryFilter):
+    conditions = ['execution_id IS NOT NULL']
+    arguments = []
+
+    def add_condition(condition, value):
+        conditions.append(condition)
+        arguments.append(value)
+
+    if not all_users:
+        add_condition('user_key = ?', normalize_user_id(user_id))
+
+    if history_filter is not None:
+        if history_filter.script_name is not None:
+            add_condition('script_name = ?', history_filter.script_name)
+        if history_filter.user_name is not None:
+            add_condition('user_name = ?', history_filter.user_name)
+        if history_filter.exit_code is not None:
+            add_condition('exit_code = ?', history_filter.exit_code)
+        if history_filter.start_time_from is not None:
+            add_condition('start_time >= ?', to_millis(history_filter.start_time_from))
+        if history_filter.start_time_to is not None:
+            add_condition('start_time <= ?', to_millis(history_filter.start_time_to))
+
+    return ' AND '.join(conditions), arguments
+
+
+def _row_to_entry(row):
+    entry = HistoryEntry()
+    (entry.id,
+     entry.user_name,
+     entry.user_id,
+     entry.script_name,
+     entry.command,
+     entry.output_format,
+     start_time,
+     entry.exit_code) = row
+
+    if start_time is not None:
+        entry.start_time = ms_to_datetime(start_time)
+
+    return entry
@@ -1,16 +1,23 @@
 # noinspection PyBroadException
+import gzip
 import logging
 import os
 import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from string import Template
 from typing import Optional
 
 from auth.authorization import is_same_user
 from execution.execution_service import ExecutionService
+from execution.history_index import HistoryIndex, HistoryEntry, HistoryFilter
 from model import model_helper
 from model.model_helper import AccessProhibitedException
 from model.server_conf import LoggingConfig
-from utils import file_utils, audit_utils
+from react import event_loop
+from utils import file_utils, audit_utils, gzip_utils
 from utils.audit_utils import get_audit_name
 from utils.collection_utils import get_first_existing
 from utils.date_utils import get_current_millis, ms_to_datetime
@@ -19,11 +26,37 @@ ENCODING = 'utf8'
 
 OUTPUT_STARTED_MARKER = '>>>>>  OUTPUT STARTED <<<<<'
 
+# exit code is not known on start, so space for it is reserved in the header and filled in place on finish
+_EXIT_CODE_PREFIX = 'exit_code:'
+_EXIT_CODE_WIDTH = 20
+
 LOGGER = logging.getLogger('script_server.execution.logging')
 
+_LOG_CHUNK_SIZE = 64 * 1024
+
+DEFAULT_FLUSH_SIZE = 64 * 1024
+DEFAULT_FLUSH_INTERVAL_MS = 1000
+
+# offset and length are relative to the output start (i.e. header is excluded)
+LogRange = namedtuple('LogRange', ['file_path', 'output_start', 'offset', 'length', 'output_size'])
+
+# filesystems with coarse timestamps can miss folder changes within this period
+_FOLDER_MTIME_PRECISION_NS = 2 * 1000 * 1000 * 1000
+
+
+# closing includes fsync, post execution info and history updates
+_closing_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='output-logger-close')
+
 
 class ScriptOutputLogger:
-    def __init__(self, log_file_path, output_stream):
+    """
+    Writes output stream to the log file.
+    Writes are buffered and flushed, when flush_size bytes are accumulated or flush_interval_ms passed
+    since the last flush. On close all the data is flushed and synced to the disk.
+    With default (zero) values, each chunk is flushed immediately.
+    """
+
+    def __init__(self, log_file_path, output_stream, flush_size=0, flush_interval_ms=0):
         self.opened = False
         self.closed = False
         self.output_stream = output_stream
@@ -31,6 +64,15 @@ class ScriptOutputLogger:
         self.log_file_path = log_file_path
         self.log_file = None
         self.close_callback = None
+        self.written_bytes = 0
+
+        self._flush_size = flush_size
+        self._flush_interval = flush_interval_ms / 1000.
+        self._unflushed_bytes = 0
+        self._last_flush_time = time.monotonic()
+        self._flush_timer = None
+        self._lock = threading.RLock()
+        self._closed_event = threading.Event()
 
     def start(self):
         self._ensure_file_open()
@@ -42,7 +84,8 @@ class ScriptOutputLogger:
             return
 
         try:
-            self.log_file = open(self.log_file_path, 'wb')
+            buffering = self._flush_size if self._flush_size > 0 else -1
+            self.log_file = open(self.log_file_path, 'wb', buffering=buffering)
         except:
             LOGGER.exception("Couldn't create a log file")
 
@@ -58,28 +101,83 @@ class ScriptOutputLogger:
 
         try:
             if text is not None:
-                self.log_file.write(text.encode(ENCODING))
-                self.log_file.flush()
+                encoded_text = text.encode(ENCODING)
+
+                with self._lock:
+                    self.log_file.write(encoded_text)
+                    self.written_bytes += len(encoded_text)
+                    self._unflushed_bytes += len(encoded_text)
+
+                    if (self._unflushed_bytes >= self._flush_size) \
+                            or (time.monotonic() - self._last_flush_time >= self._flush_interval):
+                        self.flush()
+                    else:
+                        self._schedule_flush()
         except:
             LOGGER.exception("Couldn't write to the log file")
 
+    def flush(self):
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+
+            if (not self.log_file) or self.log_file.closed:
+                return
+
+            self.log_file.flush()
+            self._unflushed_bytes = 0
+            self._last_flush_time = time.monotonic()
+
+    def _schedule_flush(self):
+        if self._flush_timer is not None:
+            return
+
+        delay = max(self._flush_interval - (time.monotonic() - self._last_flush_time), 0)
+        self._flush_timer = event_loop.get_shared_loop().call_later(delay, self._timed_flush)
+
+    def _timed_flush(self):
+        try:
+            self.flush()
+        except:
+            LOGGER.exception("Couldn't flush the log file")
+
     def _close(self):
+        """
+        Called from the closing executor, since fsync and the close callback can block
+        """
+        try:
+            with self._lock:
+                if self.log_file and not self.log_file.closed:
+                    self.flush()
+                    os.fsync(self.log_file.fileno())
+        except:
+            LOGGER.exception("Couldn't flush the log file")
+
         try:
             if self.log_file:
                 self.log_file.close()
         except:
             LOGGER.exception("Couldn't close the log file")
 
-        self.closed = True
+        with self._lock:
+            self.closed = True
+            close_callback = self.close_callback
 
-        if self.close_callback:
-            self.close_callback()
+        if close_callback:
+            close_callback()
+
+        self._closed_event.set()
 
     def on_next(self, output):
         self.__log(output)
 
     def on_close(self):
-        self._close()
+        # output is usually closed from the shared event loop, which shouldn't be blocked by disk operations
+        _closing_executor.submit(self._close)
+
+    def wait_closed(self, timeout=None):
+        return self._closed_event.wait(timeout)
 
     def write_line(self, text):
         self._ensure_file_open()
@@ -91,36 +189,39 @@ class ScriptOutputLogger:
             LOGGER.error('Attempt to override close callback ' + repr(self.close_callback) + ' with ' + repr(callback))
             return
 
-        self.close_callback = callback
-
-        if self.closed:
-            self.close_callback()
-
+        with self._lock:
+            self.close_callback = callback
+            closed = self.closed
 
-class HistoryEntry:
-    def __init__(self):
-        self.user_name = None
-        self.user_id = None
-        self.start_time = None
-        self.script_name = None
-        self.command = None
-        self.output_format = None
-        self.id = None
-        self.exit_code = None
+        if closed:
+            callback()
 
 
 class ExecutionLoggingService:
-    def __init__(self, output_folder, log_name_creator, authorizer):
+    def __init__(self, output_folder, log_name_creator, authorizer, index_file_path=None, *,
+                 flush_size=None,
+                 flush_interval_ms=None,
+                 compress_logs=False):
         self._output_folder = output_folder
         self._log_name_creator = log_name_creator
         self._authorizer = authorizer
+        self._flush_size = flush_size if flush_size is not None else DEFAULT_FLUSH_SIZE
+        self._flush_interval_ms = flush_interval_ms if flush_interval_ms is not None else DEFAULT_FLUSH_INTERVAL_MS
 
-        self._visited_files = set()
         self._ids_to_file_map = {}
         self._output_loggers = {}
+        self._exit_code_positions = {}
+        self._folder_mtime = None
+
+        # finished logs are compressed one by one, to limit the load on the server
+        self._compression_executor = None
+        if compress_logs:
+            self._compression_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='log-compression')
 
         file_utils.prepare_folder(output_folder)
 
+        self._history_index = HistoryIndex(index_file_path)
+
         self._renew_files_cache()
 
     def start_logging(self, execution_id,
@@ -152,9 +253,14 @@ class ExecutionLoggingService:
             script_config.parameters,
             parameter_value_wrappers)
         log_file_path = os.path.join(self._output_folder, log_filename)
-        log_file_path = file_utils.create_unique_filename(log_file_path)
-
-        output_logger = ScriptOutputLogger(log_file_path, output_stream)
+        # compressed logs don't have the original file anymore, but their names are still taken
+        log_file_path = file_utils.create_unique_filename(
+            log_file_path, reserved_suffixes=[gzip_utils.GZIP_EXTENSION])
+
+        output_logger = ScriptOutputLogger(log_file_path,
+                                           output_stream,
+                                           flush_size=self._flush_size,
+                                           flush_interval_ms=self._flush_interval_ms)
         output_logger.write_line('id:' + execution_id)
         output_logger.write_line('user_name:' + user_name)
         output_logger.write_line('user_id:' + user_id)
@@ -162,13 +268,28 @@ class ExecutionLoggingService:
         output_logger.write_line('start_time:' + str(start_time_millis))
         output_logger.write_line('command:' + command)
         output_logger.write_line('output_format:' + script_config.output_format)
+        exit_code_position = output_logger.written_bytes + len(_EXIT_CODE_PREFIX.encode(ENCODING))
+        output_logger.write_line(_EXIT_CODE_PREFIX + ' ' * _EXIT_CODE_WIDTH)
         output_logger.write_line(OUTPUT_STARTED_MARKER)
+        output_offset = output_logger.written_bytes
+        # header should be readable right away, e.g. for the history listing
+        output_logger.flush()
         output_logger.start()
 
         log_filename = os.path.basename(log_file_path)
-        self._visited_files.add(log_filename)
         self._ids_to_file_map[execution_id] = log_filename
         self._output_loggers[execution_id] = output_logger
+        self._exit_code_positions[execution_id] = exit_code_position
+
+        entry = HistoryEntry()
+        entry.id = execution_id
+        entry.user_name = user_name
+        entry.user_id = user_id
+        entry.script_name = script_name
+        entry.start_time = ms_to_datetime(start_time_millis)
+        entry.command = command
+        entry.output_format = script_config.output_format
+        self._history_index.add(log_filename, entry, output_offset)
 
     def write_post_execution_info(self, execution_id, exit_code):
         filename = self._ids_to_file_map.get(execution_id)
@@ -182,34 +303,86 @@ class ExecutionLoggingService:
             return
 
         log_file_path = os.path.join(self._output_folder, filename)
+        exit_code_position = self._exit_code_positions.get(execution_id)
+
+        def write_info():
+            self._write_post_execution_info(log_file_path, exit_code, exit_code_position)
+            self._history_index.set_exit_code(filename, exit_code)
+
+            if self._compression_executor is not None:
+                self._compression_executor.submit(self._compress_log, execution_id, filename)
+
+        logger.set_close_callback(write_info)
+
+    def _compress_log(self, execution_id, filename):
+        log_file_path = os.path.join(self._output_folder, filename)
+        compressed_filename = filename + gzip_utils.GZIP_EXTENSION
+        compressed_file_path = os.path.join(self._output_folder, compressed_filename)
+        temp_file_path = compressed_file_path + '.tmp'
 
-        logger.set_close_callback(lambda: self._write_post_execution_info(log_file_path, exit_code))
+        if os.path.exists(compressed_file_path):
+            LOGGER.warning("Couldn't compress " + log_file_path + ', because ' + compressed_filename
+                           + ' already exists. Keeping it uncompressed')
+            return
 
-    def get_history_entries(self, user_id, *, system_call=False):
+        try:
+            gzip_utils.compress_file(log_file_path, temp_file_path)
+            os.replace(temp_file_path, compressed_file_path)
+        except:
+            LOGGER.exception("Couldn't compress " + log_file_path)
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+            return
+
+        self._history_index.rename(filename, compressed_filename)
+        self._ids_to_file_map[execution_id] = compressed_filename
+
+        try:
+            os.remove(log_file_path)
+        except:
+            LOGGER.exception("Couldn't remove compressed log " + log_file_path)
+
+    def get_history_version(self):
+        """
+        :return: number, which changes whenever any history entry is added, modified or removed
+        """
         self._renew_files_cache()
 
-        result = []
+        return self._history_index.version
 
-        for file in self._ids_to_file_map.values():
-            history_entry = self._extract_history_entry(file)
-            if history_entry is not None and self._can_access_entry(history_entry, user_id, system_call):
-                result.append(history_entry)
+    def get_history_entries(self, user_id, *,
+                            system_call=False,
+                            history_filter: HistoryFilter = None,
+                            sort_by=None,
+                            descending=False,
+                            offset=0,
+                            limit=None):
+        self._renew_files_cache()
 
-        return result
+        all_users = system_call or self._authorizer.has_full_history_access(user_id)
+        return self._history_index.find_entries(user_id,
+                                                all_users=all_users,
+                                                history_filter=history_filter,
+                                                sort_by=sort_by,
+                                                descending=descending,
+                                                offset=offset,
+                                                limit=limit)
+
+    def count_history_entries(self, user_id, *, history_filter: HistoryFilter = None):
+        self._renew_files_cache()
+
+        all_users = self._authorizer.has_full_history_access(user_id)
+        return self._history_index.count_entries(user_id, all_users=all_users, history_filter=history_filter)
 
     def find_history_entry(self, execution_id, user_id):
         self._renew_files_cache()
 
-        file = self._ids_to_file_map.get(execution_id)
-        if file is None:
+        entry = self._history_index.find_entry(execution_id)
+        if entry is None:
             LOGGER.warning('find_history_entry: file for %s id not found', execution_id)
             return None
 
-        entry = self._extract_history_entry(file)
-        if entry is None:
-            LOGGER.warning('find_history_entry: cannot parse file for %s', execution_id)
-
-        elif not self._can_access_entry(entry, user_id):
+        if not self._can_access_entry(entry, user_id):
             message = 'User ' + user_id + ' has no access to execution #' + str(execution_id)
             LOGGER.warning('%s. Original user: %s', message, entry.user_id)
             raise AccessProhibitedException(message)
@@ -217,65 +390,145 @@ class ExecutionLoggingService:
         return entry
 
     def find_log(self, execution_id):
+        log_range = self.find_log_range(execution_id)
+        if log_range is None:
+            return None
+
+        content = b''.join(self.read_log_range(log_range))
+        return content.decode(ENCODING, errors='replace')
+
+    def find_log_range(self, execution_id, *, offset=0, limit=None, tail_lines=None):
         self._renew_files_cache()
 
-        file = self._ids_to_file_map.get(execution_id)
-        if file is None:
+        location = self._history_index.find_log_location(execution_id)
+        if location is None:
             LOGGER.warning('find_log: file for %s id not found', execution_id)
             return None
 
-        file_content = file_utils.read_file(os.path.join(self._output_folder, file),
-                                            keep_newlines=True)
-        log = file_content.split(OUTPUT_STARTED_MARKER, 1)[1]
-        return _lstrip_any_linesep(log)
+        (file, output_start) = location
+        file_path = os.path.join(self._output_folder, file)
+
+        try:
+            with _open_log_reader(file_path) as reader:
+                output_start = self._validate_output_start(reader, output_start)
+                if output_start is None:
+                    (correct_format, _, output_start) = self._read_header(file_path)
+                    if not correct_format:
+                        return None
+
+                output_size = max(reader.size() - output_start, 0)
+                if tail_lines is not None:
+                    offset = _find_tail_offset(reader, output_start, output_size, tail_lines)
+        except FileNotFoundError:
+            LOGGER.warning('find_log: file for %s id was deleted', execution_id)
+            return None
+        except gzip_utils.InvalidBlockedGzipException:
+            LOGGER.exception('find_log: cannot read compressed log for %s id', execution_id)
+            return None
+
+        offset = min(offset, output_size)
+        length = output_size - offset
+        if limit is not None:
+            length = min(length, limit)
+
+        return LogRange(file_path, output_start, offset, length, output_size)
+
+    @staticmethod
+    def _validate_output_start(reader, output_start):
+        # log files can be modified externally, so the indexed offset should point right after the marker
+        if output_start is None:
+            return None
+
+        marker_line = (OUTPUT_STARTED_MARKER + '\n').encode(ENCODING)
+        if output_start < len(marker_line):
+            return None
+
+        # one more byte for windows line separator
+        position = max(output_start - len(marker_line) - 1, 0)
+        if reader.read(position, output_start - position).replace(b'\r\n', b'\n').endswith(marker_line):
+            return output_start
+
+        return None
+
+    @staticmethod
+    def read_log_range(log_range: LogRange, chunk_size=_LOG_CHUNK_SIZE):
+        with _open_log_reader(log_range.file_path) as reader:
+            position = log_range.output_start + log_range.offset
+
+            remaining = log_range.length
+            while remaining > 0:
+                chunk = reader.read(position, min(chunk_size, remaining))
+                if not chunk:
+                    break
+
+                position += len(chunk)
+                remaining -= len(chunk)
+                yield chunk
 
     def _extract_history_entry(self, file):
         file_path = os.path.join(self._output_folder, file)
-        correct_format, parameters_text = self._read_parameters_text(file_path)
+        correct_format, parameters_text, output_offset = self._read_header(file_path)
         if not correct_format:
-            return None
+            return None, None
         parameters = self._parse_history_parameters(parameters_text)
-        return self._parameters_to_entry(parameters)
+        return self._parameters_to_entry(parameters), output_offset
 
     @staticmethod
     def _read_parameters_text(file_path):
+        correct_format, parameters_text, _ = ExecutionLoggingService._read_header(file_path)
+        return correct_format, parameters_text
+
+    @staticmethod
+    def _read_header(file_path):
         parameters_text = ''
-        correct_format = False
-        with open(file_path, 'r', encoding=ENCODING) as f:
+        output_offset = 0
+        open_function = gzip.open if gzip_utils.is_gzip_file(file_path) else open
+        with open_function(file_path, 'rb') as f:
             for line in f:
-                if _rstrip_once(line, '\n') == OUTPUT_STARTED_MARKER:
-                    correct_format = True
-                    break
-                parameters_text += line
-        return correct_format, parameters_text
+                output_offset += len(line)
 
-    def _renew_files_cache(self):
-        cache = self._ids_to_file_map
+                text = line.decode(ENCODING)
+                if text.endswith('\r\n'):
+                    text = text[:-2] + '\n'
 
-        obsolete_ids = []
-        for id, file in cache.items():
-            path = os.path.join(self._output_folder, file)
-            if not os.path.exists(path):
-                obsolete_ids.append(id)
+                if _rstrip_once(text, '\n') == OUTPUT_STARTED_MARKER:
+                    return True, parameters_text, output_offset
 
-        for obsolete_id in obsolete_ids:
-            LOGGER.info('Logs for execution #' + obsolete_id + ' were deleted')
-            del cache[obsolete_id]
+                parameters_text += text
 
-        for file in os.listdir(self._output_folder):
-            if not file.lower().endswith('.log'):
-                continue
+        return False, parameters_text, None
 
-            if file in self._visited_files:
-                continue
+    def _renew_files_cache(self):
+        # files are added/deleted only together with folder mtime change, so we can skip listing otherwise
+        folder_mtime = os.stat(self._output_folder).st_mtime_ns
+        if (folder_mtime == self._folder_mtime) \
+                and (time.time_ns() - folder_mtime > _FOLDER_MTIME_PRECISION_NS):
+            return
+        self._folder_mtime = folder_mtime
+
+        existing_files = {file for file in os.listdir(self._output_folder) if _is_log_file(file)}
+        indexed_files = self._history_index.get_filenames()
 
-            self._visited_files.add(file)
+        deleted_files = indexed_files - existing_files
+        if deleted_files:
+            LOGGER.info('Logs for ' + str(len(deleted_files)) + ' executions were deleted')
+            self._history_index.remove(deleted_files)
+            indexed_files = indexed_files - deleted_files
+
+        for file in existing_files - indexed_files:
+            if _get_compression_sibling(file) in indexed_files:
+                # the log is being compressed, the index entry is renamed by _compress_log
+                continue
 
-            entry = self._extract_history_entry(file)
-            if entry is None:
+            try:
+                (entry, output_offset) = self._extract_history_entry(file)
+            except FileNotFoundError:
                 continue
+            except (OSError, EOFError):
+                LOGGER.exception('Failed to read log file ' + file)
+                (entry, output_offset) = (None, None)
 
-            cache[entry.id] = file
+            self._history_index.add(file, entry, output_offset)
 
     @staticmethod
     def _create_log_identifier(audit_name, script_name, start_time):
@@ -325,7 +578,7 @@ class ExecutionLoggingService:
         entry.output_format = parameters.get('output_format')
 
         exit_code = parameters.get('exit_code')
-        if exit_code is not None:
+        if exit_code is not None and exit_code.strip():
             entry.exit_code = int(exit_code)
 
         start_time = parameters.get('start_time')
@@ -335,15 +588,18 @@ class ExecutionLoggingService:
         return entry
 
     @staticmethod
-    def _write_post_execution_info(log_file_path, exit_code):
-        file_content = file_utils.read_file(log_file_path, keep_newlines=True)
-
-        file_parts = file_content.split(OUTPUT_STARTED_MARKER + os.linesep, 1)
-        parameters_text = file_parts[0]
-        parameters_text += 'exit_code:' + str(exit_code) + os.linesep
+    def _write_post_execution_info(log_file_path, exit_code, exit_code_position):
+        exit_code_text = str(exit_code)
+        if len(exit_code_text) > _EXIT_CODE_WIDTH:
+            LOGGER.warning('Exit code ' + exit_code_text + ' is too long, skipping it in ' + log_file_path)
+            return
 
-        new_content = parameters_text + OUTPUT_STARTED_MARKER + os.linesep + file_parts[1]
-        file_utils.write_file(log_file_path, new_content.encode(ENCODING), byte_content=True)
+        try:
+            with open(log_file_path, 'r+b') as f:
+                f.seek(exit_code_position)
+                f.write(exit_code_text.ljust(_EXIT_CODE_WIDTH).encode(ENCODING))
+        except:
+            LOGGER.exception("Couldn't write exit code to " + log_file_path)
 
     def _can_access_entry(self, entry, user_id, system_call=False):
         if entry is None:
@@ -455,11 +711,72 @@ def _rstrip_once(text, char):
     return text
 
 
-def _lstrip_any_linesep(text):
-    if text.startswith('\r\n'):
-        return text[2:]
+def _find_tail_offset(reader, output_start, output_size, lines_count):
+    if lines_count <= 0:
+        return output_size
 
-    if text.startswith(os.linesep):
-        return text[len(os.linesep):]
+    position = output_start + output_size
+    # trailing line separator doesn't start a new line
+    if reader.read(position - 1, 1) == b'\n':
+        position -= 1
 
-    return text
+    found_lines = 0
+    while position > output_start:
+        read_size = min(_LOG_CHUNK_SIZE, position - output_start)
+        position -= read_size
+        chunk = reader.read(position, read_size)
+
+        newline_index = len(chunk)
+        while True:
+            newline_index = chunk.rfind(b'\n', 0, newline_index)
+            if newline_index < 0:
+                break
+
+            found_lines += 1
+            if found_lines >= lines_count:
+                return position + newline_index + 1 - output_start
+
+    return 0
+
+
+def _get_compression_sibling(filename):
+    """
+    :return: name of the compressed log for a plain log and vice versa
+    """
+    if gzip_utils.is_gzip_file(filename):
+        return filename[:-len(gzip_utils.GZIP_EXTENSION)]
+
+    return filename + gzip_utils.GZIP_EXTENSION
+
+
+def _is_log_file(filename):
+    filename = filename.lower()
+    return filename.endswith('.log') or filename.endswith('.log' + gzip_utils.GZIP_EXTENSION)
+
+
+class _PlainLogReader:
+    def __init__(self, file_path):
+        self._file = open(file_path, 'rb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def size(self):
+        return os.fstat(self._file.fileno()).st_size
+
+    def read(self, position, size):
+        self._file.seek(position)
+        return self._file.read(size)
+
+
+def _open_log_reader(file_path):
+    if gzip_utils.is_gzip_file(file_path):
+        return gzip_utils.BlockedGzipReader(file_path)
+
+    return _PlainLogReader(file_path)
@@ -0,0 +1,78 @@
+import re
+
+
+class SecureOutputMasker:
+    """
+    Replaces secure values in streamed output with a mask.
+
+    All the values are compiled into a single regex, so each chunk is scanned only once.
+    Values are masked only as whole words, i.e. when they are not surrounded by word characters.
+
+    Since a value can be split between chunks, the end of a chunk is held back, when it can be
+    a start of some value (or when it ends with a full value, but the next character is still unknown).
+    The held back part is prepended to the next chunk or returned by flush() in the end.
+    """
+
+    def __init__(self, values, mask):
+        unique_values = sorted(set(values), key=len, reverse=True)
+        if not unique_values:
+            raise ValueError('At least one value should be specified')
+
+        # longer values go first, so they win, when one value is a prefix of another
+        self._pattern = re.compile(
+            r'(?<!\w)(?:' + '|'.join(re.escape(value) for value in unique_values) + r')(?!\w)')
+        self._mask = mask
+        self._max_length = len(unique_values[0])
+
+        self._prefixes = set()
+        for value in unique_values:
+            for i in range(1, len(value) + 1):
+                self._prefixes.add(value[:i])
+
+        # the last emitted character, needed for a word boundary check in the next chunk
+        self._context = ''
+        self._pending = ''
+
+    def mask(self, chunk):
+        return self._process(chunk, final=False)
+
+    def flush(self):
+        return self._process('', final=True)
+
+    def _process(self, chunk, final):
+        text = self._context + self._pending + chunk
+        start = len(self._context)
+
+        if final:
+            hold_start = len(text)
+        else:
+            hold_start = self._find_hold_start(text, start)
+
+        result = []
+        last_end = start
+        for match in self._pattern.finditer(text, start):
+            if match.start() >= hold_start:
+                break
+
+            result.append(text[last_end:match.start()])
+            result.append(self._mask)
+            last_end = match.end()
+
+        emit_end = max(last_end, hold_start)
+        result.append(text[last_end:emit_end])
+
+        self._pending = text[emit_end:]
+        if emit_end > 0:
+            self._context = text[emit_end - 1]
+
+        return ''.join(result)
+
+    def _find_hold_start(self, text, start):
+        # a value, which starts before this position, is fully visible together with the next character
+        window_start = max(start, len(text) - self._max_length)
+
+        for i in range(window_start, len(text)):
+            if text[i:] in self._prefixes:
+                return i
+
+        return len(text)
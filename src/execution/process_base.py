@@ -4,15 +4,20 @@ import os
 import signal
 import subprocess
 import threading
+from concurrent.futures import ThreadPoolExecutor
 
+from execution import process_reactor
 from react.observable import ReplayObservable
 from utils import os_utils
 
 LOGGER = logging.getLogger('script_server.process_base')
 
+# finish listeners can do IO (e.g. callbacks), so they are notified outside of the event loop
+_finish_notifier = ThreadPoolExecutor(max_workers=4, thread_name_prefix='process-finish')
+
 
 class ProcessWrapper(metaclass=abc.ABCMeta):
-    def __init__(self, command, working_directory, all_env_variables: dict):
+    def __init__(self, command, working_directory, all_env_variables: dict, output_memory_limit=None):
         self.process = None
 
         self.working_directory = working_directory
@@ -22,18 +27,26 @@ class ProcessWrapper(metaclass=abc.ABCMeta):
         self.finish_listeners = []
 
         # output_stream is guaranteed to close not earlier than process exit
-        self.output_stream = ReplayObservable()
+        self.output_stream = ReplayObservable(output_memory_limit)
 
-        self.notify_finish_thread = None
+        self._output_fd = None
+        self._output_decoder = None
+        self._drain_output_on_finish = False
+        self._output_lock = threading.Lock()
+        self._output_ended = False
+        self._process_finished = False
 
     def start(self):
         self.start_execution(self.command, self.working_directory)
 
-        read_output_thread = threading.Thread(target=self.pipe_process_output)
-        read_output_thread.start()
+        self.pipe_process_output()
+
+        self.watch_finish()
 
-        self.notify_finish_thread = threading.Thread(target=self.notify_finished)
-        self.notify_finish_thread.start()
+    def watch_finish(self):
+        process_reactor.get_reactor().watch_process(
+            self.process,
+            lambda: _finish_notifier.submit(self.notify_finished))
 
     def prepare_env_variables(self):
         env_variables = dict(**self.all_env_variables)
@@ -43,6 +56,68 @@ class ProcessWrapper(metaclass=abc.ABCMeta):
 
     @abc.abstractmethod
     def pipe_process_output(self):
+        """
+        Should start reading process output without blocking, usually via _read_output
+        """
+        pass
+
+    def _read_output(self, fd, decoder, drain_on_finish=False):
+        self._output_fd = fd
+        self._output_decoder = decoder
+        self._drain_output_on_finish = drain_on_finish
+
+        process_reactor.get_reactor().add_reader(fd, self._on_output_data, self._on_output_end)
+
+    def _on_output_data(self, data):
+        output_text = self._output_decoder.decode(data)
+        if output_text:
+            self._write_script_output(output_text)
+
+    def _on_output_end(self, error):
+        if error is not None:
+            LOGGER.error('Failed to read script output', exc_info=error)
+            self._write_script_output('\nUnexpected error occurred. Contact the administrator.')
+
+            try:
+                self.kill()
+            except:
+                LOGGER.exception('Failed to kill a process')
+        else:
+            try:
+                output_text = self._output_decoder.decode(b'', final=True)
+                if output_text:
+                    self._write_script_output(output_text)
+            except:
+                LOGGER.exception('Failed to decode output tail')
+
+        with self._output_lock:
+            self._output_ended = True
+            close_output = self._process_finished
+
+        if close_output:
+            self._close_output()
+
+    def _on_process_finished(self):
+        if self._output_fd is None:
+            return
+
+        with self._output_lock:
+            self._process_finished = True
+            close_output = self._output_ended
+
+        # output_stream should not be closed earlier than process exit
+        if close_output:
+            self._close_output()
+        elif self._drain_output_on_finish:
+            process_reactor.get_reactor().drain_reader(self._output_fd)
+
+    def _close_output(self):
+        try:
+            self.output_stream.close()
+        finally:
+            self.release_output_resources()
+
+    def release_output_resources(self):
         pass
 
     @abc.abstractmethod
@@ -109,6 +184,8 @@ class ProcessWrapper(metaclass=abc.ABCMeta):
     def notify_finished(self):
         self.wait_finish()
 
+        self._on_process_finished()
+
         for listener in self.finish_listeners:
             try:
                 listener.finished()
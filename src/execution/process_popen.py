@@ -1,7 +1,9 @@
+import codecs
+import io
+import locale
 import logging
 import os
 import subprocess
-import time
 
 from execution import process_base
 from utils import os_utils
@@ -23,8 +25,8 @@ def prepare_cmd_for_win(command):
 
 
 class POpenProcessWrapper(process_base.ProcessWrapper):
-    def __init__(self, command, working_directory, all_env_variables):
-        super().__init__(command, working_directory, all_env_variables)
+    def __init__(self, command, working_directory, all_env_variables, output_memory_limit=None):
+        super().__init__(command, working_directory, all_env_variables, output_memory_limit)
 
     def start_execution(self, command, working_directory):
         shell = False
@@ -62,43 +64,12 @@ class POpenProcessWrapper(process_base.ProcessWrapper):
         self.process.wait()
 
     def pipe_process_output(self):
-        try:
-            while True:
-                finished = False
-                wait_new_output = False
+        # the same decoding, as for universal_newlines, but done incrementally over raw chunks
+        decoder = codecs.getincrementaldecoder(locale.getpreferredencoding(False))(errors='replace')
+        decoder = io.IncrementalNewlineDecoder(decoder, translate=True)
 
-                if self.is_finished():
-                    data = self.process.stdout.read()
+        self._read_output(self.process.stdout.fileno(), decoder)
 
-                    finished = True
-
-                else:
-                    data = self.process.stdout.read(1)
-
-                    if not data:
-                        wait_new_output = True
-
-                if data:
-                    output_text = data
-                    self._write_script_output(output_text)
-
-                if finished:
-                    break
-
-                if wait_new_output:
-                    time.sleep(0.01)
-
-        except:
-            self._write_script_output("Unexpected error occurred. Contact the administrator.")
-
-            try:
-                self.kill()
-            except:
-                LOGGER.exception('Failed to kill a process')
-
-            LOGGER.exception('Failed to read script output')
-
-        finally:
-            self.output_stream.close()
-            self.process.stdout.close()
-            self.process.stdin.close()
+    def release_output_resources(self):
+        self.process.stdout.close()
+        self.process.stdin.close()
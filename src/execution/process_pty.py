@@ -1,11 +1,10 @@
-import fcntl
+import io
 import logging
 import os
 import pty
 import subprocess
 import sys
 import termios
-import time
 
 from execution import process_base
 from utils import process_utils, encoding_utils
@@ -26,8 +25,8 @@ def _unset_output_flags(fd, *new_attributes):
 
 
 class PtyProcessWrapper(process_base.ProcessWrapper):
-    def __init__(self, command, working_directory, all_env_variables):
-        super().__init__(command, working_directory, all_env_variables)
+    def __init__(self, command, working_directory, all_env_variables, output_memory_limit=None):
+        super().__init__(command, working_directory, all_env_variables, output_memory_limit)
 
         self.pty_master = None
         self.pty_slave = None
@@ -37,6 +36,9 @@ class PtyProcessWrapper(process_base.ProcessWrapper):
     def start_execution(self, command, working_directory):
         master, slave = pty.openpty()
 
+        # ONLCR - transform \n to \r\n. Should be unset before the process starts writing
+        _unset_output_flags(master, termios.ONLCR)
+
         env_variables = self.prepare_env_variables()
 
         self.process = subprocess.Popen(command,
@@ -49,10 +51,6 @@ class PtyProcessWrapper(process_base.ProcessWrapper):
         self.pty_slave = slave
         self.pty_master = master
 
-        # ONLCR - transform \n to \r\n
-        _unset_output_flags(self.pty_master, termios.ONLCR)
-        fcntl.fcntl(self.pty_master, fcntl.F_SETFL, os.O_NONBLOCK)
-
     def write_to_input(self, value):
         if self.is_finished():
             return
@@ -67,85 +65,16 @@ class PtyProcessWrapper(process_base.ProcessWrapper):
         self.process.wait()
 
     def pipe_process_output(self):
-        utf8_stream = self.encoding.lower() == 'utf-8'
-
-        buffer = b''
-
-        try:
-            while True:
-                finished = False
-                wait_new_output = False
-
-                max_read_bytes = 1024
-
-                data = buffer
-                buffer = b''
-
-                if self.is_finished():
-                    while True:
-                        try:
-                            chunk = os.read(self.pty_master, max_read_bytes)
-                            if not chunk:
-                                break
-                            data += chunk
-
-                        except BlockingIOError:
-                            break
-
-                    finished = True
-
-                else:
-                    try:
-                        data += os.read(self.pty_master, max_read_bytes)
-                        if data.endswith(b"\r"):
-                            data += os.read(self.pty_master, 1)
-
-                        if utf8_stream and data:
-                            while data[len(data) - 1] >= 127:
-                                next_byte = os.read(self.pty_master, 1)
-                                if not next_byte:
-                                    break
-
-                                data += next_byte
-                    except BlockingIOError:
-                        if self.is_finished():
-                            finished = True
-
-                    if not data:
-                        wait_new_output = True
-
-                if utf8_stream and data:
-                    while data and data[-1] >= 127:
-                        buffer = bytes([data[-1]]) + buffer
-                        data = data[:-1]
-
-                if data:
-                    try:
-                        output_text = encoding_utils.decode(data, self.encoding)
-                        self._write_script_output(output_text)
-                    except UnicodeDecodeError:
-                        LOGGER.exception('Failed to decode output chunk')
-
-                if finished:
-                    break
-
-                if wait_new_output:
-                    time.sleep(0.01)
-
-        except:
-            self._write_script_output('\nUnexpected error occurred. Contact the administrator.')
-
-            try:
-                self.kill()
-            except:
-                LOGGER.exception('Failed to kill a process')
+        decoder = encoding_utils.create_incremental_decoder(self.encoding)
+        # keeps trailing \r until the next chunk, so \r\n is not split
+        decoder = io.IncrementalNewlineDecoder(decoder, translate=False)
 
-            LOGGER.exception('Failed to read script output')
+        # PTY is not closed on process exit, so the available output is read, when the process finishes
+        self._read_output(self.pty_master, decoder, drain_on_finish=True)
 
-        finally:
-            os.close(self.pty_master)
-            os.close(self.pty_slave)
-            self.output_stream.close()
+    def release_output_resources(self):
+        os.close(self.pty_master)
+        os.close(self.pty_slave)
 
 
 def get_encoding(command, working_directory):
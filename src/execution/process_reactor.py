@@ -0,0 +1,206 @@
+import errno
+import logging
+import os
+import threading
+
+from react import event_loop
+from utils import os_utils
+
+LOGGER = logging.getLogger('script_server.execution.process_reactor')
+
+_READ_CHUNK_SIZE = 64 * 1024
+
+_EXIT_POLL_PERIOD_SEC = 0.05
+
+_reactor = None
+_reactor_lock = threading.Lock()
+
+
+def get_reactor():
+    global _reactor
+
+    with _reactor_lock:
+        if _reactor is None:
+            _reactor = ProcessReactor(event_loop.get_shared_loop())
+
+        return _reactor
+
+
+class _ReaderHandle:
+    def __init__(self, fd, data_callback, end_callback):
+        self.fd = fd
+        self.data_callback = data_callback
+        self.end_callback = end_callback
+
+
+class ProcessReactor:
+    """
+    Serves all the running processes from a single event loop: reads their output and detects their exit.
+
+    Output file descriptors are switched to non-blocking mode and read in big chunks, when they are ready.
+    data_callback(bytes) is called for each read chunk.
+    end_callback(error) is called once, when EOF is reached (error is None) or reading failed.
+
+    Process exit is detected via pidfd, if supported, or by periodic polling otherwise.
+
+    All the callbacks are called from the loop thread, so they should not block.
+    """
+
+    def __init__(self, loop: event_loop.EventLoop):
+        self._loop = loop
+        self._handles = {}
+
+        # windows doesn't support select for pipes
+        self._threaded_reading = os_utils.is_win()
+
+        self._polled_processes = []
+        self._poll_timer = None
+
+    def add_reader(self, fd, data_callback, end_callback):
+        handle = _ReaderHandle(fd, data_callback, end_callback)
+
+        if self._threaded_reading:
+            thread = threading.Thread(target=self._read_blocking, args=(handle,), daemon=True)
+            thread.start()
+            return
+
+        os.set_blocking(fd, False)
+        self._loop.call_soon(self._register, handle)
+
+    def drain_reader(self, fd):
+        """
+        Reads all the currently available data and finishes the reader, even if EOF is not reached.
+        Useful for PTY, which is kept open after the process exit.
+        """
+        if self._threaded_reading:
+            return
+
+        self._loop.call_soon(self._drain, fd)
+
+    def watch_process(self, process, callback):
+        """
+        Calls callback() once the process exits. Process is not reaped, it's up to the callback
+        """
+        pidfd = _open_pidfd(process.pid)
+        if pidfd is not None:
+            self._loop.call_soon(self._register_pidfd, pidfd, callback)
+        else:
+            self._loop.call_soon(self._add_polled_process, process, callback)
+
+    def _register(self, handle):
+        self._handles[handle.fd] = handle
+        self._loop.add_reader(handle.fd, lambda: self._read(handle))
+
+    def _read(self, handle, drain=False):
+        while True:
+            try:
+                data = os.read(handle.fd, _READ_CHUNK_SIZE)
+            except BlockingIOError:
+                if drain:
+                    self._finish(handle, None)
+                return
+            except OSError as e:
+                # PTY master returns EIO, when the slave side is closed
+                self._finish(handle, None if e.errno == errno.EIO else e)
+                return
+
+            if not data:
+                self._finish(handle, None)
+                return
+
+            try:
+                handle.data_callback(data)
+            except Exception as e:
+                self._finish(handle, e)
+                return
+
+            # one chunk per wakeup, so that a single chatty process cannot starve the others
+            if not drain:
+                return
+
+    def _drain(self, fd):
+        handle = self._handles.get(fd)
+        if handle is None:
+            return
+
+        self._read(handle, drain=True)
+
+    def _finish(self, handle, error):
+        if self._handles.get(handle.fd) is not handle:
+            return
+
+        del self._handles[handle.fd]
+        self._loop.remove_reader(handle.fd)
+
+        try:
+            handle.end_callback(error)
+        except:
+            LOGGER.exception('Failed to finish output reading')
+
+    @staticmethod
+    def _read_blocking(handle):
+        error = None
+
+        try:
+            while True:
+                data = os.read(handle.fd, _READ_CHUNK_SIZE)
+                if not data:
+                    break
+
+                handle.data_callback(data)
+        except Exception as e:
+            error = e
+
+        try:
+            handle.end_callback(error)
+        except:
+            LOGGER.exception('Failed to finish output reading')
+
+    def _register_pidfd(self, pidfd, callback):
+        def process_exited():
+            self._loop.remove_reader(pidfd)
+            os.close(pidfd)
+            callback()
+
+        self._loop.add_reader(pidfd, process_exited)
+
+    def _add_polled_process(self, process, callback):
+        self._polled_processes.append((process, callback))
+
+        if self._poll_timer is None:
+            self._poll_timer = self._loop.call_later(_EXIT_POLL_PERIOD_SEC, self._poll_processes)
+
+    def _poll_processes(self):
+        self._poll_timer = None
+
+        running = []
+        for (process, callback) in self._polled_processes:
+            try:
+                finished = process.poll() is not None
+            except:
+                LOGGER.exception('Failed to check process state')
+                finished = True
+
+            if finished:
+                try:
+                    callback()
+                except:
+                    LOGGER.exception('Failed to notify about process exit')
+            else:
+                running.append((process, callback))
+
+        self._polled_processes = running
+
+        if running:
+            self._poll_timer = self._loop.call_later(_EXIT_POLL_PERIOD_SEC, self._poll_processes)
+
+
+def _open_pidfd(pid):
+    if not hasattr(os, 'pidfd_open'):
+        return None
+
+    try:
+        return os.pidfd_open(pid)
+    except OSError:
+        # e.g. kernel older than 5.3
+        return None
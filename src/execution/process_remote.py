@@ -0,0 +1,140 @@
+import logging
+import socket
+import threading
+
+from execution import agent_protocol, process_base
+from execution.agent_protocol import MessageChannel
+from execution.execution_agents import ExecutionAgent
+
+LOGGER = logging.getLogger('script_server.process_remote')
+
+CONNECT_TIMEOUT_SEC = 10
+
+# the process couldn't report its exit code (e.g. the agent was disconnected)
+UNKNOWN_EXIT_CODE = -1
+
+
+class RemoteProcessWrapper(process_base.ProcessWrapper):
+    """
+    Runs the command on an execution agent. Only script specific env variables are passed to the agent,
+    the rest is taken from the agent environment.
+    """
+
+    def __init__(self, agent: ExecutionAgent, command, working_directory, env_variables, output_memory_limit=None):
+        super().__init__(command, working_directory, env_variables, output_memory_limit)
+
+        self.agent = agent
+
+        self._channel = None
+        self._pid = None
+        self._return_code = None
+        self._finished = threading.Event()
+
+    def start(self):
+        self.start_execution(self.command, self.working_directory)
+
+        self.pipe_process_output()
+
+    def start_execution(self, command, working_directory):
+        sock = socket.create_connection((self.agent.host, self.agent.port), timeout=CONNECT_TIMEOUT_SEC)
+        sock.settimeout(None)
+
+        channel = MessageChannel(sock)
+        try:
+            channel.send(agent_protocol.START,
+                         token=self.agent.token,
+                         command=[str(arg) for arg in command],
+                         working_directory=working_directory,
+                         env={name: str(value) for name, value in (self.all_env_variables or {}).items()})
+
+            response = channel.receive()
+            if response is None:
+                raise Exception('Agent ' + str(self.agent) + ' closed the connection')
+
+            if response['type'] != agent_protocol.STARTED:
+                raise Exception('Agent ' + str(self.agent) + ' failed to start the script: '
+                                + str(response.get('message')))
+        except:
+            channel.close()
+            raise
+
+        self._channel = channel
+        self._pid = response.get('pid')
+
+    def pipe_process_output(self):
+        thread = threading.Thread(target=self._read_messages,
+                                  name='remote-output-' + str(self._pid),
+                                  daemon=True)
+        thread.start()
+
+    def _read_messages(self):
+        return_code = UNKNOWN_EXIT_CODE
+
+        try:
+            while True:
+                message = self._channel.receive()
+                if message is None:
+                    self._write_script_output('\n>> Connection to the agent is lost\n')
+                    break
+
+                message_type = message['type']
+                if message_type == agent_protocol.OUTPUT:
+                    self._write_script_output(message.get('data', ''))
+                elif message_type == agent_protocol.EXIT:
+                    return_code = message.get('code')
+                    break
+                else:
+                    LOGGER.warning('Unexpected message from agent ' + str(self.agent) + ': ' + message_type)
+        except:
+            LOGGER.exception('Failed to read messages from agent ' + str(self.agent))
+            self._write_script_output('\n>> Connection to the agent is lost\n')
+
+        self._channel.close()
+
+        self._return_code = return_code
+        self._finished.set()
+
+        try:
+            self.output_stream.close()
+        finally:
+            process_base._finish_notifier.submit(self.notify_finished)
+
+    def write_to_input(self, value):
+        if self.is_finished():
+            return
+
+        input_value = value
+        if not value.endswith("\n"):
+            input_value += "\n"
+
+        self._write_script_output(input_value)
+
+        self._send_command(agent_protocol.INPUT, data=input_value)
+
+    def _send_command(self, command, **fields):
+        try:
+            self._channel.send(command, **fields)
+        except OSError:
+            LOGGER.warning('Failed to send ' + command + ' to agent ' + str(self.agent))
+
+    def wait_finish(self):
+        self._finished.wait()
+
+    def get_process_id(self):
+        return self._pid
+
+    def is_finished(self):
+        return self._finished.is_set()
+
+    def get_return_code(self):
+        return self._return_code
+
+    def stop(self):
+        if not self.is_finished():
+            self._send_command(agent_protocol.STOP)
+            self._write_script_output('\n>> STOPPED BY USER\n')
+
+    def kill(self):
+        if not self.is_finished():
+            self._send_command(agent_protocol.KILL)
+            self._write_script_output('\n>> KILLED\n')
@@ -9,6 +9,7 @@ import migrations.migrate
 from auth.authorization import create_group_provider, Authorizer
 from communications.alerts_service import AlertsService
 from config.config_service import ConfigService
+from execution.execution_agents import AgentPool, ExecutionAgent
 from execution.execution_service import ExecutionService
 from execution.id_generator import IdGenerator
 from execution.logging import ExecutionLoggingService, LogNameCreator, ExecutionLoggingController
@@ -18,11 +19,12 @@ from features.file_download_feature import FileDownloadFeature
 from features.file_upload_feature import FileUploadFeature
 from files.user_file_storage import UserFileStorage
 from model import server_conf
+from model.script_output_cache import ScriptOutputCache
 from scheduling.schedule_service import ScheduleService
-from utils import tool_utils, file_utils
+from utils import tool_utils, file_utils, os_utils
 from utils.process_utils import ProcessInvoker
 from utils.tool_utils import InvalidWebBuildException
-from web import server
+from web import server, worker_proxy
 from web.client import tornado_client_config
 
 parser = argparse.ArgumentParser(description='Launch script-server.')
@@ -85,9 +87,23 @@ def main():
 
     migrations.migrate.migrate(TEMP_FOLDER, CONFIG_FOLDER, SERVER_CONF_PATH, LOG_FOLDER)
 
-    server_config = server_conf.from_json(SERVER_CONF_PATH, TEMP_FOLDER)
+    process_settings = server_conf.read_process_settings(SERVER_CONF_PATH, TEMP_FOLDER)
+
+    # should be created before forking, so that all the workers share the same secret
+    secret = get_secret(process_settings.secret_storage_file)
+
+    worker = None
+    if process_settings.server_workers > 1:
+        if os_utils.is_win():
+            LOGGER.warning('Multiple server workers are not supported on Windows, starting a single process')
+        else:
+            worker = worker_proxy.fork_workers(process_settings.server_workers, TEMP_FOLDER)
 
-    secret = get_secret(server_config.secret_storage_file)
+            if worker.is_primary:
+                LOGGER.info('Started ' + str(worker.count) + ' server workers. '
+                            + 'Executions are owned by the primary worker, their output is shared with the others')
+
+    server_config = server_conf.from_json(SERVER_CONF_PATH, TEMP_FOLDER)
 
     tornado_client_config.initialize()
 
@@ -103,22 +119,77 @@ def main():
 
     process_invoker = ProcessInvoker(server_config.env_vars)
 
+    values_cache_config = server_config.script_values_cache_config
+    script_output_cache = ScriptOutputCache(
+        values_cache_config.ttl_sec,
+        values_cache_config.stale_ttl_sec,
+        values_cache_config.max_entries)
+
     config_service = ConfigService(
-        authorizer, CONFIG_FOLDER, server_config.groups_config.group_by_folders, process_invoker)
+        authorizer,
+        CONFIG_FOLDER,
+        server_config.groups_config.group_by_folders,
+        process_invoker,
+        script_output_cache)
+    config_service.start_watching()
 
     alerts_service = AlertsService(server_config.alerts_config)
     alerts_service = alerts_service
 
+    if (worker is not None) and (not worker.is_primary):
+        # executions and schedules are proxied to the primary worker
+        file_download_feature = FileDownloadFeature(UserFileStorage(secret), TEMP_FOLDER)
+
+        server.init(
+            server_config,
+            server_config.authenticator,
+            authorizer,
+            None,
+            None,
+            None,
+            config_service,
+            alerts_service,
+            None,
+            file_download_feature,
+            secret,
+            server_version,
+            CONFIG_FOLDER,
+            worker=worker)
+        return
+
     execution_logs_path = os.path.join(LOG_FOLDER, 'processes')
     log_name_creator = LogNameCreator(
         server_config.logging_config.filename_pattern,
         server_config.logging_config.date_format)
-    execution_logging_service = ExecutionLoggingService(execution_logs_path, log_name_creator, authorizer)
+    logging_config = server_config.logging_config
+    execution_logging_service = ExecutionLoggingService(
+        execution_logs_path,
+        log_name_creator,
+        authorizer,
+        index_file_path=os.path.join(LOG_FOLDER, 'history_index.sqlite'),
+        flush_size=logging_config.flush_size,
+        flush_interval_ms=logging_config.flush_interval_ms,
+        compress_logs=logging_config.compress)
 
     existing_ids = [entry.id for entry in execution_logging_service.get_history_entries(None, system_call=True)]
     id_generator = IdGenerator(existing_ids)
 
-    execution_service = ExecutionService(authorizer, id_generator, server_config.env_vars)
+    execution_limits = server_config.execution_limits_config
+
+    agent_pool = None
+    if server_config.execution_agents:
+        agent_pool = AgentPool([ExecutionAgent(agent.name, agent.host, agent.port, agent.capacity, agent.labels,
+                                               agent.token)
+                                for agent in server_config.execution_agents])
+
+    execution_service = ExecutionService(authorizer,
+                                         id_generator,
+                                         server_config.env_vars,
+                                         output_memory_limit=server_config.max_output_memory_mb * 1024 * 1024,
+                                         max_concurrent=execution_limits.max_concurrent,
+                                         max_concurrent_per_user=execution_limits.max_concurrent_per_user,
+                                         workers=execution_limits.workers,
+                                         agent_pool=agent_pool)
 
     execution_logging_controller = ExecutionLoggingController(execution_service, execution_logging_service)
     execution_logging_controller.start()
@@ -151,7 +222,8 @@ def main():
         file_download_feature,
         secret,
         server_version,
-        CONFIG_FOLDER)
+        CONFIG_FOLDER,
+        worker=worker)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,54 @@
+import threading
+
+from utils.process_utils import ProcessInvoker
+
+
+class ConfigTemplate:
+    """
+    State, which is shared between all the models of the same config version.
+    At the moment these are outputs of the scripts, which don't depend on parameter values
+    (e.g. values scripts and default value scripts without ${parameter} references).
+
+    Models keep a reference to their template, so a template lives as long as any of its models.
+
+    Can be used instead of ProcessInvoker for such static scripts: each script is executed only once,
+    even if requested by multiple models concurrently.
+    """
+
+    def __init__(self, process_invoker: ProcessInvoker):
+        self._process_invoker = process_invoker
+
+        self._lock = threading.Lock()
+        self._outputs = {}
+        self._script_locks = {}
+
+    def invoke(self, command, work_dir='.', *, environment_variables: dict = None, check_stderr=True, shell=False):
+        if environment_variables:
+            # not a static script
+            return self._process_invoker.invoke(command, work_dir,
+                                                environment_variables=environment_variables,
+                                                check_stderr=check_stderr,
+                                                shell=shell)
+
+        command_key = tuple(command) if isinstance(command, list) else command
+        key = (command_key, work_dir, shell)
+
+        with self._lock:
+            if key in self._outputs:
+                return self._outputs[key]
+
+            script_lock = self._script_locks.setdefault(key, threading.Lock())
+
+        with script_lock:
+            with self._lock:
+                if key in self._outputs:
+                    return self._outputs[key]
+
+            # failures are not cached, so that the next model can retry
+            output = self._process_invoker.invoke(command, work_dir, check_stderr=check_stderr, shell=shell)
+
+            with self._lock:
+                self._outputs[key] = output
+                del self._script_locks[key]
+
+            return output
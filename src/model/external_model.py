@@ -1,7 +1,18 @@
-from datetime import timezone
+from collections import namedtuple
+from datetime import timezone, datetime
 
+from execution.history_index import HistoryFilter
 from utils import date_utils
 
+HistoryQuery = namedtuple('HistoryQuery', ['history_filter', 'sort_by', 'descending', 'offset', 'limit'])
+
+_HISTORY_SORT_FIELDS = {
+    'startTime': 'start_time',
+    'script': 'script_name',
+    'user': 'user_name',
+    'exitCode': 'exit_code'
+}
+
 
 class ExecutionInfo(object):
     def __init__(self):
@@ -95,6 +106,75 @@ def _translate_history_entry(entry, running):
     }
 
 
+def to_history_query(request_parameters):
+    sort = request_parameters.get('sort')
+    sort_by = None
+    descending = False
+    if sort:
+        if sort.startswith('-'):
+            descending = True
+            sort = sort[1:]
+
+        sort_by = _HISTORY_SORT_FIELDS.get(sort)
+        if sort_by is None:
+            raise ValueError('Unsupported sort field: ' + sort)
+
+    history_filter = HistoryFilter(
+        script_name=request_parameters.get('script'),
+        user_name=request_parameters.get('user'),
+        exit_code=_parse_history_int(request_parameters, 'exitCode'),
+        start_time_from=_parse_history_datetime(request_parameters, 'startTimeFrom'),
+        start_time_to=_parse_history_datetime(request_parameters, 'startTimeTo'))
+
+    offset = _parse_history_int(request_parameters, 'offset', min_value=0)
+    limit = _parse_history_int(request_parameters, 'limit', min_value=0)
+
+    return HistoryQuery(
+        history_filter=history_filter,
+        sort_by=sort_by,
+        descending=descending,
+        offset=offset if offset is not None else 0,
+        limit=limit)
+
+
+def _parse_history_int(request_parameters, name, min_value=None):
+    value = request_parameters.get(name)
+    if value is None or value == '':
+        return None
+
+    try:
+        result = int(value)
+    except ValueError:
+        raise ValueError(name + ' should be an integer, but was ' + value)
+
+    if (min_value is not None) and (result < min_value):
+        raise ValueError(name + ' should be >= ' + str(min_value))
+
+    return result
+
+
+def _parse_history_datetime(request_parameters, name):
+    value = request_parameters.get(name)
+    if not value:
+        return None
+
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+
+    try:
+        result = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(name + ' should be an ISO datetime, but was ' + value)
+
+    if result.tzinfo is None:
+        result = result.replace(tzinfo=timezone.utc)
+
+    return result
+
+
+STATUS_QUEUED = 'queued'
+
+
 def running_flag_to_status(running):
     return 'running' if running else 'finished'
 
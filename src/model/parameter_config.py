@@ -9,6 +9,8 @@ from config.constants import PARAM_TYPE_SERVER_FILE, FILE_TYPE_FILE, PARAM_TYPE_
 from config.script.list_values import ConstValuesProvider, ScriptValuesProvider, EmptyValuesProvider, \
     DependantScriptValuesProvider, NoneValuesProvider, FilesProvider
 from model import model_helper
+from model.config_template import ConfigTemplate
+from model.script_output_cache import ScriptOutputCache
 from model.model_helper import resolve_env_vars, replace_auth_vars, is_empty, SECURE_MASK, \
     normalize_extension, read_bool_from_config, InvalidValueException, read_str_from_config, read_int_from_config
 from model.template_property import TemplateProperty
@@ -17,7 +19,7 @@ from model.value_wrapper import ScriptValueWrapper
 from react.properties import ObservableDict, observable_fields
 from utils import file_utils, string_utils
 from utils.file_utils import FileMatcher
-from utils.process_utils import ProcessInvoker
+from utils.process_utils import ProcessInvoker, InvocationCancelledException
 from utils.string_utils import strip
 
 LOGGER = logging.getLogger('script_server.parameter_config')
@@ -55,12 +57,17 @@ class ParameterModel(object):
                  other_params_supplier,
                  process_invoker: ProcessInvoker,
                  other_param_values: ObservableDict = None,
-                 working_dir=None):
+                 working_dir=None,
+                 config_template: ConfigTemplate = None,
+                 script_output_cache: ScriptOutputCache = None):
         self._username = username
         self._audit_name = audit_name
         self._parameters_supplier = other_params_supplier
         self._working_dir = working_dir
         self._process_invoker = process_invoker
+        # scripts without parameter dependencies are executed once per template
+        self._static_process_invoker = config_template if config_template is not None else process_invoker
+        self._script_output_cache = script_output_cache
 
         self.name = parameter_config.get('name')
         self.pass_as: PassAsConfiguration = _read_pass_as(parameter_config, self.name)
@@ -97,15 +104,17 @@ class ParameterModel(object):
             default='single_argument',
             allowed_values=['single_argument', 'argument_per_value', 'repeat_param_value'])
         self.type = self._read_type(config)
+        default_config = config.get('default')
         self._set_default_value(
-            config.get('default'),
+            default_config,
             self._username,
             self._audit_name,
             self._working_dir,
             self.type,
             self._parameters_supplier(),
             self._parameter_value_wrappers,
-            self._process_invoker)
+            self._get_script_invoker(default_config, static=False),
+            self._get_script_invoker(default_config, static=True))
         self.file_dir = _resolve_file_dir(config, 'file_dir')
         self._list_files_dir = _resolve_list_files_dir(self.file_dir, self._working_dir)
         self.file_extensions = _resolve_file_extensions(config, 'file_extensions')
@@ -133,7 +142,7 @@ class ParameterModel(object):
             self.type,
             self.constant)
         self._values_provider = values_provider
-        self._reload_values()
+        self.reload_values()
 
     def _validate_config(self):
         param_log_name = self.str_name()
@@ -198,15 +207,21 @@ class ParameterModel(object):
         if key not in values_provider.get_required_parameters():
             return
 
-        self._reload_values()
+        self.reload_values()
 
-    def _reload_values(self):
+    def reload_values(self):
         values_provider = self._values_provider
         if not values_provider:
             self.values = None
             return
 
-        values = values_provider.get_values(self._parameter_value_wrappers)
+        try:
+            values = values_provider.get_values(self._parameter_value_wrappers)
+        except InvocationCancelledException:
+            # a newer evaluation is coming, old values are kept till then
+            LOGGER.debug('Values evaluation of ' + self.str_name() + ' was cancelled')
+            return
+
         self.values = values
 
     def _create_values_provider(self, values_config, type, constant):
@@ -234,14 +249,27 @@ class ParameterModel(object):
             shell = read_bool_from_config('shell', values_config, default=not has_variables)
 
             if '${' not in script:
-                return ScriptValuesProvider(script, shell, self._process_invoker)
+                return ScriptValuesProvider(script, shell, self._get_script_invoker(values_config, static=True))
 
-            return DependantScriptValuesProvider(script, self._parameters_supplier, shell, self._process_invoker)
+            return DependantScriptValuesProvider(script, self._parameters_supplier, shell,
+                                                 self._get_script_invoker(values_config, static=False))
 
         else:
             message = 'Unsupported "values" format for ' + self.name
             raise Exception(message)
 
+    def _get_script_invoker(self, script_config, static):
+        if isinstance(script_config, dict) and (self._script_output_cache is not None):
+            cache_ttl = read_int_from_config('cache_ttl', script_config)
+            if cache_ttl is None:
+                cache_ttl = self._script_output_cache.default_ttl_sec
+
+            # cache_ttl=0 disables caching for the parameter
+            if cache_ttl > 0:
+                return self._script_output_cache.invoker(self._process_invoker, cache_ttl)
+
+        return self._static_process_invoker if static else self._process_invoker
+
     def get_required_parameters(self):
         if not self._values_provider:
             return []
@@ -504,7 +532,8 @@ class ParameterModel(object):
             type,
             parameters,
             parameter_value_wrappers,
-            process_invoker: ProcessInvoker):
+            process_invoker: ProcessInvoker,
+            static_process_invoker):
         if is_empty(default_config):
             self._default = default_config
             return
@@ -530,8 +559,8 @@ class ParameterModel(object):
         template_property = TemplateProperty(resolved_string_value, parameters, parameter_value_wrappers)
         shell = read_bool_from_config('shell', default_config, default=is_empty(template_property.required_parameters))
 
-        def get_script_output(script):
-            output = process_invoker.invoke(script, working_dir, shell=shell)
+        def get_script_output(script, invoker):
+            output = invoker.invoke(script, working_dir, shell=shell)
             stripped_output = output.strip()
 
             if type == PARAM_TYPE_MULTISELECT and '\n' in stripped_output:
@@ -540,13 +569,16 @@ class ParameterModel(object):
             return stripped_output
 
         if not template_property.required_parameters:
-            self._default = get_script_output(resolved_string_value)
+            self._default = get_script_output(resolved_string_value, static_process_invoker)
         else:
             def update_default(_, new):
                 if new is None:
                     self._default = None
                 else:
-                    self._default = get_script_output(new)
+                    try:
+                        self._default = get_script_output(new, process_invoker)
+                    except InvocationCancelledException:
+                        LOGGER.debug('Default value evaluation of ' + self.str_name() + ' was cancelled')
 
             template_property.subscribe(update_default)
             update_default(None, template_property.value)
@@ -1,15 +1,18 @@
 import logging
 import os
 from collections import OrderedDict
+from concurrent.futures.thread import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from typing import List, Optional
 
 from auth.authorization import ANY_USER
 from config.exceptions import InvalidConfigException
 from model import parameter_config
+from model.config_template import ConfigTemplate
 from model.model_helper import is_empty, read_bool_from_config, InvalidValueException, \
-    read_str_from_config, replace_auth_vars, read_list
+    read_str_from_config, replace_auth_vars, read_list, read_int_from_config
 from model.parameter_config import ParameterModel
+from model.script_output_cache import ScriptOutputCache
 from model.server_conf import LoggingConfig
 from model.template_property import TemplateProperty
 from react.properties import ObservableList, ObservableDict, observable_fields
@@ -23,6 +26,9 @@ OUTPUT_FORMATS = [OUTPUT_FORMAT_TERMINAL, 'html', 'html_iframe', 'text']
 
 LOGGER = logging.getLogger('script_server.script_config')
 
+# shared between all the models, so that many simultaneous form loads don't spawn too many scripts
+_PARAMETERS_INIT_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix='parameters-init')
+
 
 @dataclass
 class ShortConfig:
@@ -65,7 +71,9 @@ class ConfigModel:
                  group_by_folders: bool,
                  script_configs_folder: str,
                  process_invoker: ProcessInvoker,
-                 pty_enabled_default=True):
+                 pty_enabled_default=True,
+                 config_template: ConfigTemplate = None,
+                 script_output_cache: ScriptOutputCache = None):
         super().__init__()
 
         short_config = read_short(path, config_object, group_by_folders, script_configs_folder)
@@ -73,6 +81,8 @@ class ConfigModel:
         self._pty_enabled_default = pty_enabled_default
         self._config_folder = script_configs_folder
         self._process_invoker = process_invoker
+        self._config_template = config_template
+        self._script_output_cache = script_output_cache
 
         self._username = username
         self._audit_name = audit_name
@@ -114,6 +124,14 @@ class ConfigModel:
 
         self.parameter_values[param_name] = value_wrapper
 
+    def reload_dependant_values(self, param_names):
+        """
+        Re-evaluates values of the parameters, which depend on any of param_names
+        """
+        for parameter in self.parameters:
+            if not set(parameter.get_required_parameters()).isdisjoint(param_names):
+                parameter.reload_values()
+
     def set_all_param_values(self, param_values, skip_invalid_parameters=False):
         original_values = dict(self.parameter_values)
         processed = {}
@@ -176,18 +194,46 @@ class ConfigModel:
 
     def _init_parameters(self, username, audit_name):
         original_parameter_configs = self._original_config.get('parameters', [])
-        for parameter_config in original_parameter_configs:
-            parameter = ParameterModel(parameter_config, username, audit_name,
-                                       lambda: self.parameters,
-                                       self._process_invoker,
-                                       self.parameter_values,
-                                       self.working_directory)
+        for parameter in self._create_parameters(original_parameter_configs, username, audit_name):
             self.parameters.append(parameter)
 
         self._reload_parameters({})
 
         self._validate_parameter_configs()
 
+    def _create_parameters(self, parameter_configs, username, audit_name):
+        """
+        Parameters with scripts, which don't depend on other parameters, are created concurrently.
+        They don't subscribe to other parameters during creation, so the order of observers is still preserved.
+        Dependant parameters don't run their scripts until values are set, so they are created in place.
+        """
+        independent_indices = [i for i, config in enumerate(parameter_configs)
+                                if _is_independent_script_parameter(config, username, audit_name)]
+
+        futures = {}
+        if len(independent_indices) > 1:
+            for i in independent_indices:
+                futures[i] = _PARAMETERS_INIT_EXECUTOR.submit(
+                    self._create_parameter, parameter_configs[i], username, audit_name)
+
+        parameters = []
+        for i, parameter_config in enumerate(parameter_configs):
+            if i in futures:
+                parameters.append(futures[i].result())
+            else:
+                parameters.append(self._create_parameter(parameter_config, username, audit_name))
+
+        return parameters
+
+    def _create_parameter(self, parameter_config, username, audit_name):
+        return ParameterModel(parameter_config, username, audit_name,
+                              lambda: self.parameters,
+                              self._process_invoker,
+                              self.parameter_values,
+                              self.working_directory,
+                              self._config_template,
+                              self._script_output_cache)
+
     def _reload(self, old_included_config):
         self._reload_config()
         self._reload_parameters(old_included_config)
@@ -207,6 +253,14 @@ class ConfigModel:
 
         self.access = config.get('access', {})
 
+        self.max_concurrent_executions = read_int_from_config('max_concurrent_executions', config)
+
+        # None means local execution, otherwise the script is executed by an agent with all these labels
+        if config.get('agent_labels') is not None:
+            self.agent_labels = read_list(config, 'agent_labels')
+        else:
+            self.agent_labels = None
+
         self.output_format = read_output_format(config)
 
         self.output_files = config.get('output_files', [])
@@ -242,11 +296,7 @@ class ConfigModel:
                 parameter_name = parameter_config.get('name')
                 parameter = self.find_parameter(parameter_name)
                 if parameter is None:
-                    parameter = ParameterModel(parameter_config, self._username, self._audit_name,
-                                               lambda: self.parameters,
-                                               self._process_invoker,
-                                               self.parameter_values,
-                                               self.working_directory)
+                    parameter = self._create_parameter(parameter_config, self._username, self._audit_name)
                     self.parameters.append(parameter)
 
                     if parameter.name not in self.parameter_values:
@@ -441,3 +491,16 @@ def read_output_format(config):
         raise InvalidConfigException('Invalid output format, should be one of: ' + str(OUTPUT_FORMATS))
 
     return output_format
+
+
+def _is_independent_script_parameter(parameter_config, username, audit_name):
+    scripts = []
+    for key in ('values', 'default'):
+        script_config = parameter_config.get(key)
+        if isinstance(script_config, dict) and isinstance(script_config.get('script'), str):
+            scripts.append(script_config['script'])
+
+    if not scripts:
+        return False
+
+    return all('${' not in replace_auth_vars(script, username, audit_name) for script in scripts)
@@ -0,0 +1,185 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures.thread import ThreadPoolExecutor
+from typing import NamedTuple
+
+from utils.process_utils import ProcessInvoker
+
+LOGGER = logging.getLogger('script_server.script_output_cache')
+
+DEFAULT_MAX_ENTRIES = 1000
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    stale_hits: int
+    misses: int
+    size: int
+
+    @property
+    def hit_ratio(self):
+        requests = self.hits + self.stale_hits + self.misses
+        if requests == 0:
+            return 0.0
+
+        return (self.hits + self.stale_hits) / requests
+
+
+class _CacheEntry:
+    def __init__(self, output, created):
+        self.output = output
+        self.created = created
+        self.refreshing = False
+
+
+class ScriptOutputCache:
+    """
+    Server-wide LRU cache of outputs of values and default value scripts.
+
+    Outputs are keyed by the rendered command (i.e. with parameter values and auth variables substituted),
+    so user-dependent scripts are cached per user automatically.
+
+    An output is fresh for ttl seconds. After that it's still returned during stale_ttl seconds,
+    but the script is re-executed in background (stale-while-revalidate).
+    Failures are not cached.
+    """
+
+    def __init__(self, ttl_sec=0, stale_ttl_sec=0, max_entries=DEFAULT_MAX_ENTRIES):
+        self.default_ttl_sec = ttl_sec
+        self._stale_ttl_sec = stale_ttl_sec
+        self._max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._script_locks = {}
+
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+
+        self._refresh_executor = None
+
+    def invoker(self, process_invoker: ProcessInvoker, ttl_sec=None):
+        """
+        :return: an object, which can be used instead of process_invoker for cached scripts
+        """
+        if ttl_sec is None:
+            ttl_sec = self.default_ttl_sec
+
+        return _CachingInvoker(self, process_invoker, ttl_sec)
+
+    def invoke(self, process_invoker: ProcessInvoker, command, work_dir='.', *, shell=False, ttl_sec=None):
+        if ttl_sec is None:
+            ttl_sec = self.default_ttl_sec
+
+        if ttl_sec <= 0:
+            return process_invoker.invoke(command, work_dir, shell=shell)
+
+        command_key = tuple(command) if isinstance(command, list) else command
+        key = (command_key, work_dir, shell)
+
+        with self._lock:
+            output = self._get_cached(key, ttl_sec, process_invoker, command, work_dir, shell)
+            if output is not None:
+                return output
+
+            script_lock = self._script_locks.setdefault(key, threading.Lock())
+
+        with script_lock:
+            with self._lock:
+                # the same script could be executed by another thread in the meantime
+                entry = self._entries.get(key)
+                if (entry is not None) and (self._age(entry) < ttl_sec):
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return entry.output
+
+                self._misses += 1
+
+            try:
+                output = process_invoker.invoke(command, work_dir, shell=shell)
+            finally:
+                with self._lock:
+                    self._script_locks.pop(key, None)
+
+            self._put(key, output)
+            return output
+
+    def get_stats(self):
+        with self._lock:
+            return CacheStats(self._hits, self._stale_hits, self._misses, len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _get_cached(self, key, ttl_sec, process_invoker, command, work_dir, shell):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        age = self._age(entry)
+        if age < ttl_sec:
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry.output
+
+        if age < ttl_sec + self._stale_ttl_sec:
+            self._entries.move_to_end(key)
+            self._stale_hits += 1
+
+            if not entry.refreshing:
+                entry.refreshing = True
+                self._get_refresh_executor().submit(
+                    self._refresh, key, entry, process_invoker, command, work_dir, shell)
+
+            return entry.output
+
+        del self._entries[key]
+        return None
+
+    def _refresh(self, key, entry, process_invoker, command, work_dir, shell):
+        try:
+            output = process_invoker.invoke(command, work_dir, shell=shell)
+        except:
+            LOGGER.exception('Failed to refresh cached output of ' + str(command))
+            entry.refreshing = False
+            return
+
+        self._put(key, output)
+
+    def _put(self, key, output):
+        with self._lock:
+            self._entries[key] = _CacheEntry(output, time.monotonic())
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def _get_refresh_executor(self):
+        if self._refresh_executor is None:
+            self._refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='script-output-refresh')
+
+        return self._refresh_executor
+
+    @staticmethod
+    def _age(entry):
+        return time.monotonic() - entry.created
+
+
+class _CachingInvoker:
+    def __init__(self, cache: ScriptOutputCache, process_invoker: ProcessInvoker, ttl_sec):
+        self._cache = cache
+        self._process_invoker = process_invoker
+        self._ttl_sec = ttl_sec
+
+    def invoke(self, command, work_dir='.', *, environment_variables: dict = None, check_stderr=True, shell=False):
+        if environment_variables or not check_stderr:
+            return self._process_invoker.invoke(command, work_dir,
+                                                environment_variables=environment_variables,
+                                                check_stderr=check_stderr,
+                                                shell=shell)
+
+        return self._cache.invoke(self._process_invoker, command, work_dir, shell=shell, ttl_sec=self._ttl_sec)
@@ -1,5 +1,6 @@
 import logging
 import os
+from typing import NamedTuple, List
 
 import utils.custom_json as custom_json
 import utils.file_utils as file_utils
@@ -30,6 +31,9 @@ class ServerConfig(object):
         self.alerts_config = None
         self.logging_config = None
         self.groups_config = ScriptGroupsConfig()  # type: ScriptGroupsConfig
+        self.script_values_cache_config = ScriptValuesCacheConfig()  # type: ScriptValuesCacheConfig
+        self.execution_limits_config = ExecutionLimitsConfig()  # type: ExecutionLimitsConfig
+        self.execution_agents = []  # type: List[ExecutionAgentConfig]
         self.admin_config = None
         self.title = None
         self.enable_script_titles = None
@@ -39,6 +43,13 @@ class ServerConfig(object):
         self.full_history_users = []
         self.code_editor_users = []
         self.max_request_size_mb = None
+        self.max_output_memory_mb = None
+        # size of the thread pool for blocking operations of request handlers
+        self.handler_workers = 8
+        # number of server processes, more than 1 enables the multi-process mode.
+        # Executions, schedules and the history are owned by the primary process, the other processes
+        # serve the rest of the endpoints and share execution output with their viewers
+        self.server_workers = 1
         self.callbacks_config = None
         self.user_header_name = None
         self.secret_storage_file = None
@@ -65,6 +76,9 @@ class LoggingConfig:
         self.filename_pattern = filename_pattern
         self.date_format = date_format
         self.enabled = enabled
+        self.flush_size = None
+        self.flush_interval_ms = None
+        self.compress = False
 
     @classmethod
     def from_json(cls, json_config):
@@ -75,6 +89,10 @@ class LoggingConfig:
             config.filename_pattern = json_logging_config.get('execution_file')
             config.date_format = json_logging_config.get('execution_date_format')
             config.enabled = model_helper.read_bool_from_config('enabled', json_logging_config, default=True)
+            config.flush_size = read_int_from_config('execution_flush_size', json_logging_config)
+            config.flush_interval_ms = read_int_from_config('execution_flush_interval', json_logging_config)
+            config.compress = model_helper.read_bool_from_config('execution_compress', json_logging_config,
+                                                                 default=False)
 
         return config
 
@@ -97,11 +115,82 @@ class ScriptGroupsConfig:
         return config
 
 
+class ScriptValuesCacheConfig:
+
+    def __init__(self) -> None:
+        # 0 means, that outputs are cached only for parameters with explicit cache_ttl
+        self.ttl_sec = 0
+        self.stale_ttl_sec = 0
+        self.max_entries = 1000
+
+    @classmethod
+    def from_json(cls, json_config):
+        config = ScriptValuesCacheConfig()
+
+        if json_config:
+            config.ttl_sec = read_int_from_config('ttl', json_config, default=config.ttl_sec)
+            config.stale_ttl_sec = read_int_from_config('stale_ttl', json_config, default=config.stale_ttl_sec)
+            config.max_entries = read_int_from_config('max_entries', json_config, default=config.max_entries)
+
+        return config
+
+
+class ExecutionLimitsConfig:
+
+    def __init__(self) -> None:
+        # None means unlimited
+        self.max_concurrent = None
+        self.max_concurrent_per_user = None
+        # when set, executions are always queued and started by a pool of this many workers
+        self.workers = None
+
+    @classmethod
+    def from_json(cls, json_config):
+        config = ExecutionLimitsConfig()
+
+        if json_config:
+            config.max_concurrent = read_int_from_config('max_concurrent', json_config)
+            config.max_concurrent_per_user = read_int_from_config('max_concurrent_per_user', json_config)
+            config.workers = read_int_from_config('workers', json_config)
+
+        return config
+
+
+class ExecutionAgentConfig:
+
+    def __init__(self, name, host, port, capacity=1, labels=None, token=None) -> None:
+        self.name = name
+        self.host = host
+        self.port = port
+        self.capacity = capacity
+        self.labels = labels if labels is not None else []
+        self.token = token
+
+    @classmethod
+    def from_json(cls, json_config):
+        host = model_helper.read_obligatory(json_config, 'host', ' for execution agent')
+        port = read_int_from_config('port', json_config, default=5100)
+        name = model_helper.read_str_from_config(json_config, 'name', default=host + ':' + str(port))
+        capacity = read_int_from_config('capacity', json_config, default=1)
+        if capacity < 1:
+            raise Exception('Capacity of execution agent ' + name + ' should be positive')
+
+        token = model_helper.resolve_env_vars(json_config.get('token'), full_match=True)
+
+        return ExecutionAgentConfig(name, host, port, capacity, read_list(json_config, 'labels'), token)
+
+
+def _read_execution_agents(json_object):
+    agent_configs = read_list(json_object, 'execution_agents')
+    return [ExecutionAgentConfig.from_json(agent_config) for agent_config in agent_configs]
+
+
 def _build_env_vars(json_object):
     sensitive_config_paths = [
         ['auth', 'secret'],
         ['alerts', 'destinations', 'password'],
-        ['callbacks', 'destinations', 'password']
+        ['callbacks', 'destinations', 'password'],
+        ['execution_agents', 'token']
     ]
 
     sensitive_env_vars = []
@@ -125,15 +214,44 @@ def _build_env_vars(json_object):
     return EnvVariables(os.environ, hidden_variables=sensitive_env_vars)
 
 
-def from_json(conf_path, temp_folder):
+class ProcessSettings(NamedTuple):
+    server_workers: int
+    secret_storage_file: str
+
+
+def read_process_settings(conf_path, temp_folder):
+    """
+    Reads only the settings, which are needed before forking server processes.
+    Unlike from_json, it doesn't create any authenticators or other services
+    """
+    json_object = _read_json(conf_path)
+
+    return ProcessSettings(
+        server_workers=_read_server_workers(json_object),
+        secret_storage_file=_read_secret_storage_file(json_object, temp_folder))
+
+
+def _read_json(conf_path):
     if os.path.exists(conf_path):
         file_content = file_utils.read_file(conf_path)
     else:
         file_content = "{}"
 
+    return custom_json.loads(file_content)
+
+
+def _read_server_workers(json_object):
+    return read_int_from_config('server_workers', json_object, default=1)
+
+
+def _read_secret_storage_file(json_object, temp_folder):
+    return json_object.get('secret_storage_file', os.path.join(temp_folder, 'secret.dat'))
+
+
+def from_json(conf_path, temp_folder):
     config = ServerConfig()
 
-    json_object = custom_json.loads(file_content)
+    json_object = _read_json(conf_path)
 
     address = "0.0.0.0"
     port = 5000
@@ -208,6 +326,9 @@ def from_json(conf_path, temp_folder):
     config.callbacks_config = json_object.get('callbacks')
     config.logging_config = LoggingConfig.from_json(json_object.get('logging'))
     config.groups_config = ScriptGroupsConfig.from_json(json_object.get('script_groups'))
+    config.script_values_cache_config = ScriptValuesCacheConfig.from_json(json_object.get('script_values_cache'))
+    config.execution_limits_config = ExecutionLimitsConfig.from_json(json_object.get('execution_limits'))
+    config.execution_agents = _read_execution_agents(json_object)
     config.user_groups = user_groups
     config.admin_users = admin_users
     config.full_history_users = full_history_users
@@ -216,8 +337,11 @@ def from_json(conf_path, temp_folder):
     config.ip_validator = TrustedIpValidator(trusted_ips)
 
     config.max_request_size_mb = read_int_from_config('max_request_size', json_object, default=10)
+    config.max_output_memory_mb = read_int_from_config('max_output_memory', json_object, default=10)
+    config.handler_workers = read_int_from_config('handler_workers', json_object, default=8)
+    config.server_workers = _read_server_workers(json_object)
 
-    config.secret_storage_file = json_object.get('secret_storage_file', os.path.join(temp_folder, 'secret.dat'))
+    config.secret_storage_file = _read_secret_storage_file(json_object, temp_folder)
     config.xsrf_protection = _parse_xsrf_protection(security)
 
     return config
@@ -0,0 +1,179 @@
+import heapq
+import itertools
+import logging
+import selectors
+import socket
+import threading
+import time
+
+LOGGER = logging.getLogger('script_server.event_loop')
+
+# selectors round timeouts up to milliseconds, so timers are fired up to 1ms earlier instead of later
+_TIMER_PRECISION_SEC = 0.001
+
+_shared_loop = None
+_shared_loop_lock = threading.Lock()
+
+
+def get_shared_loop():
+    """
+    Event loop for background work (process output, exit detection, output buffering).
+    Callbacks should be short and non-blocking, since they share a single thread.
+    """
+    global _shared_loop
+
+    with _shared_loop_lock:
+        if _shared_loop is None:
+            _shared_loop = EventLoop('shared-event-loop')
+
+        return _shared_loop
+
+
+class TimerHandle:
+    def __init__(self, callback, args):
+        self._callback = callback
+        self._args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _run(self):
+        if not self.cancelled:
+            self._callback(*self._args)
+
+
+class EventLoop:
+    def __init__(self, name='event-loop'):
+        self._selector = selectors.DefaultSelector()
+
+        self._lock = threading.Lock()
+        self._pending_callbacks = []
+        self._timers = []
+        self._timer_sequence = itertools.count()
+        self._stopped = False
+
+        # socketpair is used instead of pipe, because windows can select on sockets only
+        (self._wakeup_reader, self._wakeup_writer) = socket.socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._wakeup_writer.setblocking(False)
+        self._selector.register(self._wakeup_reader, selectors.EVENT_READ, None)
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def call_soon(self, callback, *args):
+        with self._lock:
+            self._pending_callbacks.append((callback, args))
+
+        self._wakeup()
+
+    def call_later(self, delay_sec, callback, *args):
+        handle = TimerHandle(callback, args)
+        fire_time = time.monotonic() + max(delay_sec, 0)
+
+        with self._lock:
+            heapq.heappush(self._timers, (fire_time, next(self._timer_sequence), handle))
+            is_first = self._timers[0][2] is handle
+
+        if is_first:
+            self._wakeup()
+
+        return handle
+
+    def add_reader(self, fd, callback):
+        """
+        Should be called from the loop thread (e.g. via call_soon)
+        """
+        self._selector.register(fd, selectors.EVENT_READ, callback)
+
+    def remove_reader(self, fd):
+        """
+        Should be called from the loop thread (e.g. via call_soon)
+        """
+        self._selector.unregister(fd)
+
+    def is_loop_thread(self):
+        return threading.current_thread() is self._thread
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup()
+
+    def _wakeup(self):
+        if self.is_loop_thread():
+            return
+
+        try:
+            self._wakeup_writer.send(b'\0')
+        except (BlockingIOError, InterruptedError):
+            # buffer is full, so the loop will wake up anyway
+            pass
+
+    def _run(self):
+        try:
+            while not self._stopped:
+                self._run_once()
+        finally:
+            self._selector.close()
+            self._wakeup_reader.close()
+            self._wakeup_writer.close()
+
+    def _run_once(self):
+        try:
+            events = self._selector.select(self._get_select_timeout())
+        except:
+            LOGGER.exception('Failed to wait for events')
+            time.sleep(0.01)
+            return
+
+        for (key, _) in events:
+            if key.data is None:
+                self._read_wakeups()
+            else:
+                self._run_callback(key.data)
+
+        with self._lock:
+            callbacks = self._pending_callbacks
+            self._pending_callbacks = []
+
+        for (callback, args) in callbacks:
+            self._run_callback(callback, *args)
+
+        for handle in self._pop_due_timers():
+            self._run_callback(handle._run)
+
+    def _get_select_timeout(self):
+        with self._lock:
+            if self._pending_callbacks:
+                return 0
+
+            if not self._timers:
+                return None
+
+            return max(self._timers[0][0] - time.monotonic() - _TIMER_PRECISION_SEC, 0)
+
+    def _pop_due_timers(self):
+        now = time.monotonic() + _TIMER_PRECISION_SEC
+
+        due_handles = []
+        with self._lock:
+            while self._timers and (self._timers[0][0] <= now):
+                (_, _, handle) = heapq.heappop(self._timers)
+                due_handles.append(handle)
+
+        return due_handles
+
+    def _read_wakeups(self):
+        try:
+            while self._wakeup_reader.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    @staticmethod
+    def _run_callback(callback, *args):
+        try:
+            callback(*args)
+        except:
+            LOGGER.exception('Failed to execute callback ' + repr(callback))
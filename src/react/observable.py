@@ -1,14 +1,26 @@
 import abc
+import codecs
 import logging
+import os
+import tempfile
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from typing import TypeVar, Generic
 
+from react import event_loop
+
 T = TypeVar('T')
 
 LOGGER = logging.getLogger('script_server.observable')
 
+_SPILL_ENCODING = 'utf-8'
+_SPILL_READ_CHUNK_SIZE = 64 * 1024
+
+# spilled chunks are written to disk here, so that pushing threads (e.g. the event loop) are not blocked by disk writes
+_spill_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='output-spill')
+
 
 class ObservableBase(Generic[T], metaclass=abc.ABCMeta):
     def __init__(self):
@@ -71,11 +83,15 @@ class ObservableBase(Generic[T], metaclass=abc.ABCMeta):
     def time_buffered(self, period_millis, aggregate_function=None):
         return _TimeBufferedPipe(self, period_millis, aggregate_function)
 
-    def map(self, map_function):
-        return _MappedPipe(self, map_function)
+    def map(self, map_function, close_function=None):
+        """
+        :param close_function: optional function without arguments, which is called on source closing.
+            Its result (if not None) is pushed as the last chunk
+        """
+        return _MappedPipe(self, map_function, close_function)
 
-    def replay(self):
-        return _ReplayPipe(self)
+    def replay(self, memory_limit=None):
+        return _ReplayPipe(self, memory_limit)
 
     def wait_close(self, timeout=None):
         if (timeout is not None) and (timeout > 0):
@@ -106,23 +122,163 @@ class Observable(ObservableBase[T]):
 
 
 class ReplayObservable(ObservableBase[T]):
-    def __init__(self):
+    """
+    Replays all the pushed chunks to new subscribers.
+    If memory_limit is set, chunks should be strings: when their total length exceeds the limit,
+    the oldest chunks are spilled to a temporary file and replayed from there.
+    """
+
+    def __init__(self, memory_limit=None):
         super().__init__()
         self.chunks = []
 
+        self._memory_limit = memory_limit
+        self._memory_size = 0
+        self._spill_file = None
+        self._spilled_size = 0
+        self._spilling = False
+        self._disposed = False
+        self._replay_lock = threading.RLock()
+        # guards file position, because spilled data is written and read outside of _replay_lock
+        self._spill_file_lock = threading.Lock()
+
     def _push(self, data: T):
-        self.chunks.append(data)
-        super()._push(data)
+        with self._replay_lock:
+            self.chunks.append(data)
+
+            if self._memory_limit is not None:
+                self._memory_size += len(data)
+                self._schedule_spill()
+
+            super()._push(data)
+
+    def _schedule_spill(self):
+        if self._spilling or self._disposed or (self._memory_size <= self._memory_limit):
+            return
+
+        self._spilling = True
+        _spill_executor.submit(self._spill)
+
+    def _spill(self):
+        """
+        Runs in _spill_executor. Spilled chunks are kept in memory, until they are written,
+        so the memory is bounded by memory_limit plus the output, pushed during the write
+        """
+        with self._replay_lock:
+            # spill more, than needed, to avoid spilling on every push
+            target_size = self._memory_limit // 2
+
+            spilled_count = 0
+            spilled_length = 0
+            for chunk in self.chunks:
+                if self._memory_size - spilled_length <= target_size:
+                    break
+
+                spilled_length += len(chunk)
+                spilled_count += 1
+
+            spilled_chunks = self.chunks[:spilled_count]
+
+        try:
+            data = ''.join(spilled_chunks).encode(_SPILL_ENCODING)
+
+            with self._spill_file_lock:
+                if self._disposed:
+                    self._spilling = False
+                    return
+
+                if self._spill_file is None:
+                    self._spill_file = tempfile.TemporaryFile(prefix='script-server-output-')
+
+                self._spill_file.seek(0, os.SEEK_END)
+                self._spill_file.write(data)
+        except:
+            LOGGER.exception('Failed to spill output to disk, keeping it in memory')
+            with self._replay_lock:
+                self._memory_limit = None
+                self._spilling = False
+            return
+
+        with self._replay_lock:
+            if self._disposed:
+                self._spilling = False
+                return
+
+            self._spilled_size += len(data)
+            self._memory_size -= spilled_length
+            # only this method removes chunks, so the first spilled_count chunks are the written ones
+            del self.chunks[:spilled_count]
+
+            self._spilling = False
+            self._schedule_spill()
+
+    def wait_spilled(self, timeout=None):
+        """
+        Waits until pending spill writes are finished. Mostly useful for tests
+        """
+        end_time = None if timeout is None else time.time() + timeout
+
+        while True:
+            with self._replay_lock:
+                if not self._spilling:
+                    return True
+
+            if (end_time is not None) and (time.time() >= end_time):
+                return False
+
+            time.sleep(0.005)
 
     def subscribe(self, observer):
-        for chunk in self.chunks:
-            observer.on_next(chunk)
+        position = 0
+        decoder = codecs.getincrementaldecoder(_SPILL_ENCODING)()
+
+        while True:
+            with self._replay_lock:
+                spilled_size = self._spilled_size
 
-        super().subscribe(observer)
+                if position >= spilled_size:
+                    for chunk in self.chunks:
+                        observer.on_next(chunk)
+
+                    super().subscribe(observer)
+                    return
+
+            # spilled data is replayed without the lock, so that pushes are not blocked by disk reads
+            for data in self._read_spilled(position, spilled_size):
+                text = decoder.decode(data)
+                if text:
+                    observer.on_next(text)
+
+            position = spilled_size
+
+    def _read_spilled(self, start, end):
+        position = start
+        while position < end:
+            with self._spill_file_lock:
+                if self._spill_file is None:
+                    return
+
+                self._spill_file.seek(position)
+                data = self._spill_file.read(min(_SPILL_READ_CHUNK_SIZE, end - position))
+
+            if not data:
+                return
+
+            position += len(data)
+            yield data
 
     def dispose(self):
         self._close()
-        del self.chunks[:]
+
+        with self._replay_lock:
+            del self.chunks[:]
+            self._memory_size = 0
+            self._disposed = True
+
+        with self._spill_file_lock:
+            if self._spill_file is not None:
+                self._spill_file.close()
+                self._spill_file = None
 
 
 class PipedObservable(ObservableBase[T]):
@@ -139,8 +295,8 @@ class PipedObservable(ObservableBase[T]):
 
 
 class _ReplayPipe(ReplayObservable):
-    def __init__(self, source_observable):
-        super().__init__()
+    def __init__(self, source_observable, memory_limit=None):
+        super().__init__(memory_limit)
         self.source = source_observable
         self.source.subscribe(self)
 
@@ -165,10 +321,11 @@ class _ReplayPipe(ReplayObservable):
 
 
 class _MappedPipe(PipedObservable):
-    def __init__(self, source_observable, map_function):
+    def __init__(self, source_observable, map_function, close_function=None):
         super().__init__(source_observable)
 
         self.map_function = map_function
+        self.close_function = close_function
         source_observable.subscribe(self)
 
     def on_next(self, data):
@@ -176,10 +333,23 @@ class _MappedPipe(PipedObservable):
         self._push(mapped_data)
 
     def on_close(self):
+        if self.close_function is not None:
+            try:
+                last_data = self.close_function()
+                if last_data is not None:
+                    self._push(last_data)
+            except:
+                LOGGER.exception('Failed to finish mapping')
+
         self._close()
 
 
 class _TimeBufferedPipe(PipedObservable):
+    """
+    Flushes are scheduled on the shared event loop only when there is buffered data: not more often, than once
+    per period. Source closing is propagated right away, without waiting for the period end.
+    """
+
     def __init__(self, source_observable: ObservableBase, period_millis, aggregate_function=None):
         super().__init__(source_observable)
 
@@ -190,8 +360,9 @@ class _TimeBufferedPipe(PipedObservable):
         self.subscriber_lock = threading.RLock()
         self.source_closed = False
 
-        self.flushing_thread = threading.Thread(target=self.flush_buffer)
-        self.flushing_thread.start()
+        self._event_loop = event_loop.get_shared_loop()
+        self._flush_timer = None
+        self._last_flush_time = time.monotonic()
 
         source_observable.subscribe(self)
 
@@ -199,36 +370,46 @@ class _TimeBufferedPipe(PipedObservable):
         with self.buffer_lock:
             self.buffer_chunks.append(data)
 
+            if (self._flush_timer is None) and not self.source_closed:
+                next_flush_time = self._last_flush_time + self.period_millis / 1000.
+                delay = max(next_flush_time - time.monotonic(), 0)
+                self._flush_timer = self._event_loop.call_later(delay, self.flush_buffer)
+
     def on_close(self):
-        self.source_closed = True
+        with self.buffer_lock:
+            self.source_closed = True
+
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+
+        self._event_loop.call_soon(self.flush_buffer)
 
     def subscribe(self, observer):
         with self.subscriber_lock:
             super().subscribe(observer)
 
     def flush_buffer(self):
-        while not self.closed:
-            source_was_closed = self.source_closed
-
-            current_chunks = None
-            with self.buffer_lock:
-                if self.buffer_chunks:
-                    current_chunks = self.buffer_chunks
-                    self.buffer_chunks = []
+        if self.closed:
+            return
 
-            with self.subscriber_lock:
-                if current_chunks:
-                    if self.aggregate_function is not None:
-                        current_chunks = self.aggregate_function(current_chunks)
+        with self.buffer_lock:
+            source_was_closed = self.source_closed
+            current_chunks = self.buffer_chunks
+            self.buffer_chunks = []
+            self._flush_timer = None
+            self._last_flush_time = time.monotonic()
 
-                    for chunk in current_chunks:
-                        self._push(chunk)
+        with self.subscriber_lock:
+            if current_chunks:
+                if self.aggregate_function is not None:
+                    current_chunks = self.aggregate_function(current_chunks)
 
-                if source_was_closed:
-                    self._close()
-                    return
+                for chunk in current_chunks:
+                    self._push(chunk)
 
-            time.sleep(self.period_millis / 1000.)
+            if source_was_closed:
+                self._close()
 
 
 class _StoringObserver:
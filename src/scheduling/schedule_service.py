@@ -4,7 +4,7 @@ import os
 
 from auth.user import User
 from config.config_service import ConfigService
-from execution.execution_service import ExecutionService
+from execution.execution_service import ExecutionService, PRIORITY_SCHEDULED
 from execution.id_generator import IdGenerator
 from scheduling import scheduling_job
 from scheduling.schedule_config import read_schedule_config, InvalidScheduleException
@@ -143,7 +143,7 @@ class ScheduleService:
             config = self._config_service.load_config_model(script_name, user, parameter_values)
             self.validate_script_config(config)
 
-            execution_id = self._execution_service.start_script(config, user)
+            execution_id = self._execution_service.start_script(config, user, PRIORITY_SCHEDULED)
             LOGGER.info('Started script #' + str(execution_id) + ' for ' + job.get_log_name())
 
             if config.scheduling_auto_cleanup:
@@ -1,15 +1,17 @@
 import json
 import os
+import queue
 import sys
 import tempfile
 import unittest
+from unittest import mock
 from collections import OrderedDict
 from shutil import copyfile
 
 from parameterized import parameterized
 from tornado.httputil import HTTPFile
 
-from auth.authorization import Authorizer, EmptyGroupProvider, ANY_USER
+from auth.authorization import Authorizer, EmptyGroupProvider, ANY_USER, PreconfiguredGroupProvider
 from auth.user import User
 from config.config_service import ConfigService, ConfigNotAllowedException, AdminAccessRequiredException, \
     InvalidAccessException
@@ -158,8 +160,156 @@ class ConfigServiceTest(unittest.TestCase):
                  'conf D': None},
             )
 
+    def test_list_configs_when_config_modified(self):
+        _create_script_config_file('conf_x')
+        self.config_service.list_configs(self.user)
+
+        _create_script_config_file('conf_x', name='new name', description='some description')
+
+        configs = self.config_service.list_configs(self.user)
+        self.assertEqual(['new name'], [config.name for config in configs])
+
+    def test_list_configs_when_config_deleted(self):
+        _create_script_config_file('conf_x')
+        conf_y_path = _create_script_config_file('conf_y')
+        self.config_service.list_configs(self.user)
+
+        os.remove(conf_y_path)
+
+        configs = self.config_service.list_configs(self.user)
+        self.assertEqual(['conf_x'], [config.name for config in configs])
+
+    def test_unchanged_configs_not_reread(self):
+        _create_script_config_file('conf_x')
+        _create_script_config_file('conf_y')
+        self.config_service.list_configs(self.user)
+
+        with mock.patch('utils.file_utils.read_file', side_effect=file_utils.read_file) as read_mock:
+            self.config_service.list_configs(self.user)
+            self.config_service.load_config_model('conf_x', self.user)
+            self.assertEqual(0, read_mock.call_count)
+
+            _create_script_config_file('conf_z')
+            configs = self.config_service.list_configs(self.user)
+            self.assertEqual(1, read_mock.call_count)
+
+        self.assertCountEqual(['conf_x', 'conf_y', 'conf_z'], [config.name for config in configs])
+
+    def test_change_listener_when_watching(self):
+        _create_script_config_file('conf_x')
+        _create_script_config_file('conf_y')
+        self.config_service.start_watching()
+        self.config_service.list_configs(self.user)
+
+        changed_names = queue.Queue()
+        self.config_service.add_change_listener(changed_names.put)
+
+        _create_script_config_file('conf_x', name='conf_z')
+
+        self.assertEqual({'conf_x', 'conf_z'}, changed_names.get(timeout=2))
+
+    def test_watched_configs_not_rescanned_without_changes(self):
+        _create_script_config_file('conf_x')
+        self.config_service.start_watching()
+        self.config_service.list_configs(self.user)
+
+        with mock.patch('os.walk', side_effect=os.walk) as walk_mock:
+            self.config_service.list_configs(self.user)
+            self.config_service.load_config_model('conf_x', self.user)
+
+            self.assertEqual(0, walk_mock.call_count)
+
+    def test_own_changes_visible_right_away_when_watching(self):
+        self.config_service.start_watching()
+        self.config_service.list_configs(self.user)
+
+        self.config_service.create_config(self.admin_user, {'name': 'new conf', 'script': {'path': 'echo 1'}}, None)
+
+        configs = self.config_service.list_configs(self.user)
+        self.assertEqual(['new conf'], [config.name for config in configs])
+
+    def test_list_configs_groups_requested_once(self):
+        _create_script_config_file('conf_x', allowed_users=['@group1'])
+        _create_script_config_file('conf_y', allowed_users=['@group2'])
+        _create_script_config_file('conf_z', allowed_users=['@group1', 'another_user'])
+
+        group_provider = PreconfiguredGroupProvider({'group1': ['ConfigServiceTest']})
+        authorizer = Authorizer(ANY_USER, ['admin_user'], [], [], group_provider)
+        config_service = ConfigService(authorizer, test_utils.temp_folder, True, test_utils.process_invoker)
+
+        with mock.patch.object(group_provider, 'get_groups', side_effect=group_provider.get_groups) as groups_mock:
+            configs = config_service.list_configs(self.user)
+            # the first one is for admin rights check
+            self.assertEqual(2, groups_mock.call_count)
+
+        self.assertCountEqual(['conf_x', 'conf_z'], [config.name for config in configs])
+
+    def test_list_visible_configs_cached(self):
+        _create_script_config_file('conf_x')
+
+        visible_configs1 = self.config_service.list_visible_configs(self.user)
+        visible_configs2 = self.config_service.list_visible_configs(self.user)
+
+        self.assertIs(visible_configs1, visible_configs2)
+
+    def test_list_visible_configs_cached_per_user(self):
+        _create_script_config_file('conf_x', allowed_users=['admin_user'])
+        _create_script_config_file('conf_y')
+
+        user_configs = self.config_service.list_visible_configs(self.user)
+        admin_configs = self.config_service.list_visible_configs(self.admin_user)
+
+        self.assertEqual(['conf_y'], [config.name for config in user_configs.configs])
+        self.assertEqual(['conf_x', 'conf_y'], [config.name for config in admin_configs.configs])
+        self.assertNotEqual(user_configs.etag, admin_configs.etag)
+
+    def test_list_visible_configs_etag_when_changed(self):
+        _create_script_config_file('conf_x')
+        etag1 = self.config_service.list_visible_configs(self.user).etag
+
+        _create_script_config_file('conf_y')
+        etag2 = self.config_service.list_visible_configs(self.user).etag
+
+        _create_script_config_file('conf_y', description='not visible in the list')
+        etag3 = self.config_service.list_visible_configs(self.user).etag
+
+        self.assertNotEqual(etag1, etag2)
+        self.assertEqual(etag2, etag3)
+
+    def test_load_config_model_static_scripts_shared(self):
+        invoker = mock.Mock(wraps=test_utils.process_invoker)
+        config_service = ConfigService(self.config_service._authorizer, test_utils.temp_folder, True, invoker)
+
+        _create_script_config_file('conf_x', parameters=[
+            {'name': 'p1', 'type': 'list', 'values': {'script': 'echo a b c'}},
+            {'name': 'p2', 'default': {'script': 'echo xyz'}}])
+
+        model1 = config_service.load_config_model('conf_x', self.user)
+        model2 = config_service.load_config_model('conf_x', self.admin_user)
+
+        self.assertEqual(2, invoker.invoke.call_count)
+        self.assertEqual(['a b c'], model2.find_parameter('p1').values)
+        self.assertEqual('xyz', model2.parameter_values['p2'].user_value)
+
+        _create_script_config_file('conf_x', description='changed', parameters=[
+            {'name': 'p1', 'type': 'list', 'values': {'script': 'echo a b c'}},
+            {'name': 'p2', 'default': {'script': 'echo xyz'}}])
+
+        config_service.load_config_model('conf_x', self.user)
+        self.assertEqual(4, invoker.invoke.call_count)
+
+        self.assertIsNotNone(model1)
+
+    def test_find_config_by_name_when_duplicated(self):
+        _create_script_config_file('conf_b', name='my conf', description='b')
+        _create_script_config_file('conf_a', name='my conf', description='a')
+
+        config_model = self.config_service.load_config_model('my conf', self.user)
+        self.assertEqual('a', config_model.description)
+
     def tearDown(self):
         super().tearDown()
+        self.config_service.stop_watching()
         test_utils.cleanup()
 
     def setUp(self):
@@ -749,6 +899,15 @@ class ConfigServiceLoadConfigForAdminTest(unittest.TestCase):
 
         self.assertEqual(config, {'filename': 'ConfX.json', 'config': {'name': 'my conf x', 'script_path': 'echo 123'}})
 
+    def test_load_config_returns_copy(self):
+        _create_script_config_file('ConfX', script_path='my_script.sh')
+
+        config = self.config_service.load_config('ConfX', self.admin_user)
+        config['config']['script_path'] = 'changed.sh'
+
+        config = self.config_service.load_config('ConfX', self.admin_user)
+        self.assertEqual('my_script.sh', config['config']['script_path'])
+
     def test_load_config_when_non_admin(self):
         _create_script_config_file('ConfX')
         user = User('user1', {})
@@ -0,0 +1,68 @@
+import threading
+import time
+import unittest
+
+from react.event_loop import EventLoop
+
+
+class TestEventLoop(unittest.TestCase):
+    def test_call_soon(self):
+        called = threading.Event()
+        thread_holder = []
+
+        def callback(value):
+            thread_holder.append((threading.current_thread(), value))
+            called.set()
+
+        self.loop.call_soon(callback, 'abc')
+
+        self.assertTrue(called.wait(5))
+        self.assertEqual('abc', thread_holder[0][1])
+        self.assertIsNot(threading.current_thread(), thread_holder[0][0])
+
+    def test_call_later_order(self):
+        calls = []
+        finished = threading.Event()
+
+        self.loop.call_later(0.1, lambda: (calls.append(2), finished.set()))
+        self.loop.call_later(0.05, calls.append, 1)
+
+        self.assertTrue(finished.wait(5))
+        self.assertEqual([1, 2], calls)
+
+    def test_call_later_delay(self):
+        finished = threading.Event()
+        start_time = time.monotonic()
+
+        self.loop.call_later(0.1, finished.set)
+
+        self.assertTrue(finished.wait(5))
+        self.assertGreaterEqual(time.monotonic() - start_time, 0.09)
+
+    def test_cancel_timer(self):
+        calls = []
+        finished = threading.Event()
+
+        handle = self.loop.call_later(0.05, calls.append, 'cancelled')
+        self.loop.call_later(0.1, finished.set)
+        handle.cancel()
+
+        self.assertTrue(finished.wait(5))
+        self.assertEqual([], calls)
+
+    def test_failing_callback_does_not_stop_loop(self):
+        finished = threading.Event()
+
+        def fail():
+            raise Exception('test')
+
+        self.loop.call_soon(fail)
+        self.loop.call_soon(finished.set)
+
+        self.assertTrue(finished.wait(5))
+
+    def setUp(self):
+        self.loop = EventLoop()
+
+    def tearDown(self):
+        self.loop.stop()
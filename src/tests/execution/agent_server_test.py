@@ -0,0 +1,202 @@
+import sys
+import threading
+import unittest
+
+from execution.agent_server import AgentServer, AgentConfigurationException
+from execution.execution_agents import ExecutionAgent, AgentPool
+from execution.process_remote import RemoteProcessWrapper
+from react.observable import read_until_closed
+from tests import test_utils
+
+TEST_TOKEN = 'secret-token'
+
+
+class RemoteProcessWrapperTest(unittest.TestCase):
+    def test_output_and_exit_code(self):
+        process_wrapper = self.start_process('print("hello"); exit(3)')
+
+        output = read_until_closed(process_wrapper.output_stream, timeout=5)
+
+        self.assertEqual('hello\n', ''.join(output))
+        self.assertEqual(3, process_wrapper.get_return_code())
+        self.assertTrue(process_wrapper.is_finished())
+
+    def test_input(self):
+        process_wrapper = self.start_process('print("got " + input())')
+
+        process_wrapper.write_to_input('abc')
+
+        output = read_until_closed(process_wrapper.output_stream, timeout=5)
+        self.assertEqual('abc\ngot abc\n', ''.join(output))
+        self.assertEqual(0, process_wrapper.get_return_code())
+
+    def test_env_variables(self):
+        process_wrapper = self.start_process('import os; print(os.environ["MY_PARAM"])',
+                                             env_variables={'MY_PARAM': 123})
+
+        output = read_until_closed(process_wrapper.output_stream, timeout=5)
+        self.assertEqual('123\n', ''.join(output))
+
+    def test_kill(self):
+        process_wrapper = self.start_process('import time; print("started", flush=True); time.sleep(30)')
+        self.wait_output(process_wrapper, 'started')
+
+        process_wrapper.kill()
+
+        output = read_until_closed(process_wrapper.output_stream, timeout=5)
+        self.assertIn('>> KILLED', ''.join(output))
+        self.assertEqual(-9, process_wrapper.get_return_code())
+
+    def test_stop(self):
+        process_wrapper = self.start_process('import time; print("started", flush=True); time.sleep(30)')
+        self.wait_output(process_wrapper, 'started')
+
+        process_wrapper.stop()
+
+        read_until_closed(process_wrapper.output_stream, timeout=5)
+        self.assertEqual(-15, process_wrapper.get_return_code())
+
+    def test_finish_listener(self):
+        process_wrapper = self.start_process('print("hello")')
+
+        finished = threading.Event()
+
+        class Listener:
+            def finished(self):
+                finished.set()
+
+        process_wrapper.add_finish_listener(Listener())
+
+        self.assertTrue(finished.wait(5))
+
+    def test_invalid_token(self):
+        agent = ExecutionAgent('test', '127.0.0.1', self.agent_server.port, 1, [], 'wrong')
+
+        process_wrapper = RemoteProcessWrapper(agent, [sys.executable, '-c', 'print(1)'], None, {})
+        self.assertRaisesRegex(Exception, 'Invalid token', process_wrapper.start)
+
+    def test_full_capacity(self):
+        self.start_process('import time; print("started", flush=True); time.sleep(30)')
+        self.start_process('import time; print("started", flush=True); time.sleep(30)')
+
+        self.assertRaisesRegex(Exception, 'full capacity', self.start_process, 'print(1)')
+
+    def test_start_failure(self):
+        agent = ExecutionAgent('test', '127.0.0.1', self.agent_server.port, 1, [], TEST_TOKEN)
+
+        process_wrapper = RemoteProcessWrapper(agent, ['/not/existing/command'], None, {})
+        self.assertRaisesRegex(Exception, 'Failed to start the process', process_wrapper.start)
+
+    def start_process(self, code, env_variables=None):
+        agent = ExecutionAgent('test', '127.0.0.1', self.agent_server.port, 2, [], TEST_TOKEN)
+
+        process_wrapper = RemoteProcessWrapper(agent, [sys.executable, '-c', code], None, env_variables or {})
+        process_wrapper.start()
+        self.processes.append(process_wrapper)
+        return process_wrapper
+
+    @staticmethod
+    def wait_output(process_wrapper, expected_text):
+        output_received = threading.Event()
+
+        class Observer:
+            def on_next(self, chunk):
+                if expected_text in chunk:
+                    output_received.set()
+
+            def on_close(self):
+                output_received.set()
+
+        process_wrapper.output_stream.subscribe(Observer())
+        output_received.wait(5)
+
+    def setUp(self):
+        super().setUp()
+        test_utils.setup()
+
+        self.agent_server = AgentServer('127.0.0.1', 0, capacity=2, token=TEST_TOKEN)
+        self.agent_server.start()
+        self.processes = []
+
+    def tearDown(self):
+        super().tearDown()
+
+        for process_wrapper in self.processes:
+            process_wrapper.kill()
+            process_wrapper.wait_finish()
+
+        self.agent_server.stop()
+        test_utils.cleanup()
+
+
+class AgentServerSecurityTest(unittest.TestCase):
+    def test_default_address_is_loopback(self):
+        agent_server = AgentServer(port=0)
+        try:
+            self.assertEqual('127.0.0.1', agent_server._server.server_address[0])
+        finally:
+            agent_server.stop()
+
+    def test_public_address_without_token(self):
+        self.assertRaisesRegex(AgentConfigurationException, 'Token is required', AgentServer, '0.0.0.0', 0)
+
+    def test_public_address_with_token(self):
+        agent_server = AgentServer('0.0.0.0', 0, token=TEST_TOKEN)
+        agent_server.stop()
+
+    def test_missing_token(self):
+        agent_server = AgentServer('127.0.0.1', 0, token=TEST_TOKEN)
+        agent_server.start()
+        try:
+            agent = ExecutionAgent('test', '127.0.0.1', agent_server.port, 1, [], None)
+
+            process_wrapper = RemoteProcessWrapper(agent, [sys.executable, '-c', 'print(1)'], None, {})
+            self.assertRaisesRegex(Exception, 'Invalid token', process_wrapper.start)
+        finally:
+            agent_server.stop()
+
+
+class AgentPoolTest(unittest.TestCase):
+    def test_acquire_matching_labels(self):
+        agent1 = _create_agent('a1', ['linux'])
+        agent2 = _create_agent('a2', ['linux', 'gpu'])
+        pool = AgentPool([agent1, agent2])
+
+        self.assertIs(agent2, pool.acquire(['gpu']))
+
+    def test_acquire_most_free(self):
+        agent1 = _create_agent('a1', [], capacity=2)
+        agent2 = _create_agent('a2', [], capacity=3)
+        pool = AgentPool([agent1, agent2])
+
+        acquired = [pool.acquire([]) for _ in range(4)]
+
+        self.assertEqual([agent2, agent1, agent2, agent1], acquired)
+
+    def test_acquire_when_full(self):
+        agent1 = _create_agent('a1', [], capacity=1)
+        pool = AgentPool([agent1])
+
+        pool.acquire([])
+
+        self.assertIsNone(pool.acquire([]))
+        self.assertFalse(pool.has_free_slot([]))
+
+    def test_release(self):
+        agent1 = _create_agent('a1', [], capacity=1)
+        pool = AgentPool([agent1])
+
+        pool.release(pool.acquire([]))
+
+        self.assertIs(agent1, pool.acquire([]))
+
+    def test_has_matching(self):
+        pool = AgentPool([_create_agent('a1', ['linux'])])
+
+        self.assertTrue(pool.has_matching([]))
+        self.assertTrue(pool.has_matching(['linux']))
+        self.assertFalse(pool.has_matching(['windows']))
+
+
+def _create_agent(name, labels, capacity=1):
+    return ExecutionAgent(name, 'localhost', 5100, capacity, labels)
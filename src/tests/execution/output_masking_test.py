@@ -0,0 +1,45 @@
+import unittest
+
+from parameterized import parameterized
+
+from execution.output_masking import SecureOutputMasker
+
+
+class TestSecureOutputMasker(unittest.TestCase):
+    @parameterized.expand([
+        (['abc'], ['abc'], '***'),
+        (['abc'], ['some abc text'], 'some *** text'),
+        (['abc'], ['abcd abc_ _abc 1abc'], 'abcd abc_ _abc 1abc'),
+        (['abc'], ['(abc)', '[abc]'], '(***)[***]'),
+        (['abc'], ['a', 'b', 'c'], '***'),
+        (['abc'], ['ab', 'cd'], 'abcd'),
+        (['abc'], ['x', 'abc'], 'xabc'),
+        (['abc'], ['x ', 'abc', ' y'], 'x *** y'),
+        (['abc'], ['ab', 'x abc'], 'abx ***'),
+        (['abc', 'abcdef'], ['abcdef abc'], '*** ***'),
+        (['abc', 'abcdef'], ['abc', 'def'], '***'),
+        (['abc', 'abcdef'], ['abc', 'de'], 'abcde'),
+        (['abc', 'abcdef'], ['abc', ' def'], '*** def'),
+        (['a.b', 'c+d'], ['a.b axb c+d', ' ccd'], '*** axb *** ccd'),
+    ])
+    def test_mask(self, values, chunks, expected):
+        masker = SecureOutputMasker(values, '***')
+
+        output = ''.join(masker.mask(chunk) for chunk in chunks) + masker.flush()
+
+        self.assertEqual(expected, output)
+
+    def test_not_matching_tail_emitted_right_away(self):
+        masker = SecureOutputMasker(['password'], '***')
+
+        self.assertEqual('Enter value: ', masker.mask('Enter value: '))
+
+    def test_matching_tail_held_until_next_chunk(self):
+        masker = SecureOutputMasker(['password'], '***')
+
+        self.assertEqual('my ', masker.mask('my pass'))
+        self.assertEqual('*** is', masker.mask('word is'))
+        self.assertEqual('', masker.flush())
+
+    def test_no_values(self):
+        self.assertRaises(ValueError, SecureOutputMasker, [], '***')
@@ -0,0 +1,112 @@
+import os
+import subprocess
+import threading
+import unittest
+
+from execution.process_reactor import ProcessReactor
+from react.event_loop import EventLoop
+
+
+class _ReaderListener:
+    def __init__(self):
+        self.data = b''
+        self.error = None
+        self.ended = threading.Event()
+
+    def on_data(self, data):
+        self.data += data
+
+    def on_end(self, error):
+        self.error = error
+        self.ended.set()
+
+
+class TestProcessReactor(unittest.TestCase):
+    def test_read_until_eof(self):
+        (read_fd, write_fd) = self.create_pipe()
+        listener = self.add_reader(read_fd)
+
+        os.write(write_fd, b'hello ')
+        os.write(write_fd, b'world')
+        os.close(write_fd)
+
+        self.assertTrue(listener.ended.wait(5))
+        self.assertEqual(b'hello world', listener.data)
+        self.assertIsNone(listener.error)
+
+    def test_multiple_readers(self):
+        pipes = [self.create_pipe() for _ in range(20)]
+        listeners = [self.add_reader(read_fd) for (read_fd, _) in pipes]
+
+        for i, (_, write_fd) in enumerate(pipes):
+            os.write(write_fd, b'x' * 100000 if i % 2 else str(i).encode())
+            os.close(write_fd)
+
+        for i, listener in enumerate(listeners):
+            self.assertTrue(listener.ended.wait(5))
+            self.assertEqual(b'x' * 100000 if i % 2 else str(i).encode(), listener.data)
+
+    def test_drain_without_eof(self):
+        (read_fd, write_fd) = self.create_pipe()
+        listener = self.add_reader(read_fd)
+
+        os.write(write_fd, b'some text')
+        self.reactor.drain_reader(read_fd)
+
+        self.assertTrue(listener.ended.wait(5))
+        self.assertEqual(b'some text', listener.data)
+
+    def test_failing_callback(self):
+        (read_fd, write_fd) = self.create_pipe()
+        listener = _ReaderListener()
+
+        def fail(data):
+            raise Exception('test')
+
+        self.reactor.add_reader(read_fd, fail, listener.on_end)
+        os.write(write_fd, b'some text')
+
+        self.assertTrue(listener.ended.wait(5))
+        self.assertEqual('test', str(listener.error))
+
+    def test_watch_process(self):
+        process = subprocess.Popen(['sleep', '0.1'])
+        finished = threading.Event()
+
+        self.reactor.watch_process(process, finished.set)
+
+        self.assertTrue(finished.wait(5))
+        self.assertEqual(0, process.wait(1))
+
+    def test_watch_finished_process(self):
+        process = subprocess.Popen(['true'])
+        process.wait()
+        finished = threading.Event()
+
+        self.reactor.watch_process(process, finished.set)
+
+        self.assertTrue(finished.wait(5))
+
+    def add_reader(self, fd):
+        listener = _ReaderListener()
+        self.reactor.add_reader(fd, listener.on_data, listener.on_end)
+        return listener
+
+    def create_pipe(self):
+        (read_fd, write_fd) = os.pipe()
+        self.fds.extend([read_fd, write_fd])
+        return read_fd, write_fd
+
+    def setUp(self):
+        self.loop = EventLoop()
+        self.reactor = ProcessReactor(self.loop)
+        self.fds = []
+
+    def tearDown(self):
+        self.loop.stop()
+
+        for fd in self.fds:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
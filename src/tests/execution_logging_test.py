@@ -1,6 +1,7 @@
 import functools
 import inspect
 import os
+import time
 import traceback
 import unittest
 import uuid
@@ -13,6 +14,7 @@ from auth.authorization import Authorizer, EmptyGroupProvider
 from auth.user import User
 from execution import executor
 from execution.execution_service import ExecutionService
+from execution.history_index import HistoryFilter
 from execution.logging import ScriptOutputLogger, ExecutionLoggingService, OUTPUT_STARTED_MARKER, \
     LogNameCreator, ExecutionLoggingController
 from model.model_helper import AccessProhibitedException
@@ -54,7 +56,7 @@ class TestScriptOutputLogging(unittest.TestCase):
         self.output_logger = self.create_logger()
         self.output_logger.start()
 
-        self.output_stream.close()
+        self.close_output()
 
         self.assertFalse(self.is_file_opened())
 
@@ -63,7 +65,7 @@ class TestScriptOutputLogging(unittest.TestCase):
         self.output_logger.start()
 
         self.output_stream.push('some text')
-        self.output_stream.close()
+        self.close_output()
 
         self.assertEqual(self.read_log(), 'some text')
 
@@ -74,7 +76,7 @@ class TestScriptOutputLogging(unittest.TestCase):
         self.output_stream.push('some text')
         self.output_stream.push('\nand a new line')
         self.output_stream.push(' with some long long text')
-        self.output_stream.close()
+        self.close_output()
 
         self.assertEqual(self.read_log(), 'some text\nand a new line with some long long text')
 
@@ -91,17 +93,54 @@ class TestScriptOutputLogging(unittest.TestCase):
 
         self.output_stream.push('some text\r')
         self.output_stream.push('another text')
-        self.output_stream.close()
+        self.close_output()
 
         self.assertEqual(self.read_log(), 'some text\ranother text')
 
-    def create_logger(self):
+    def test_buffered_write_until_flush_size(self):
+        self.output_logger = self.create_logger(flush_size=10, flush_interval_ms=60000)
+        self.output_logger.start()
+
+        self.output_stream.push('12345')
+        self.assertEqual('', self.read_log())
+
+        self.output_stream.push('67890')
+        self.assertEqual('1234567890', self.read_log())
+
+    def test_buffered_write_flushed_after_interval(self):
+        self.output_logger = self.create_logger(flush_size=1000, flush_interval_ms=50)
+        self.output_logger.start()
+
+        self.output_stream.push('some text')
+        self.assertEqual('', self.read_log())
+
+        time.sleep(0.2)
+        self.assertEqual('some text', self.read_log())
+
+    def test_buffered_write_flushed_on_close(self):
+        self.output_logger = self.create_logger(flush_size=1000, flush_interval_ms=60000)
+        self.output_logger.start()
+
+        self.output_stream.push('some text')
+        self.output_stream.push(' and more')
+        self.close_output()
+
+        self.assertEqual('some text and more', self.read_log())
+
+    def create_logger(self, flush_size=0, flush_interval_ms=0):
         self.file_path = os.path.join(test_utils.temp_folder, 'TestScriptOutputLogging.log')
 
-        self.logger = ScriptOutputLogger(self.file_path, self.output_stream)
+        self.logger = ScriptOutputLogger(self.file_path,
+                                         self.output_stream,
+                                         flush_size=flush_size,
+                                         flush_interval_ms=flush_interval_ms)
 
         return self.logger
 
+    def close_output(self):
+        self.output_stream.close()
+        self.assertTrue(self.output_logger.wait_closed(timeout=2))
+
     def read_log(self):
         if self.file_path and os.path.exists(self.file_path):
             return file_utils.read_file(self.file_path, keep_newlines=True)
@@ -215,18 +254,225 @@ class TestLoggingService(unittest.TestCase):
         log = self.logging_service.find_log('id_X')
         self.assertEqual('line1\n2\n\nEND\n', log)
 
+    def test_find_log_range_with_offset_and_limit(self):
+        self.simulate_logging(execution_id='id1', log_lines=['line1', 'line2', 'line3'])
+
+        log_range = self.logging_service.find_log_range('id1', offset=6, limit=5)
+        self.assertEqual(18, log_range.output_size)
+        self.assertEqual(6, log_range.offset)
+        self.assertEqual(b'line2', b''.join(self.logging_service.read_log_range(log_range)))
+
+    def test_find_log_range_when_offset_after_end(self):
+        self.simulate_logging(execution_id='id1', log_lines=['line1'])
+
+        log_range = self.logging_service.find_log_range('id1', offset=100)
+        self.assertEqual(6, log_range.offset)
+        self.assertEqual(b'', b''.join(self.logging_service.read_log_range(log_range)))
+
+    @parameterized.expand([
+        (0, ''),
+        (1, 'line3\n'),
+        (2, 'line2\nline3\n'),
+        (5, 'line1\nline2\nline3\n'),
+    ])
+    def test_find_log_range_tail(self, lines, expected_log):
+        self.simulate_logging(execution_id='id1', log_lines=['line1', 'line2', 'line3'])
+
+        log_range = self.logging_service.find_log_range('id1', tail_lines=lines)
+        log = b''.join(self.logging_service.read_log_range(log_range, chunk_size=4))
+        self.assertEqual(expected_log, log.decode('utf-8'))
+
+    def test_find_log_range_tail_without_trailing_newline(self):
+        self.simulate_logging(execution_id='id1', log_lines=['line1', 'line2\nline3'])
+        with open(self.get_log_files()[0], 'ab') as f:
+            f.write(b'no newline')
+
+        log_range = self.logging_service.find_log_range('id1', tail_lines=2)
+        self.assertEqual(b'line3\nno newline', b''.join(self.logging_service.read_log_range(log_range)))
+
+    def test_find_log_range_for_wrong_id(self):
+        self.simulate_logging(execution_id='id1', log_lines=['line1'])
+
+        self.assertIsNone(self.logging_service.find_log_range('id2'))
+
     def test_get_log_by_wrong_id(self):
         self.simulate_logging(execution_id='1', log_lines=['text'])
 
         log = self.logging_service.find_log('2')
         self.assertIsNone(log)
 
+    def test_compressed_log_replaces_plain_log(self):
+        self.logging_service = self.create_compressing_service()
+        self.simulate_logging(execution_id='id1', log_lines=['line1', 'line2'])
+        self.wait_compression()
+
+        self.assertEqual([], self.get_log_files())
+        self.assertEqual(1, len(self.get_log_files(compressed=True)))
+
+    def test_find_compressed_log(self):
+        self.logging_service = self.create_compressing_service()
+        self.simulate_logging(execution_id='id1', log_lines=['line1', 'line2'], exit_code=3)
+        self.wait_compression()
+
+        self.assertEqual('line1\nline2\n', self.logging_service.find_log('id1'))
+        self.validate_history_entry(self.logging_service.find_history_entry('id1', 'userX'), id='id1', exit_code=3)
+
+    def test_find_compressed_log_range(self):
+        self.logging_service = self.create_compressing_service()
+        self.simulate_logging(execution_id='id1', log_lines=['line1', 'line2', 'line3'])
+        self.wait_compression()
+
+        log_range = self.logging_service.find_log_range('id1', offset=6, limit=5)
+        self.assertEqual(18, log_range.output_size)
+        self.assertEqual(b'line2', b''.join(self.logging_service.read_log_range(log_range)))
+
+        tail_range = self.logging_service.find_log_range('id1', tail_lines=2)
+        self.assertEqual(b'line2\nline3\n', b''.join(self.logging_service.read_log_range(tail_range, chunk_size=4)))
+
+    def test_compressed_log_history_after_restart(self):
+        self.logging_service = self.create_compressing_service()
+        self.simulate_logging(execution_id='id1', log_lines=['some text'], exit_code=5)
+        self.wait_compression()
+
+        new_service = ExecutionLoggingService(test_utils.temp_folder, LogNameCreator(), self.authorizer)
+
+        entries = new_service.get_history_entries('userX')
+        self.assertEqual(1, len(entries))
+        self.validate_history_entry(entries[0], id='id1', exit_code=5)
+        self.assertEqual('some text\n', new_service.find_log('id1'))
+
+    def test_compress_logs_with_same_name(self):
+        self.logging_service = ExecutionLoggingService(
+            test_utils.temp_folder, LogNameCreator('${SCRIPT}'), self.authorizer, compress_logs=True)
+
+        self.simulate_logging(execution_id='1', script_name='s', log_lines=['first'])
+        self.wait_until(lambda: len(self.get_log_files(compressed=True)) == 1)
+
+        self.simulate_logging(execution_id='2', script_name='s', log_lines=['second'])
+        self.wait_compression()
+
+        self.assertEqual(2, len(self.get_log_files(compressed=True)))
+        self.assertEqual('first\n', self.logging_service.find_log('1'))
+        self.assertEqual('second\n', self.logging_service.find_log('2'))
+        self.assertCountEqual(['1', '2'], [entry.id for entry in self.logging_service.get_history_entries('userX')])
+
+    def test_compression_keeps_existing_archive(self):
+        self.logging_service = ExecutionLoggingService(
+            test_utils.temp_folder, LogNameCreator('${SCRIPT}'), self.authorizer, compress_logs=True)
+        existing_archive = test_utils.create_file('s.log.gz', text='archive')
+
+        log_file = os.path.join(test_utils.temp_folder, 's.log')
+        test_utils.create_file('s.log', text='log')
+        self.logging_service._compress_log('1', 's.log')
+
+        self.assertEqual('archive', file_utils.read_file(existing_archive))
+        self.assertTrue(os.path.exists(log_file))
+
+    def test_history_listing_before_compressed_log_renamed(self):
+        self.logging_service = self.create_compressing_service()
+        history_index = self.logging_service._history_index
+        rename = history_index.rename
+
+        def list_and_rename(old_filename, new_filename):
+            self.list_history_now()
+            rename(old_filename, new_filename)
+
+        history_index.rename = list_and_rename
+
+        self.simulate_logging(execution_id='id1', log_lines=['some text'], exit_code=3)
+        self.wait_compression()
+
+        self.validate_history_entry(self.logging_service.find_history_entry('id1', 'userX'), id='id1', exit_code=3)
+        self.assertEqual('some text\n', self.logging_service.find_log('id1'))
+
+        self.list_history_now()
+        self.assertEqual(['id1'], [entry.id for entry in self.logging_service.get_history_entries('userX')])
+
+    def test_history_listing_before_plain_log_removed(self):
+        self.logging_service = self.create_compressing_service()
+        history_index = self.logging_service._history_index
+        rename = history_index.rename
+
+        def rename_and_list(old_filename, new_filename):
+            rename(old_filename, new_filename)
+            self.list_history_now()
+
+        history_index.rename = rename_and_list
+
+        self.simulate_logging(execution_id='id1', log_lines=['some text'], exit_code=3)
+        self.wait_compression()
+
+        self.list_history_now()
+        self.validate_history_entry(self.logging_service.find_history_entry('id1', 'userX'), id='id1', exit_code=3)
+        self.assertEqual('some text\n', self.logging_service.find_log('id1'))
+
+    def test_read_parameters_text_from_compressed_log(self):
+        self.logging_service = self.create_compressing_service()
+        self.simulate_logging(execution_id='id1', log_lines=['some text'])
+        self.wait_compression()
+
+        (correct_format, parameters_text) = ExecutionLoggingService._read_parameters_text(
+            self.get_log_files(compressed=True)[0])
+        self.assertTrue(correct_format)
+        self.assertIn('id:id1\n', parameters_text)
+
     def test_exit_code_in_history(self):
         self.simulate_logging(execution_id='1', log_lines=['text'], exit_code=13)
 
         entry = self.logging_service.get_history_entries('userX')[0]
         self.validate_history_entry(entry, id='1', exit_code=13)
 
+    def test_history_version_changes(self):
+        version1 = self.logging_service.get_history_version()
+
+        output_stream = Observable()
+        self.start_logging(output_stream, execution_id='1')
+        version2 = self.logging_service.get_history_version()
+
+        output_stream.close()
+        self.logging_service.write_post_execution_info('1', 0)
+        self.wait_log_closed('1')
+        version3 = self.logging_service.get_history_version()
+
+        self.assertNotEqual(version1, version2)
+        self.assertNotEqual(version2, version3)
+        self.assertEqual(version3, self.logging_service.get_history_version())
+
+    def test_exit_code_does_not_change_log_size(self):
+        output_stream = Observable()
+        self.start_logging(output_stream, execution_id='1')
+        output_stream.push('some output\n')
+        output_stream.close()
+        self.wait_log_closed('1')
+
+        log_file = self.get_log_files()[0]
+        size_before = os.path.getsize(log_file)
+
+        self.logging_service.write_post_execution_info('1', -15)
+
+        self.assertEqual(size_before, os.path.getsize(log_file))
+        self.assertEqual('some output\n', self.read_logs_only(log_file))
+
+        new_service = ExecutionLoggingService(test_utils.temp_folder, LogNameCreator(), self.authorizer)
+        self.validate_history_entry(new_service.find_history_entry('1', 'userX'), id='1', exit_code=-15)
+
+    def test_exit_code_in_legacy_log_format(self):
+        log_path = os.path.join(test_utils.temp_folder, 'legacy.log')
+        file_utils.write_file(log_path, 'id:legacy_id\n'
+                                        'user_name:userX\n'
+                                        'user_id:userX\n'
+                                        'script:my_script\n'
+                                        'start_time:1500000000000\n'
+                                        'command:cmd\n'
+                                        'output_format:terminal\n'
+                                        'exit_code:7\n'
+                                        + OUTPUT_STARTED_MARKER + '\n'
+                                        'some text\n')
+
+        entry = self.logging_service.find_history_entry('legacy_id', 'userX')
+        self.validate_history_entry(entry, id='legacy_id', exit_code=7)
+        self.assertEqual('some text\n', self.logging_service.find_log('legacy_id'))
+
     def test_exit_code_when_no_post_execution_call(self):
         self.simulate_logging(execution_id='1', log_lines=['text'], exit_code=13, write_post_execution_info=False)
 
@@ -247,6 +493,7 @@ class TestLoggingService(unittest.TestCase):
         self.validate_history_entry(old_entry, id=execution_id, exit_code=None)
 
         output_stream.close()
+        self.wait_log_closed(execution_id)
         new_entry = self.logging_service.find_history_entry(execution_id, 'userX')
         self.validate_history_entry(new_entry, id=execution_id, exit_code=255)
 
@@ -260,6 +507,41 @@ class TestLoggingService(unittest.TestCase):
         entry = new_service.get_history_entries('userX')[0]
         self.validate_history_entry(entry, id='id1')
 
+    def test_history_entries_after_restart_with_index_file(self):
+        index_path = os.path.join(test_utils.temp_folder, 'index', 'history.sqlite')
+        file_utils.prepare_folder(os.path.dirname(index_path))
+
+        service = ExecutionLoggingService(test_utils.temp_folder, LogNameCreator(), self.authorizer,
+                                          index_file_path=index_path)
+        self.logging_service = service
+        self.simulate_logging(execution_id='id1', exit_code=5)
+
+        new_service = ExecutionLoggingService(test_utils.temp_folder, LogNameCreator(), self.authorizer,
+                                              index_file_path=index_path)
+        entry = new_service.get_history_entries('userX')[0]
+        self.validate_history_entry(entry, id='id1', exit_code=5)
+
+    def test_history_entries_when_file_added_externally(self):
+        self.simulate_logging(execution_id='id1')
+
+        original_service = self.logging_service
+        self.logging_service = ExecutionLoggingService(test_utils.temp_folder, LogNameCreator(), self.authorizer)
+        self.simulate_logging(execution_id='id2')
+
+        entries = original_service.get_history_entries('userX')
+        entries.sort(key=lambda entry: entry.id)
+        self.assertEqual(['id1', 'id2'], [entry.id for entry in entries])
+
+    def test_get_history_entries_after_partial_delete(self):
+        self.simulate_logging(execution_id='id1', user_name='user1')
+        self.simulate_logging(execution_id='id2', user_name='user2')
+
+        for file in self.get_log_files('user1'):
+            os.remove(file)
+
+        entries = self.logging_service.get_history_entries('power_user')
+        self.assertEqual(['id2'], [entry.id for entry in entries])
+
     def test_get_history_entries_after_delete(self):
         self.simulate_logging(execution_id='id1')
 
@@ -313,6 +595,44 @@ class TestLoggingService(unittest.TestCase):
         self.validate_history_entry(entry=entries[2], id='id3', user_id='userC')
         self.validate_history_entry(entry=entries[3], id='id4', user_id='userA')
 
+    def test_get_history_entries_sorted(self):
+        self.simulate_logging(execution_id='id1', start_time_millis=3000)
+        self.simulate_logging(execution_id='id2', start_time_millis=1000)
+        self.simulate_logging(execution_id='id3', start_time_millis=2000)
+
+        entries = self.logging_service.get_history_entries('userX', sort_by='start_time', descending=True)
+        self.assertEqual(['id1', 'id3', 'id2'], [entry.id for entry in entries])
+
+    def test_get_history_entries_paginated(self):
+        for i in range(5):
+            self.simulate_logging(execution_id='id' + str(i), start_time_millis=1000 * i)
+
+        entries = self.logging_service.get_history_entries('userX', sort_by='start_time', offset=1, limit=2)
+        self.assertEqual(['id1', 'id2'], [entry.id for entry in entries])
+        self.assertEqual(5, self.logging_service.count_history_entries('userX'))
+
+    def test_get_history_entries_filtered(self):
+        self.simulate_logging(execution_id='id1', script_name='s1', exit_code=0, start_time_millis=1000)
+        self.simulate_logging(execution_id='id2', script_name='s2', exit_code=0, start_time_millis=2000)
+        self.simulate_logging(execution_id='id3', script_name='s1', exit_code=1, start_time_millis=3000)
+        self.simulate_logging(execution_id='id4', script_name='s1', exit_code=0, start_time_millis=4000)
+
+        history_filter = HistoryFilter(script_name='s1',
+                                       exit_code=0,
+                                       start_time_from=ms_to_datetime(500),
+                                       start_time_to=ms_to_datetime(3500))
+        entries = self.logging_service.get_history_entries('userX', history_filter=history_filter)
+        self.assertEqual(['id1'], [entry.id for entry in entries])
+        self.assertEqual(1, self.logging_service.count_history_entries('userX', history_filter=history_filter))
+
+    def test_get_history_entries_filtered_by_user_for_power_user(self):
+        self.simulate_logging(execution_id='id1', user_name='userA')
+        self.simulate_logging(execution_id='id2', user_name='userB')
+
+        entries = self.logging_service.get_history_entries('power_user',
+                                                           history_filter=HistoryFilter(user_name='userB'))
+        self.assertEqual(['id2'], [entry.id for entry in entries])
+
     def test_find_history_entry_after_delete(self):
         self.simulate_logging(execution_id='id1')
 
@@ -454,6 +774,8 @@ class TestLoggingService(unittest.TestCase):
         if write_post_execution_info:
             self.logging_service.write_post_execution_info(execution_id, exit_code)
 
+        self.wait_log_closed(execution_id)
+
     @default_values_decorator
     def start_logging(self,
                       output_stream,
@@ -495,10 +817,11 @@ class TestLoggingService(unittest.TestCase):
         return execution_id
 
     @staticmethod
-    def get_log_files(pattern=None):
+    def get_log_files(pattern=None, compressed=False):
+        extension = '.log.gz' if compressed else '.log'
         files = [os.path.join(test_utils.temp_folder, file)
                  for file in os.listdir(test_utils.temp_folder)
-                 if file.lower().endswith('.log')]
+                 if file.lower().endswith(extension)]
 
         if pattern:
             files = [file for file in files
@@ -506,6 +829,30 @@ class TestLoggingService(unittest.TestCase):
 
         return files
 
+    def create_compressing_service(self):
+        return ExecutionLoggingService(test_utils.temp_folder, LogNameCreator(), self.authorizer, compress_logs=True)
+
+    def wait_log_closed(self, execution_id):
+        output_logger = self.logging_service._output_loggers.get(execution_id)
+        if output_logger is not None:
+            self.assertTrue(output_logger.wait_closed(timeout=2))
+
+    @staticmethod
+    def wait_until(condition, timeout=2):
+        deadline = time.time() + timeout
+        while not condition():
+            if time.time() > deadline:
+                raise AssertionError('Condition is not met within ' + str(timeout) + ' sec')
+            time.sleep(0.01)
+
+    def list_history_now(self):
+        # bypass folder modification time check
+        self.logging_service._folder_mtime = None
+        self.logging_service.get_history_entries('userX')
+
+    def wait_compression(self):
+        self.logging_service._compression_executor.shutdown(wait=True)
+
     def _get_entries_sorted(self, user_id, system_call=None):
         entries = self.logging_service.get_history_entries(user_id, system_call=system_call)
         entries.sort(key=lambda entry: entry.id)
@@ -556,6 +903,7 @@ class ExecutionLoggingInitiatorTest(unittest.TestCase):
         executor.process_wrapper.finish(0)
 
         wait_observable_close_notification(executor.get_anonymized_output_stream(), 2)
+        self.logging_service._output_loggers[execution_id].wait_closed(timeout=2)
 
         entry = self.logging_service.find_history_entry(execution_id, 'userX')
         self.assertIsNotNone(entry)
@@ -586,7 +934,13 @@ class ExecutionLoggingInitiatorTest(unittest.TestCase):
 
         wait_observable_close_notification(executor.get_anonymized_output_stream(), 2)
 
+        # output is closed right after the process finish, so the log file can be still closing
         entry = self.logging_service.find_history_entry(execution_id, 'userX')
+        wait_end = time.monotonic() + 2
+        while (entry.exit_code is None) and (time.monotonic() < wait_end):
+            time.sleep(0.01)
+            entry = self.logging_service.find_history_entry(execution_id, 'userX')
+
         self.assertEqual(14, entry.exit_code)
 
     def setUp(self):
@@ -602,6 +956,10 @@ class ExecutionLoggingInitiatorTest(unittest.TestCase):
         self.controller.start()
 
     def tearDown(self):
+        # logs are closed in background and shouldn't be written after cleanup
+        for output_logger in list(self.logging_service._output_loggers.values()):
+            output_logger.wait_closed(timeout=2)
+
         test_utils.cleanup()
 
         executions = self.executor_service.get_active_executions(USER_X.user_id)
@@ -1,13 +1,17 @@
 import copy
+import threading
 import time
 import unittest
+from unittest.mock import patch
 
 from parameterized import parameterized
 
 from auth.authorization import Authorizer, ANY_USER, EmptyGroupProvider
 from auth.user import User
 from execution import executor
-from execution.execution_service import ExecutionService
+from execution.execution_agents import AgentPool, ExecutionAgent
+from execution.execution_service import ExecutionService, PRIORITY_CALLBACK, PRIORITY_SCHEDULED, \
+    PRIORITY_INTERACTIVE
 from execution.executor import create_process_wrapper
 from model.model_helper import AccessProhibitedException
 from tests import test_utils
@@ -303,6 +307,539 @@ class ExecutionServiceTest(unittest.TestCase):
         return self.id_generator.generated_ids[-1]
 
 
+class ExecutionServiceLimitsTest(unittest.TestCase):
+    def test_start_when_below_global_limit(self):
+        execution_service = self.create_execution_service(max_concurrent=2)
+        id1 = self._start(execution_service)
+        id2 = self._start(execution_service)
+
+        self.assertCountEqual([id1, id2], execution_service.get_running_executions())
+
+    def test_queue_when_global_limit(self):
+        execution_service = self.create_execution_service(max_concurrent=1)
+        id1 = self._start(execution_service)
+        id2 = self._start(execution_service)
+
+        self.assertEqual([id1], execution_service.get_running_executions())
+        self.assertTrue(execution_service.is_queued(id2))
+        self.assertEqual(1, execution_service.get_queue_position(id2, DEFAULT_USER))
+        self.assertIsNone(execution_service.get_queue_position(id1, DEFAULT_USER))
+        self.assertCountEqual([id1, id2], execution_service.get_active_executions(DEFAULT_USER_ID))
+
+    def test_start_queued_when_finished(self):
+        execution_service = self.create_execution_service(max_concurrent=1)
+        id1 = self._start(execution_service)
+        id2 = self._start(execution_service)
+
+        self.get_process(execution_service, id1).finish(0)
+
+        self.assertEqual([id2], execution_service.get_running_executions())
+        self.assertFalse(execution_service.is_queued(id2))
+
+    def test_queue_fifo(self):
+        execution_service = self.create_execution_service(max_concurrent=1)
+        id1 = self._start(execution_service)
+        id2 = self._start(execution_service)
+        id3 = self._start(execution_service)
+
+        self.assertEqual(2, execution_service.get_queue_position(id3, DEFAULT_USER))
+
+        self.get_process(execution_service, id1).finish(0)
+        self.assertEqual([id2], execution_service.get_running_executions())
+        self.assertEqual(1, execution_service.get_queue_position(id3, DEFAULT_USER))
+
+    def test_queue_priority(self):
+        execution_service = self.create_execution_service(max_concurrent=1)
+        id1 = self._start(execution_service)
+        id2 = self._start(execution_service)
+        id3 = self._start(execution_service, priority=5)
+
+        self.assertEqual(1, execution_service.get_queue_position(id3, DEFAULT_USER))
+        self.assertEqual(2, execution_service.get_queue_position(id2, DEFAULT_USER))
+
+        self.get_process(execution_service, id1).finish(0)
+        self.assertEqual([id3], execution_service.get_running_executions())
+
+    def test_queue_when_user_limit(self):
+        execution_service = self.create_execution_service(max_concurrent_per_user=1)
+        id1 = self._start(execution_service, user_id='user_a')
+        id2 = self._start(execution_service, user_id='user_a')
+        id3 = self._start(execution_service, user_id='user_b')
+
+        self.assertCountEqual([id1, id3], execution_service.get_running_executions())
+        self.assertTrue(execution_service.is_queued(id2))
+
+    def test_queue_when_script_limit(self):
+        execution_service = self.create_execution_service()
+        limited_config = _create_script_config([], {'max_concurrent_executions': 1})
+
+        id1 = self._start(execution_service, config=limited_config)
+        id2 = self._start(execution_service, config=_create_script_config([], {'max_concurrent_executions': 1}))
+        id3 = self._start(execution_service, config=_create_script_config([], {'name': 'another script'}))
+
+        self.assertCountEqual([id1, id3], execution_service.get_running_executions())
+        self.assertTrue(execution_service.is_queued(id2))
+
+    def test_queue_not_blocked_by_another_user(self):
+        execution_service = self.create_execution_service(max_concurrent=2, max_concurrent_per_user=1)
+        id1 = self._start(execution_service, user_id='user_a')
+        id2 = self._start(execution_service, user_id='user_a')
+        id3 = self._start(execution_service, user_id='user_b')
+        id4 = self._start(execution_service, user_id='user_c')
+
+        self.assertCountEqual([id1, id3], execution_service.get_running_executions())
+
+        self.get_process(execution_service, id3).finish(0)
+
+        self.assertCountEqual([id1, id4], execution_service.get_running_executions())
+        self.assertTrue(execution_service.is_queued(id2))
+
+    def test_kill_queued(self):
+        execution_service = self.create_execution_service(max_concurrent=1)
+        id1 = self._start(execution_service)
+        id2 = self._start(execution_service)
+
+        execution_service.kill_script(id2, DEFAULT_USER)
+
+        self.assertFalse(execution_service.is_queued(id2))
+        self.assertEqual([id1], execution_service.get_active_executions(DEFAULT_USER_ID))
+
+        self.get_process(execution_service, id1).finish(0)
+        self.assertEqual([], execution_service.get_running_executions())
+
+    def test_cleanup_cancelled_queued(self):
+        execution_service = self.create_execution_service(max_concurrent=1)
+        self._start(execution_service)
+        id2 = self._start(execution_service)
+
+        execution_service.stop_script(id2, DEFAULT_USER)
+        execution_service.cleanup_execution(id2, DEFAULT_USER)
+
+        self.assertFalse(execution_service.is_active(id2))
+
+    def test_cleanup_cancelled_queued_from_finish_listener(self):
+        execution_service = self.create_execution_service(max_concurrent=1)
+        self._start(execution_service)
+        id2 = self._start(execution_service)
+
+        execution_service.add_finish_listener(lambda: execution_service.cleanup_execution(id2, DEFAULT_USER), id2)
+        execution_service.stop_script(id2, DEFAULT_USER)
+
+        self.assertFalse(execution_service.is_active(id2))
+
+    def test_cleanup_when_cancelled_concurrently(self):
+        execution_service = self.create_execution_service(max_concurrent=1)
+        self._start(execution_service)
+        id2 = self._start(execution_service)
+
+        validate = execution_service.validate_execution_id
+
+        def validate_and_cancel(*args, **kwargs):
+            validate(*args, **kwargs)
+            # the execution is stopped in the meantime
+            execution_service._cancel_queued(id2)
+
+        with patch.object(execution_service, 'validate_execution_id', side_effect=validate_and_cancel):
+            execution_service.cleanup_execution(id2, DEFAULT_USER)
+
+        self.assertFalse(execution_service.is_active(id2))
+
+    def test_cleanup_when_queued(self):
+        execution_service = self.create_execution_service(max_concurrent=1)
+        self._start(execution_service)
+        id2 = self._start(execution_service)
+
+        self.assertRaisesRegex(Exception, 'not yet finished', execution_service.cleanup_execution, id2, DEFAULT_USER)
+        self.assertTrue(execution_service.is_queued(id2))
+
+    def test_listeners_when_queued_cancelled(self):
+        execution_service = self.create_execution_service(max_concurrent=1)
+        self._start(execution_service)
+        id2 = self._start(execution_service)
+
+        notifications = []
+        execution_service.add_dequeue_listener(id2, lambda started: notifications.append('dequeued: ' + str(started)))
+        execution_service.add_finish_listener(lambda: notifications.append('finished'), id2)
+
+        execution_service.stop_script(id2, DEFAULT_USER)
+
+        self.assertEqual(['dequeued: False', 'finished'], notifications)
+
+    def test_listeners_when_queued_started_and_finished(self):
+        execution_service = self.create_execution_service(max_concurrent=1)
+        id1 = self._start(execution_service)
+        id2 = self._start(execution_service)
+
+        notifications = []
+        execution_service.add_start_listener(lambda execution_id, user: notifications.append('started ' + execution_id))
+        execution_service.add_dequeue_listener(id2, lambda started: notifications.append('dequeued: ' + str(started)))
+        execution_service.add_finish_listener(lambda: notifications.append('finished'), id2)
+
+        self.get_process(execution_service, id1).finish(0)
+        self.assertEqual(['started ' + id2, 'dequeued: True'], notifications)
+
+        self.get_process(execution_service, id2).finish(0)
+        self.assertEqual(['started ' + id2, 'dequeued: True', 'finished'], notifications)
+
+    def test_dequeue_listener_when_not_queued(self):
+        execution_service = self.create_execution_service(max_concurrent=1)
+        id1 = self._start(execution_service)
+
+        self.assertFalse(execution_service.add_dequeue_listener(id1, lambda started: None))
+
+    def test_get_user_parameter_values_when_queued(self):
+        execution_service = self.create_execution_service(max_concurrent=1)
+        self._start(execution_service)
+
+        config = _create_script_config([test_utils.create_script_param_config('p1')])
+        id2 = _start_with_config(execution_service, config, {'p1': 'abc'})
+
+        self.assertEqual({'p1': 'abc'}, execution_service.get_user_parameter_values(id2))
+
+    def _start(self, execution_service, user_id=DEFAULT_USER_ID, config=None, priority=0):
+        if config is None:
+            config = _create_script_config([])
+
+        user = User(user_id, DEFAULT_AUDIT_NAMES)
+        execution_id = execution_service.start_script(config, user, priority)
+        execution_owners[execution_id] = user
+        return execution_id
+
+    def create_execution_service(self, max_concurrent=None, max_concurrent_per_user=None):
+        execution_service = ExecutionService(self.authorizer,
+                                             self.id_generator,
+                                             test_utils.env_variables,
+                                             max_concurrent=max_concurrent,
+                                             max_concurrent_per_user=max_concurrent_per_user)
+        self.exec_services.append(execution_service)
+        return execution_service
+
+    def get_process(self, execution_service, execution_id) -> _MockProcessWrapper:
+        return self.processes[execution_service.get_process_id(execution_id)]
+
+    def setUp(self):
+        super().setUp()
+        self.id_generator = _IdGeneratorMock()
+        self.authorizer = Authorizer(ANY_USER, [], [], [], EmptyGroupProvider())
+        self.exec_services = []
+        self.processes = {}
+
+        def create_process(executor, command, working_directory, env_variables):
+            wrapper = _MockProcessWrapper(executor, command, working_directory, env_variables)
+            self.processes[wrapper.get_process_id()] = wrapper
+            return wrapper
+
+        executor._process_creator = create_process
+
+    def tearDown(self):
+        super().tearDown()
+
+        for service in self.exec_services:
+            for id in list(service._queued_executions.keys()):
+                service.kill_script_by_system(id)
+
+            for id in service.get_running_executions():
+                service.kill_script_by_system(id)
+
+        executor._process_creator = create_process_wrapper
+
+
+class ExecutionServiceWorkersTest(unittest.TestCase):
+    def test_start_in_worker(self):
+        execution_service = self.create_execution_service(workers=2)
+        execution_id = self._start(execution_service)
+
+        self.wait_started(execution_service, execution_id)
+
+        self.assertEqual(1, len(self.spawn_threads))
+        self.assertIsNot(threading.main_thread(), self.spawn_threads[0])
+
+    def test_start_returns_before_spawn(self):
+        spawn_allowed = threading.Event()
+        self.before_spawn = spawn_allowed.wait
+
+        execution_service = self.create_execution_service(workers=1)
+        execution_id = self._start(execution_service)
+
+        self.assertEqual([], execution_service.get_running_executions())
+        self.assertEqual([execution_id], execution_service.get_active_executions(DEFAULT_USER_ID))
+
+        spawn_allowed.set()
+        self.wait_started(execution_service, execution_id)
+
+    def test_queue_when_all_workers_busy(self):
+        execution_service = self.create_execution_service(workers=2)
+        id1 = self._start(execution_service)
+        id2 = self._start(execution_service)
+        id3 = self._start(execution_service)
+
+        self.wait_started(execution_service, id1)
+        self.wait_started(execution_service, id2)
+
+        self.assertTrue(execution_service.is_queued(id3))
+
+        self.get_process(execution_service, id1).finish(0)
+        self.wait_started(execution_service, id3)
+
+    def test_priorities(self):
+        execution_service = self.create_execution_service(workers=1)
+        id1 = self._start(execution_service)
+        self.wait_started(execution_service, id1)
+
+        callback_id = self._start(execution_service, PRIORITY_CALLBACK)
+        scheduled_id = self._start(execution_service, PRIORITY_SCHEDULED)
+        interactive_id = self._start(execution_service, PRIORITY_INTERACTIVE)
+
+        self.get_process(execution_service, id1).finish(0)
+        self.wait_started(execution_service, interactive_id)
+
+        self.get_process(execution_service, interactive_id).finish(0)
+        self.wait_started(execution_service, scheduled_id)
+
+        self.get_process(execution_service, scheduled_id).finish(0)
+        self.wait_started(execution_service, callback_id)
+
+    def test_kill_queued(self):
+        spawn_allowed = threading.Event()
+        self.before_spawn = spawn_allowed.wait
+
+        execution_service = self.create_execution_service(workers=1)
+        id1 = self._start(execution_service)
+        id2 = self._start(execution_service)
+
+        execution_service.kill_script(id2, DEFAULT_USER)
+        spawn_allowed.set()
+
+        self.wait_started(execution_service, id1)
+        self.get_process(execution_service, id1).finish(0)
+
+        self.assertFalse(execution_service.is_queued(id2))
+        self.assertEqual([id1], execution_service.get_active_executions(DEFAULT_USER_ID))
+        self.assertEqual(1, len(self.spawn_threads))
+
+    def test_cleanup_cancelled_before_spawn(self):
+        spawn_allowed = threading.Event()
+        self.before_spawn = spawn_allowed.wait
+
+        execution_service = self.create_execution_service(workers=1)
+        id1 = self._start(execution_service)
+        id2 = self._start(execution_service)
+
+        execution_service.kill_script(id2, DEFAULT_USER)
+        execution_service.cleanup_execution(id2, DEFAULT_USER)
+        spawn_allowed.set()
+
+        self.wait_started(execution_service, id1)
+        self.assertFalse(execution_service.is_active(id2))
+
+    def test_spawn_failure(self):
+        listener_added = threading.Event()
+
+        def fail_spawn():
+            listener_added.wait(2)
+            raise Exception('Test failure')
+
+        self.before_spawn = fail_spawn
+
+        execution_service = self.create_execution_service(workers=1)
+        execution_id = self._start(execution_service)
+
+        finished = threading.Event()
+        execution_service.add_finish_listener(finished.set, execution_id)
+        listener_added.set()
+
+        self.assertTrue(finished.wait(2))
+        self.assertEqual([], execution_service.get_active_executions(DEFAULT_USER_ID))
+
+    def _start(self, execution_service, priority=PRIORITY_INTERACTIVE):
+        config = _create_script_config([])
+
+        execution_id = execution_service.start_script(config, DEFAULT_USER, priority)
+        execution_owners[execution_id] = DEFAULT_USER
+        return execution_id
+
+    def create_execution_service(self, workers):
+        execution_service = ExecutionService(self.authorizer,
+                                             self.id_generator,
+                                             test_utils.env_variables,
+                                             workers=workers)
+        self.exec_services.append(execution_service)
+        return execution_service
+
+    def get_process(self, execution_service, execution_id) -> _MockProcessWrapper:
+        return self.processes[execution_service.get_process_id(execution_id)]
+
+    @staticmethod
+    def wait_started(execution_service, execution_id):
+        end_time = time.time() + 2
+        while (execution_id not in execution_service.get_running_executions()) and (time.time() < end_time):
+            time.sleep(0.01)
+
+        if execution_id not in execution_service.get_running_executions():
+            raise AssertionError('Execution #' + execution_id + ' was not started')
+
+    def setUp(self):
+        super().setUp()
+        self.id_generator = _IdGeneratorMock()
+        self.authorizer = Authorizer(ANY_USER, [], [], [], EmptyGroupProvider())
+        self.exec_services = []
+        self.processes = {}
+        self.spawn_threads = []
+        self.before_spawn = None
+
+        def create_process(executor, command, working_directory, env_variables):
+            if self.before_spawn is not None:
+                self.before_spawn()
+
+            self.spawn_threads.append(threading.current_thread())
+
+            wrapper = _MockProcessWrapper(executor, command, working_directory, env_variables)
+            self.processes[wrapper.get_process_id()] = wrapper
+            return wrapper
+
+        executor._process_creator = create_process
+
+    def tearDown(self):
+        super().tearDown()
+
+        for service in self.exec_services:
+            for id in list(service._queued_executions.keys()):
+                service.kill_script_by_system(id)
+
+            for id in service.get_running_executions():
+                service.kill_script_by_system(id)
+
+            service._worker_pool.shutdown(wait=True)
+
+        executor._process_creator = create_process_wrapper
+
+
+class ExecutionServiceAgentsTest(unittest.TestCase):
+    def test_local_script_without_agent(self):
+        execution_service = self.create_execution_service([_create_agent('a1', [])])
+        execution_id = self._start(execution_service, agent_labels=None)
+
+        self.assertIsNone(self.get_agent(execution_service, execution_id))
+
+    def test_dispatch_to_matching_agent(self):
+        agent1 = _create_agent('a1', ['linux'])
+        agent2 = _create_agent('a2', ['windows'])
+        execution_service = self.create_execution_service([agent1, agent2])
+
+        execution_id = self._start(execution_service, agent_labels=['windows'])
+
+        self.assertIs(agent2, self.get_agent(execution_service, execution_id))
+
+    def test_queue_when_agents_full(self):
+        execution_service = self.create_execution_service([_create_agent('a1', [], capacity=1)])
+
+        id1 = self._start(execution_service, agent_labels=[])
+        id2 = self._start(execution_service, agent_labels=[])
+
+        self.assertEqual([id1], execution_service.get_running_executions())
+        self.assertTrue(execution_service.is_queued(id2))
+
+    def test_start_queued_when_agent_released(self):
+        agent1 = _create_agent('a1', [], capacity=1)
+        execution_service = self.create_execution_service([agent1])
+
+        id1 = self._start(execution_service, agent_labels=[])
+        id2 = self._start(execution_service, agent_labels=[])
+
+        self.get_process(execution_service, id1).finish(0)
+
+        self.assertEqual([id2], execution_service.get_running_executions())
+        self.assertIs(agent1, self.get_agent(execution_service, id2))
+        self.assertEqual(1, agent1.running_count)
+
+    def test_local_script_not_queued_when_agents_full(self):
+        execution_service = self.create_execution_service([_create_agent('a1', [], capacity=1)])
+
+        id1 = self._start(execution_service, agent_labels=[])
+        id2 = self._start(execution_service, agent_labels=None)
+
+        self.assertCountEqual([id1, id2], execution_service.get_running_executions())
+
+    def test_no_matching_agent(self):
+        execution_service = self.create_execution_service([_create_agent('a1', ['linux'])])
+
+        self.assertRaisesRegex(Exception, 'No execution agent',
+                               self._start, execution_service, agent_labels=['windows'])
+
+    def test_no_agents_configured(self):
+        execution_service = self.create_execution_service(None)
+
+        self.assertRaisesRegex(Exception, 'No execution agent', self._start, execution_service, agent_labels=[])
+
+    def test_release_agent_when_start_failed(self):
+        agent1 = _create_agent('a1', [], capacity=1)
+        execution_service = self.create_execution_service([agent1])
+
+        def fail_spawn(*args):
+            raise Exception('Test failure')
+
+        executor._process_creator = fail_spawn
+
+        self.assertRaises(Exception, self._start, execution_service, agent_labels=[])
+        self.assertEqual(0, agent1.running_count)
+
+    def _start(self, execution_service, agent_labels):
+        extra_config = {'agent_labels': agent_labels} if agent_labels is not None else None
+        config = _create_script_config([], extra_config)
+
+        execution_id = execution_service.start_script(config, DEFAULT_USER)
+        execution_owners[execution_id] = DEFAULT_USER
+        return execution_id
+
+    def create_execution_service(self, agents):
+        agent_pool = AgentPool(agents) if agents is not None else None
+
+        execution_service = ExecutionService(self.authorizer,
+                                             self.id_generator,
+                                             test_utils.env_variables,
+                                             agent_pool=agent_pool)
+        self.exec_services.append(execution_service)
+        return execution_service
+
+    def get_process(self, execution_service, execution_id) -> _MockProcessWrapper:
+        return self.processes[execution_service.get_process_id(execution_id)]
+
+    def get_agent(self, execution_service, execution_id):
+        return self.process_agents[execution_service.get_process_id(execution_id)]
+
+    def setUp(self):
+        super().setUp()
+        self.id_generator = _IdGeneratorMock()
+        self.authorizer = Authorizer(ANY_USER, [], [], [], EmptyGroupProvider())
+        self.exec_services = []
+        self.processes = {}
+        self.process_agents = {}
+
+        def create_process(executor, command, working_directory, env_variables):
+            wrapper = _MockProcessWrapper(executor, command, working_directory, env_variables)
+            self.processes[wrapper.get_process_id()] = wrapper
+            self.process_agents[wrapper.get_process_id()] = executor.agent
+            return wrapper
+
+        executor._process_creator = create_process
+
+    def tearDown(self):
+        super().tearDown()
+
+        for service in self.exec_services:
+            for id in list(service._queued_executions.keys()):
+                service.kill_script_by_system(id)
+
+            for id in service.get_running_executions():
+                service.kill_script_by_system(id)
+
+        executor._process_creator = create_process_wrapper
+
+
+def _create_agent(name, labels, capacity=2):
+    return ExecutionAgent(name, 'localhost', 5100, capacity, labels)
+
+
 class ExecutionServiceAuthorizationTest(unittest.TestCase):
     owner_user = User('user_x', {audit_utils.AUTH_USERNAME: 'some_name'})
 
@@ -439,12 +976,16 @@ def _start_with_config(execution_service, config, parameter_values=None, user_id
     return execution_id
 
 
-def _create_script_config(parameter_configs):
+def _create_script_config(parameter_configs, extra_config=None):
+    config = {'name': 'script_x',
+              'script_path': 'ls',
+              'parameters': parameter_configs}
+    if extra_config:
+        config.update(extra_config)
+
     return test_utils.create_config_model(
         'script_x',
-        config={'name': 'script_x',
-                'script_path': 'ls',
-                'parameters': parameter_configs},
+        config=config,
         username='user1',
         audit_name='localhost',
 
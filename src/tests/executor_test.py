@@ -642,6 +642,41 @@ class TestProcessOutput(unittest.TestCase):
         output = self.get_finish_output()
         self.assertEqual(output, 'Writing ******\n...\n******-\nDone')
 
+    def test_log_with_secure_split_between_buffers(self):
+        parameter = create_script_param_config('p1', secure=True)
+        config = self._create_config(parameters=[parameter])
+
+        self.create_and_start_executor(config, {'p1': 'password'})
+
+        self.write_process_output('my pass')
+        wait_buffer_flush()
+        self.write_process_output('word is secret, bob')
+        wait_buffer_flush()
+        self.write_process_output('password is not')
+
+        self.finish_process()
+
+        output = self.get_finish_output()
+        self.assertEqual(output, 'my ****** is secret, bobpassword is not')
+
+    def test_output_with_memory_limit(self):
+        parameter = create_script_param_config('p1', secure=True)
+        config = self._create_config(parameters=[parameter])
+
+        self.create_and_start_executor(config, {'p1': 'password'}, output_memory_limit=20)
+
+        lines = ['line ' + str(i) + ' password\n' for i in range(50)]
+        for line in lines:
+            self.write_process_output(line)
+
+        self.finish_process()
+
+        output = self.get_finish_output()
+        self.assertEqual(''.join(lines).replace('password', '******'), output)
+
+        raw_output = ''.join(read_until_closed(self.executor.get_raw_output_stream(), timeout=BUFFER_FLUSH_WAIT_TIME))
+        self.assertEqual(''.join(lines), raw_output)
+
     @staticmethod
     def _create_config(parameters=None):
         return create_config_model('config_x', parameters=parameters)
@@ -676,13 +711,13 @@ class TestProcessOutput(unittest.TestCase):
         output = ''.join(data)
         return output
 
-    def create_and_start_executor(self, config, parameter_values=None):
+    def create_and_start_executor(self, config, parameter_values=None, output_memory_limit=None):
         if parameter_values is None:
             parameter_values = {}
 
         config.set_all_param_values(parameter_values)
 
-        self.executor = ScriptExecutor(config, test_utils.env_variables)
+        self.executor = ScriptExecutor(config, test_utils.env_variables, output_memory_limit)
         self.executor.start(123)
         return self.executor
 
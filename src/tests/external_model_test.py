@@ -4,7 +4,7 @@ from datetime import datetime, timezone
 
 from execution.logging import HistoryEntry
 from model.external_model import to_short_execution_log, to_long_execution_log, server_conf_to_external, \
-    parse_external_schedule
+    parse_external_schedule, to_history_query
 from model.script_config import OUTPUT_FORMAT_TERMINAL
 from model.server_conf import ServerConfig
 
@@ -220,3 +220,45 @@ class TestParseExternalSchedule(unittest.TestCase):
             'weekdays': None,
             'end_arg': None,
             'end_option': None}, parsed)
+
+
+class TestToHistoryQuery(unittest.TestCase):
+    def test_empty_query(self):
+        query = to_history_query({})
+
+        self.assertIsNone(query.sort_by)
+        self.assertFalse(query.descending)
+        self.assertEqual(0, query.offset)
+        self.assertIsNone(query.limit)
+        self.assertIsNone(query.history_filter.script_name)
+        self.assertIsNone(query.history_filter.start_time_from)
+
+    def test_full_query(self):
+        query = to_history_query({
+            'sort': '-startTime',
+            'offset': '20',
+            'limit': '10',
+            'script': 'my script',
+            'user': 'userX',
+            'exitCode': '3',
+            'startTimeFrom': '2020-12-30T10:15:00Z',
+            'startTimeTo': '2020-12-31T10:15:00+02:00'})
+
+        self.assertEqual('start_time', query.sort_by)
+        self.assertTrue(query.descending)
+        self.assertEqual(20, query.offset)
+        self.assertEqual(10, query.limit)
+        self.assertEqual('my script', query.history_filter.script_name)
+        self.assertEqual('userX', query.history_filter.user_name)
+        self.assertEqual(3, query.history_filter.exit_code)
+        self.assertEqual(datetime(2020, 12, 30, 10, 15, tzinfo=timezone.utc), query.history_filter.start_time_from)
+        self.assertEqual(datetime(2020, 12, 31, 8, 15, tzinfo=timezone.utc), query.history_filter.start_time_to)
+
+    def test_unknown_sort_field(self):
+        self.assertRaises(ValueError, to_history_query, {'sort': 'command'})
+
+    def test_negative_limit(self):
+        self.assertRaises(ValueError, to_history_query, {'limit': '-1'})
+
+    def test_invalid_start_time(self):
+        self.assertRaises(ValueError, to_history_query, {'startTimeFrom': 'yesterday'})
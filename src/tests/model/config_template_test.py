@@ -0,0 +1,58 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from model.config_template import ConfigTemplate
+from tests import test_utils
+from utils.process_utils import ExecutionException
+
+
+class TestConfigTemplate(unittest.TestCase):
+    def test_invoke(self):
+        output = self.template.invoke('echo 123')
+
+        self.assertEqual('123\n', output)
+
+    def test_invoke_same_script_once(self):
+        self.template.invoke('echo 123')
+        output = self.template.invoke('echo 123')
+
+        self.assertEqual('123\n', output)
+        self.assertEqual(1, self.invoker.invoke.call_count)
+
+    def test_invoke_different_scripts(self):
+        output1 = self.template.invoke('echo 123')
+        output2 = self.template.invoke('echo 456')
+        output3 = self.template.invoke('echo 123', shell=True)
+
+        self.assertEqual(['123\n', '456\n', '123\n'], [output1, output2, output3])
+        self.assertEqual(3, self.invoker.invoke.call_count)
+
+    def test_invoke_concurrently_once(self):
+        def slow_invoke(command, work_dir='.', **kwargs):
+            time.sleep(0.1)
+            return 'output'
+
+        self.invoker.invoke.side_effect = slow_invoke
+
+        outputs = []
+        threads = [threading.Thread(target=lambda: outputs.append(self.template.invoke('some script')))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(['output'] * 5, outputs)
+        self.assertEqual(1, self.invoker.invoke.call_count)
+
+    def test_failure_not_cached(self):
+        self.assertRaises(ExecutionException, self.template.invoke, 'ls some_missing_file_12345')
+        self.assertRaises(ExecutionException, self.template.invoke, 'ls some_missing_file_12345')
+
+        self.assertEqual(2, self.invoker.invoke.call_count)
+
+    def setUp(self):
+        self.invoker = mock.Mock(wraps=test_utils.process_invoker)
+        self.template = ConfigTemplate(self.invoker)
@@ -0,0 +1,225 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from model.parameter_config import ParameterModel
+from model.script_output_cache import ScriptOutputCache
+from tests import test_utils
+from utils.process_utils import ExecutionException
+
+
+class TestScriptOutputCache(unittest.TestCase):
+    def test_invoke(self):
+        output = self.invoke('echo 123')
+
+        self.assertEqual('123\n', output)
+
+    def test_invoke_cached(self):
+        self.invoke('echo 123')
+        output = self.invoke('echo 123')
+
+        self.assertEqual('123\n', output)
+        self.assertEqual(1, self.invoker.invoke.call_count)
+
+    def test_invoke_different_commands(self):
+        output1 = self.invoke('echo 123')
+        output2 = self.invoke('echo 456')
+        output3 = self.invoke('echo 123', shell=True)
+
+        self.assertEqual(['123\n', '456\n', '123\n'], [output1, output2, output3])
+        self.assertEqual(3, self.invoker.invoke.call_count)
+
+    def test_invoke_when_ttl_zero(self):
+        self.invoke('echo 123', ttl_sec=0)
+        self.invoke('echo 123', ttl_sec=0)
+
+        self.assertEqual(2, self.invoker.invoke.call_count)
+        self.assertEqual(0, self.cache.get_stats().size)
+
+    def test_invoke_after_ttl(self):
+        self.invoke('echo 123')
+
+        self.time_mock.monotonic.return_value = 70
+        self.invoke('echo 123')
+
+        self.assertEqual(2, self.invoker.invoke.call_count)
+
+    def test_invoke_stale_returns_old_output(self):
+        self.cache = ScriptOutputCache(ttl_sec=60, stale_ttl_sec=100)
+        self.invoker.invoke.side_effect = ['old', 'new']
+        self.invoke('my script')
+
+        self.time_mock.monotonic.return_value = 70
+        output = self.invoke('my script')
+
+        self.assertEqual('old', output)
+        self.wait_invocations(2)
+
+    def test_invoke_stale_refreshed_in_background(self):
+        self.cache = ScriptOutputCache(ttl_sec=60, stale_ttl_sec=100)
+        self.invoker.invoke.side_effect = ['old', 'new']
+        self.invoke('my script')
+
+        self.time_mock.monotonic.return_value = 70
+        self.invoke('my script')
+        self.wait_invocations(2)
+
+        output = self.invoke('my script')
+        self.assertEqual('new', output)
+        self.assertEqual(2, self.invoker.invoke.call_count)
+
+    def test_invoke_after_stale_ttl(self):
+        self.cache = ScriptOutputCache(ttl_sec=60, stale_ttl_sec=100)
+        self.invoker.invoke.side_effect = ['old', 'new']
+        self.invoke('my script')
+
+        self.time_mock.monotonic.return_value = 200
+        output = self.invoke('my script')
+
+        self.assertEqual('new', output)
+
+    def test_failure_not_cached(self):
+        self.assertRaises(ExecutionException, self.invoke, 'ls some_missing_file_12345')
+        self.assertRaises(ExecutionException, self.invoke, 'ls some_missing_file_12345')
+
+        self.assertEqual(2, self.invoker.invoke.call_count)
+
+    def test_lru_eviction(self):
+        self.cache = ScriptOutputCache(ttl_sec=60, max_entries=2)
+
+        self.invoke('echo 1')
+        self.invoke('echo 2')
+        self.invoke('echo 1')
+        self.invoke('echo 3')
+
+        self.invoke('echo 1')
+        self.assertEqual(3, self.invoker.invoke.call_count)
+
+        self.invoke('echo 2')
+        self.assertEqual(4, self.invoker.invoke.call_count)
+
+    def test_invoke_concurrently_once(self):
+        def slow_invoke(command, work_dir='.', **kwargs):
+            time.sleep(0.1)
+            return 'output'
+
+        self.invoker.invoke.side_effect = slow_invoke
+
+        outputs = []
+        threads = [threading.Thread(target=lambda: outputs.append(self.invoke('some script')))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(['output'] * 5, outputs)
+        self.assertEqual(1, self.invoker.invoke.call_count)
+
+    def test_stats(self):
+        self.cache = ScriptOutputCache(ttl_sec=60, stale_ttl_sec=100)
+        self.invoker.invoke.side_effect = None
+        self.invoker.invoke.return_value = 'output'
+
+        self.invoke('echo 1')
+        self.invoke('echo 1')
+        self.invoke('echo 1')
+        self.time_mock.monotonic.return_value = 70
+        self.invoke('echo 1')
+        self.wait_invocations(2)
+
+        stats = self.cache.get_stats()
+        self.assertEqual((2, 1, 1, 1), (stats.hits, stats.stale_hits, stats.misses, stats.size))
+        self.assertEqual(0.75, stats.hit_ratio)
+
+    def test_stats_hit_ratio_when_empty(self):
+        self.assertEqual(0.0, self.cache.get_stats().hit_ratio)
+
+    def test_invoker_skips_cache_for_environment_variables(self):
+        invoker = self.cache.invoker(self.invoker)
+
+        invoker.invoke('echo 123', environment_variables={'x': '1'})
+        invoker.invoke('echo 123', environment_variables={'x': '1'})
+
+        self.assertEqual(2, self.invoker.invoke.call_count)
+
+    def invoke(self, command, shell=False, ttl_sec=None):
+        return self.cache.invoke(self.invoker, command, shell=shell, ttl_sec=ttl_sec)
+
+    def wait_invocations(self, count):
+        end_time = time.time() + 2
+        while (self.invoker.invoke.call_count < count) and (time.time() < end_time):
+            time.sleep(0.01)
+
+        # let the refresh finish storing the output
+        time.sleep(0.05)
+        self.assertEqual(count, self.invoker.invoke.call_count)
+
+    def setUp(self):
+        self.invoker = mock.Mock(wraps=test_utils.process_invoker)
+        self.cache = ScriptOutputCache(ttl_sec=60)
+
+        time_patcher = mock.patch('model.script_output_cache.time')
+        self.time_mock = time_patcher.start()
+        self.time_mock.monotonic.return_value = 0
+        self.addCleanup(time_patcher.stop)
+
+
+class TestParameterModelCaching(unittest.TestCase):
+    def test_values_script_cached(self):
+        self.create_parameter({'type': 'list', 'values': {'script': 'echo 123'}})
+        parameter = self.create_parameter({'type': 'list', 'values': {'script': 'echo 123'}})
+
+        self.assertEqual(['123'], parameter.values)
+        self.assertEqual(1, self.invoker.invoke.call_count)
+
+    def test_values_script_not_cached_when_disabled(self):
+        self.create_parameter({'type': 'list', 'values': {'script': 'echo 123', 'cache_ttl': 0}})
+        self.create_parameter({'type': 'list', 'values': {'script': 'echo 123', 'cache_ttl': 0}})
+
+        self.assertEqual(2, self.invoker.invoke.call_count)
+
+    def test_values_script_cached_with_explicit_ttl(self):
+        self.cache = ScriptOutputCache(ttl_sec=0)
+
+        self.create_parameter({'type': 'list', 'values': {'script': 'echo 123', 'cache_ttl': 10}})
+        self.create_parameter({'type': 'list', 'values': {'script': 'echo 123', 'cache_ttl': 10}})
+
+        self.assertEqual(1, self.invoker.invoke.call_count)
+
+    def test_values_script_not_cached_by_default_ttl_zero(self):
+        self.cache = ScriptOutputCache(ttl_sec=0)
+
+        self.create_parameter({'type': 'list', 'values': {'script': 'echo 123'}})
+        self.create_parameter({'type': 'list', 'values': {'script': 'echo 123'}})
+
+        self.assertEqual(2, self.invoker.invoke.call_count)
+
+    def test_values_script_cached_per_user(self):
+        config = {'type': 'list', 'values': {'script': 'echo ${auth.username}'}}
+        parameter1 = self.create_parameter(config, username='user1')
+        parameter2 = self.create_parameter(config, username='user2')
+        self.create_parameter(config, username='user1')
+
+        self.assertEqual(['user1'], parameter1.values)
+        self.assertEqual(['user2'], parameter2.values)
+        self.assertEqual(2, self.invoker.invoke.call_count)
+
+    def test_default_script_cached(self):
+        self.create_parameter({'default': {'script': 'echo 123'}})
+        self.create_parameter({'default': {'script': 'echo 123'}})
+
+        self.assertEqual(1, self.invoker.invoke.call_count)
+
+    def create_parameter(self, config, username='my_user'):
+        return ParameterModel(config,
+                              username,
+                              'my_user-pc',
+                              lambda: [],
+                              self.invoker,
+                              script_output_cache=self.cache)
+
+    def setUp(self):
+        self.invoker = mock.Mock(wraps=test_utils.process_invoker)
+        self.cache = ScriptOutputCache(ttl_sec=60)
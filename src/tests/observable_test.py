@@ -352,6 +352,19 @@ class TestObservable(unittest.TestCase):
 
         self._test_close(observable, mapped_observable)
 
+    def test_map_close_function(self):
+        observable = self.create_observable()
+        mapped_observable = observable.map(lambda chunk: chunk + '_x', lambda: 'last')
+
+        observer = _StoringObserver()
+        mapped_observable.subscribe(observer)
+
+        observable.push('message')
+        observable.close()
+
+        self.assertEqual(['message_x', 'last'], observer.data)
+        self.assertTrue(observer.closed)
+
     def test_time_buffer_close(self):
         observable = self.create_observable()
         buffered_observable = observable.time_buffered(10)
@@ -680,9 +693,6 @@ class TestObservable(unittest.TestCase):
         observable.push('m2')
         observable.close()
 
-        self.assertEqual([], observer.data)
-        self.assertFalse(observer.closed)
-
         self.wait_buffer_flush(buffered_observable)
 
         self.assertEqual(['m1', 'm2'], observer.data)
@@ -745,7 +755,8 @@ class TestObservable(unittest.TestCase):
 
     def test_time_buffer_aggregated_read_until_closed(self):
         observable = self.create_observable()
-        buffered_observable = observable.time_buffered(100, lambda chunks: ['|'.join(chunks)])
+        # late messages are flushed on close, so the period should end before they are published
+        buffered_observable = observable.time_buffered(40, lambda chunks: ['|'.join(chunks)])
 
         data, _, late_messages = self._test_read_until_closed(
             observable,
@@ -755,19 +766,45 @@ class TestObservable(unittest.TestCase):
 
         self.assertEqual([message], data)
 
-    def test_time_buffer_not_flushed_read_until_closed(self):
+    def test_time_buffer_flushed_on_close_without_waiting_period(self):
         observable = self.create_observable()
 
-        buffered_observable = observable.time_buffered(300)
+        buffered_observable = observable.time_buffered(3000)
+
+        observer = _StoringObserver()
+        buffered_observable.subscribe(observer)
 
         observable.push('m1')
         observable.push('m2')
         observable.close()
 
-        self.assertFalse(buffered_observable.closed)
-        self.assertTrue(observable.closed)
+        buffered_observable.wait_close(0.5)
 
-        self.assertRaises(TimeoutError, read_until_closed, buffered_observable, 0.001)
+        self.assertTrue(buffered_observable.closed)
+        self.assertEqual(['m1', 'm2'], observer.data)
+        self.assertTrue(observer.closed)
+
+    def test_time_buffer_flush_not_more_often_than_period(self):
+        observable = self.create_observable()
+
+        buffered_observable = observable.time_buffered(200)
+
+        observer = _StoringObserver()
+        buffered_observable.subscribe(observer)
+
+        observable.push('m1')
+        time.sleep(0.1)
+        self.assertEqual([], observer.data)
+
+        time.sleep(0.15)
+        self.assertEqual(['m1'], observer.data)
+
+        observable.push('m2')
+        time.sleep(0.05)
+        self.assertEqual(['m1'], observer.data)
+
+        time.sleep(0.15)
+        self.assertEqual(['m1', 'm2'], observer.data)
 
     def test_replay_read_until_closed(self):
         observable = self.create_replay_observable()
@@ -847,18 +884,108 @@ class TestObservable(unittest.TestCase):
         thread.join(timeout=0.1)
         self.assertFalse(thread.is_alive())
 
+    def test_replay_with_memory_limit(self):
+        observable = self.create_replay_observable(memory_limit=10)
+
+        messages = ['message ' + str(i) + '\n' for i in range(100)]
+        for message in messages:
+            observable.push(message)
+
+        self.assertTrue(observable.wait_spilled(timeout=1))
+        self.assertLessEqual(sum(len(chunk) for chunk in observable.chunks), 10)
+
+        observer = _StoringObserver()
+        observable.subscribe(observer)
+
+        self.assertEqual(''.join(messages), ''.join(observer.data))
+
+    def test_replay_with_memory_limit_when_unicode(self):
+        observable = self.create_replay_observable(memory_limit=5)
+
+        messages = ['ΩΨΔ' * i for i in range(20)]
+        for message in messages:
+            observable.push(message)
+
+        observer = _StoringObserver()
+        observable.subscribe(observer)
+
+        self.assertEqual(''.join(messages), ''.join(observer.data))
+
+    def test_replay_with_memory_limit_push_after_subscription(self):
+        observable = self.create_replay_observable(memory_limit=10)
+
+        observable.push('early message')
+
+        observer = _StoringObserver()
+        observable.subscribe(observer)
+
+        observable.push('late message 1')
+        observable.push('late message 2')
+
+        self.assertEqual('early message' + 'late message 1' + 'late message 2', ''.join(observer.data))
+
+    def test_pipe_replay_with_memory_limit(self):
+        observable = self.create_observable()
+        replay = self.replay(observable, memory_limit=20)
+
+        messages = ['chunk ' + str(i) for i in range(50)]
+        for message in messages:
+            observable.push(message)
+        observable.close()
+
+        self.assertEqual(''.join(messages), ''.join(read_until_closed(replay, 1)))
+
+    def test_replay_with_memory_limit_does_not_write_in_pushing_thread(self):
+        observable = self.create_replay_observable(memory_limit=10)
+
+        pushing_thread = threading.current_thread()
+        writing_threads = []
+        original_spill = observable._spill
+
+        def spill():
+            writing_threads.append(threading.current_thread())
+            original_spill()
+
+        observable._spill = spill
+
+        messages = ['message ' + str(i) for i in range(20)]
+        for message in messages:
+            observable.push(message)
+
+        self.assertTrue(observable.wait_spilled(timeout=1))
+        self.assertTrue(writing_threads)
+        self.assertNotIn(pushing_thread, writing_threads)
+
+        observer = _StoringObserver()
+        observable.subscribe(observer)
+        self.assertEqual(''.join(messages), ''.join(observer.data))
+
+    def test_replay_with_memory_limit_after_dispose(self):
+        observable = self.create_replay_observable(memory_limit=10)
+
+        for i in range(10):
+            observable.push('message ' + str(i))
+
+        observable.dispose()
+
+        observer = _StoringObserver()
+        observable.subscribe(observer)
+
+        self.assertEqual([], observer.data)
+        self.assertTrue(observer.closed)
+
     def create_observable(self):
         observable = Observable()
         self._track(observable)
         return observable
 
-    def replay(self, observable):
-        replay = observable.replay()
+    def replay(self, observable, memory_limit=None):
+        replay = observable.replay(memory_limit)
         self._track(observable)
         return replay
 
-    def create_replay_observable(self):
-        observable = ReplayObservable()
+    def create_replay_observable(self, memory_limit=None):
+        observable = ReplayObservable(memory_limit)
         self._track(observable)
         return observable
 
@@ -1,4 +1,6 @@
 import os
+import threading
+import time
 import unittest
 
 from tests import test_utils
@@ -107,3 +109,43 @@ class TestSplitCommand(unittest.TestCase):
 
     def tearDown(self):
         test_utils.cleanup()
+
+
+class TestCancellableInvocations(unittest.TestCase):
+    def test_invoke_without_cancellation(self):
+        token = process_utils.CancellationToken()
+
+        with process_utils.cancellable_invocations(token):
+            output = test_utils.process_invoker.invoke('echo 123')
+
+        self.assertEqual('123\n', output)
+
+    def test_invoke_when_already_cancelled(self):
+        token = process_utils.CancellationToken()
+        token.cancel()
+
+        with process_utils.cancellable_invocations(token):
+            self.assertRaises(process_utils.InvocationCancelledException,
+                              test_utils.process_invoker.invoke, 'echo 123')
+
+    def test_cancel_running_shell_script(self):
+        token = process_utils.CancellationToken()
+        threading.Timer(0.2, token.cancel).start()
+
+        start_time = time.time()
+        with process_utils.cancellable_invocations(token):
+            self.assertRaises(process_utils.InvocationCancelledException,
+                              test_utils.process_invoker.invoke, 'sleep 10; echo 123', shell=True)
+
+        self.assertLess(time.time() - start_time, 5)
+
+    def test_cancel_outside_of_scope(self):
+        token = process_utils.CancellationToken()
+
+        with process_utils.cancellable_invocations(token):
+            pass
+
+        token.cancel()
+        output = test_utils.process_invoker.invoke('echo 123')
+
+        self.assertEqual('123\n', output)
@@ -8,6 +8,7 @@ from unittest.mock import patch, ANY, MagicMock
 
 from auth.user import User
 from config.config_service import ConfigService
+from execution.execution_service import PRIORITY_SCHEDULED
 from scheduling import scheduler
 from scheduling.schedule_config import ScheduleConfig, InvalidScheduleException
 from scheduling.schedule_service import ScheduleService, InvalidUserException, UnavailableScriptException
@@ -70,7 +71,7 @@ class ScheduleServiceTestCase(TestCase):
         self.create_config('unschedulable-script', scheduling_enabled=False)
 
         self.execution_service = MagicMock()
-        self.execution_service.start_script.side_effect = lambda config, user: time.time_ns()
+        self.execution_service.start_script.side_effect = lambda config, user, priority: time.time_ns()
 
         self.schedule_service = ScheduleService(self.config_service, self.execution_service, test_utils.temp_folder)
 
@@ -422,6 +423,7 @@ class TestScheduleServiceExecuteJob(ScheduleServiceTestCase):
     def verify_start_script_call(self, expected_values, expected_user):
         start_args = self.execution_service.start_script.call_args[0]
         self.assertEqual(expected_user, start_args[1])
+        self.assertEqual(PRIORITY_SCHEDULED, start_args[2])
         actual_values = {name: value.mapped_script_value for name, value in start_args[0].parameter_values.items()}
         self.assertEqual(expected_values, actual_values)
 
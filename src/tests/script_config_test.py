@@ -1,4 +1,5 @@
 import os
+import time
 import unittest
 from collections import OrderedDict
 
@@ -12,7 +13,7 @@ from model.value_wrapper import ScriptValueWrapper
 from react.properties import ObservableDict, ObservableList
 from tests import test_utils
 from tests.test_utils import create_script_param_config, create_parameter_model, create_files, wrap_values
-from utils import file_utils, custom_json
+from utils import file_utils, custom_json, process_utils
 from utils.process_utils import ExecutionException
 
 DEF_AUDIT_NAME = '127.0.0.1'
@@ -120,9 +121,51 @@ class ConfigModelInitTest(unittest.TestCase):
         self.assertRaisesRegex(InvalidConfigException, 'Invalid output format', _create_config_model, name, config={
             'output_format': 'abc'})
 
+    @parameterized.expand([
+        (None, None),
+        ([], []),
+        ('linux', ['linux']),
+        (['linux', 'gpu'], ['linux', 'gpu']),
+    ])
+    def test_create_with_agent_labels(self, agent_labels, expected_labels):
+        config = {'agent_labels': agent_labels} if agent_labels is not None else {}
+
+        config_model = _create_config_model('conf_y', config=config)
+
+        self.assertEqual(expected_labels, config_model.agent_labels)
+
 
 class ConfigModelValuesTest(unittest.TestCase):
 
+    def test_independent_script_parameters_loaded_concurrently(self):
+        parameters = [create_script_param_config('p' + str(i),
+                                                 type='list',
+                                                 values_script='sleep 0.5; echo v' + str(i),
+                                                 values_script_shell=True)
+                      for i in range(4)]
+
+        start_time = time.time()
+        config_model = _create_config_model('conf_x', parameters=parameters)
+        duration = time.time() - start_time
+
+        self.assertEqual(['p0', 'p1', 'p2', 'p3'], [p.name for p in config_model.parameters])
+        self.assertEqual([['v0'], ['v1'], ['v2'], ['v3']], [p.values for p in config_model.parameters])
+        self.assertLess(duration, 1.5)
+
+    def test_dependant_and_independent_script_parameters(self):
+        parameters = [
+            create_script_param_config('p1', type='list', values_script='echo a', default='a'),
+            create_script_param_config('dependant', type='list', values_script='echo "X${p1}X"'),
+            create_script_param_config('p2', default={'script': 'echo b'}),
+            create_script_param_config('user_p', type='list', values_script='echo ${auth.username}')]
+
+        config_model = _create_config_model('conf_x', parameters=parameters)
+
+        self.assertEqual(['p1', 'dependant', 'p2', 'user_p'], [p.name for p in config_model.parameters])
+        self.assertEqual(['XaX'], config_model.find_parameter('dependant').values)
+        self.assertEqual('b', config_model.parameter_values['p2'].user_value)
+        self.assertEqual([DEF_USERNAME], config_model.find_parameter('user_p').values)
+
     def test_set_value(self):
         param1 = create_script_param_config('param1')
         config_model = _create_config_model('conf_x', parameters=[param1])
@@ -398,6 +441,39 @@ class ParameterModelDependantValuesTest(unittest.TestCase):
 
         self.assertCountEqual(['p1', 'p2'], dependant_parameter.get_required_parameters())
 
+    def test_get_parameter_values_when_cancelled(self):
+        parameters = [
+            create_script_param_config('p1'),
+            create_script_param_config('dependant', type='list', values_script='echo "${p1}"')
+        ]
+        config_model = _create_config_model('conf_x', parameters=parameters)
+        dependant_parameter = config_model.find_parameter('dependant')
+        config_model.set_param_value('p1', 'abc')
+
+        token = process_utils.CancellationToken()
+        token.cancel()
+        with process_utils.cancellable_invocations(token):
+            config_model.set_param_value('p1', 'def')
+
+        self.assertEqual(['abc'], dependant_parameter.values)
+
+    def test_reload_dependant_values(self):
+        parameters = [
+            create_script_param_config('p1'),
+            create_script_param_config('dependant', type='list', values_script='echo "${p1}"')
+        ]
+        config_model = _create_config_model('conf_x', parameters=parameters)
+        dependant_parameter = config_model.find_parameter('dependant')
+
+        token = process_utils.CancellationToken()
+        token.cancel()
+        with process_utils.cancellable_invocations(token):
+            config_model.set_param_value('p1', 'def')
+
+        config_model.reload_dependant_values({'p1'})
+
+        self.assertEqual(['def'], dependant_parameter.values)
+
 
 class ConfigModelIncludeTest(unittest.TestCase):
     def test_static_include_simple(self):
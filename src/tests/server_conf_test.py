@@ -215,6 +215,123 @@ class TestMaxRequestSize(unittest.TestCase):
         self.assertEqual(10, config.max_request_size_mb)
 
 
+class TestMaxOutputMemory(unittest.TestCase):
+    def test_int_value(self):
+        config = _from_json({'max_output_memory': 50})
+        self.assertEqual(50, config.max_output_memory_mb)
+
+    def test_default_value(self):
+        config = _from_json({})
+        self.assertEqual(10, config.max_output_memory_mb)
+
+
+class TestHandlerWorkers(unittest.TestCase):
+    def test_int_value(self):
+        config = _from_json({'handler_workers': 20})
+        self.assertEqual(20, config.handler_workers)
+
+    def test_default_value(self):
+        config = _from_json({})
+        self.assertEqual(8, config.handler_workers)
+
+
+class TestServerWorkers(unittest.TestCase):
+    def test_int_value(self):
+        config = _from_json({'server_workers': 4})
+        self.assertEqual(4, config.server_workers)
+
+    def test_default_value(self):
+        config = _from_json({})
+        self.assertEqual(1, config.server_workers)
+
+    def test_read_process_settings(self):
+        conf_path = _write_json({'server_workers': 3, 'secret_storage_file': 'my_secret.dat'})
+
+        settings = server_conf.read_process_settings(conf_path, test_utils.temp_folder)
+        self.assertEqual((3, 'my_secret.dat'), (settings.server_workers, settings.secret_storage_file))
+
+    def test_read_process_settings_defaults(self):
+        conf_path = _write_json({'auth': {'type': 'unknown'}})
+
+        settings = server_conf.read_process_settings(conf_path, test_utils.temp_folder)
+        self.assertEqual((1, os.path.join(test_utils.temp_folder, 'secret.dat')),
+                         (settings.server_workers, settings.secret_storage_file))
+
+
+class TestScriptValuesCache(unittest.TestCase):
+    def test_full_config(self):
+        config = _from_json({'script_values_cache': {'ttl': 60, 'stale_ttl': '300', 'max_entries': 50}})
+
+        cache_config = config.script_values_cache_config
+        self.assertEqual((60, 300, 50), (cache_config.ttl_sec, cache_config.stale_ttl_sec, cache_config.max_entries))
+
+    def test_default_values(self):
+        config = _from_json({})
+
+        cache_config = config.script_values_cache_config
+        self.assertEqual((0, 0, 1000), (cache_config.ttl_sec, cache_config.stale_ttl_sec, cache_config.max_entries))
+
+
+class TestExecutionLimits(unittest.TestCase):
+    def test_full_config(self):
+        config = _from_json({'execution_limits': {'max_concurrent': 5, 'max_concurrent_per_user': '2', 'workers': 3}})
+
+        limits_config = config.execution_limits_config
+        self.assertEqual((5, 2, 3), (limits_config.max_concurrent,
+                                     limits_config.max_concurrent_per_user,
+                                     limits_config.workers))
+
+    def test_default_values(self):
+        config = _from_json({})
+
+        limits_config = config.execution_limits_config
+        self.assertEqual((None, None, None), (limits_config.max_concurrent,
+                                              limits_config.max_concurrent_per_user,
+                                              limits_config.workers))
+
+
+class TestExecutionAgents(unittest.TestCase):
+    def test_full_config(self):
+        config = _from_json({'execution_agents': [
+            {'name': 'gpu-box', 'host': '10.0.0.5', 'port': 6000, 'capacity': 3, 'labels': ['gpu'], 'token': 'abc'}
+        ]})
+
+        self.assertEqual(1, len(config.execution_agents))
+        agent = config.execution_agents[0]
+        self.assertEqual(('gpu-box', '10.0.0.5', 6000, 3, ['gpu'], 'abc'),
+                         (agent.name, agent.host, agent.port, agent.capacity, agent.labels, agent.token))
+
+    def test_default_values(self):
+        config = _from_json({'execution_agents': [{'host': 'box1'}]})
+
+        agent = config.execution_agents[0]
+        self.assertEqual(('box1:5100', 'box1', 5100, 1, [], None),
+                         (agent.name, agent.host, agent.port, agent.capacity, agent.labels, agent.token))
+
+    def test_no_agents(self):
+        config = _from_json({})
+
+        self.assertEqual([], config.execution_agents)
+
+    def test_token_from_env_variable(self):
+        test_utils.set_os_environ_value('MY_AGENT_TOKEN', 'qwerty')
+
+        config = _from_json({'execution_agents': [{'host': 'box1', 'token': '$$MY_AGENT_TOKEN'}]})
+
+        self.assertEqual('qwerty', config.execution_agents[0].token)
+        self.assertNotIn('MY_AGENT_TOKEN', config.env_vars.build_env_vars())
+
+    def test_missing_host(self):
+        self.assertRaisesRegex(Exception, '"host" is required', _from_json, {'execution_agents': [{'port': 5100}]})
+
+    def test_invalid_capacity(self):
+        self.assertRaisesRegex(Exception, 'should be positive',
+                               _from_json, {'execution_agents': [{'host': 'box1', 'capacity': 0}]})
+
+    def tearDown(self):
+        test_utils.cleanup()
+
+
 class TestSimpleConfigs(unittest.TestCase):
     def test_server_title(self):
         config = _from_json({'title': 'my server'})
@@ -439,7 +556,12 @@ class TestEnvVariables(unittest.TestCase):
 
 
 def _from_json(content):
+    conf_path = _write_json(content)
+    return server_conf.from_json(conf_path, test_utils.temp_folder)
+
+
+def _write_json(content):
     json_obj = json.dumps(content)
     conf_path = os.path.join(test_utils.temp_folder, 'conf.json')
     file_utils.write_file(conf_path, json_obj)
-    return server_conf.from_json(conf_path, test_utils.temp_folder)
+    return conf_path
@@ -571,6 +571,7 @@ class _MockProcessWrapper(ProcessWrapper):
         self.finished = False
         self.process_id = int.from_bytes(uuid.uuid1().bytes, byteorder='big')
         self.finish_condition = threading.Condition()
+        self.notify_finish_thread = None
 
     def get_process_id(self):
         return self.process_id
@@ -612,6 +613,10 @@ class _MockProcessWrapper(ProcessWrapper):
     def pipe_process_output(self):
         pass
 
+    def watch_finish(self):
+        self.notify_finish_thread = threading.Thread(target=self.notify_finished)
+        self.notify_finish_thread.start()
+
     def start_execution(self, command, working_directory):
         pass
 
@@ -628,7 +633,10 @@ class AnyUserAuthorizer:
     def is_allowed_in_app(self, user_id):
         return True
 
-    def is_allowed(self, user_id, allowed_users):
+    def get_groups(self, user_id):
+        return []
+
+    def is_allowed(self, user_id, allowed_users, user_groups=None):
         return True
 
     def is_admin(self, user_id):
@@ -0,0 +1,29 @@
+import unittest
+
+from parameterized import parameterized
+
+from utils.encoding_utils import Utf8MixedIncrementalDecoder
+
+
+class TestUtf8MixedIncrementalDecoder(unittest.TestCase):
+    @parameterized.expand([(1,), (2,), (3,), (5,)])
+    def test_split_multibyte_characters(self, chunk_size):
+        data = 'aΩΨΔ ࠀ 𒀀!'.encode('utf-8')
+
+        decoder = Utf8MixedIncrementalDecoder()
+        chunks = [decoder.decode(data[i:i + chunk_size]) for i in range(0, len(data), chunk_size)]
+        chunks.append(decoder.decode(b'', final=True))
+
+        self.assertEqual('aΩΨΔ ࠀ 𒀀!', ''.join(chunks))
+
+    def test_mixed_encoding(self):
+        decoder = Utf8MixedIncrementalDecoder()
+        text = decoder.decode(b'g\xc3\xbcltig \xc4') + decoder.decode(b'ndern', final=True)
+
+        self.assertEqual('gültig Ändern', text)
+
+    def test_incomplete_character_on_final(self):
+        decoder = Utf8MixedIncrementalDecoder()
+        text = decoder.decode(b'abc\xe0\xa0') + decoder.decode(b'', final=True)
+
+        self.assertEqual('abcà\xa0', text)
@@ -0,0 +1,121 @@
+import os
+import threading
+import unittest
+
+from react import event_loop
+from tests import test_utils
+from utils import file_watcher, os_utils, file_utils
+
+
+class _CallbackCounter:
+    def __init__(self):
+        self.count = 0
+        self._event = threading.Event()
+
+    def __call__(self):
+        self.count += 1
+        self._event.set()
+
+    def wait(self, timeout=2):
+        result = self._event.wait(timeout)
+        self._event.clear()
+        return result
+
+
+@unittest.skipUnless(os_utils.is_linux(), 'inotify is available on linux only')
+class TestInotifyWatcher(unittest.TestCase):
+    def test_file_created(self):
+        self.watch()
+
+        test_utils.create_file('some.json', text='{}')
+
+        self.assertTrue(self.callback.wait())
+
+    def test_file_modified(self):
+        path = test_utils.create_file('some.json', text='{}')
+        self.watch()
+
+        file_utils.write_file(path, '{"name": "x"}')
+
+        self.assertTrue(self.callback.wait())
+
+    def test_file_deleted(self):
+        path = test_utils.create_file('some.json', text='{}')
+        self.watch()
+
+        os.remove(path)
+
+        self.assertTrue(self.callback.wait())
+
+    def test_file_in_new_subfolder(self):
+        self.watch()
+
+        subfolder = os.path.join(test_utils.temp_folder, 'sub')
+        os.makedirs(subfolder)
+        self.assertTrue(self.callback.wait())
+
+        test_utils.create_file(os.path.join('sub', 'some.json'), text='{}')
+        self.assertTrue(self.callback.wait())
+
+    def test_multiple_changes_reported_once(self):
+        self.watch()
+
+        for i in range(5):
+            test_utils.create_file('file' + str(i) + '.json', text='{}')
+
+        self.assertTrue(self.callback.wait())
+        self.assertFalse(self.callback.wait(0.3))
+        self.assertEqual(1, self.callback.count)
+
+    def test_no_changes(self):
+        self.watch()
+
+        self.assertFalse(self.callback.wait(0.3))
+
+    def test_stopped(self):
+        self.watch()
+        self.watcher.stop()
+
+        test_utils.create_file('some.json', text='{}')
+
+        self.assertFalse(self.callback.wait(0.3))
+
+    def watch(self):
+        self.watcher = file_watcher.watch_folder(test_utils.temp_folder, self.callback)
+        self.assertTrue(self.watcher.precise)
+
+    def setUp(self):
+        test_utils.setup()
+
+        self.callback = _CallbackCounter()
+        self.watcher = None
+
+    def tearDown(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+
+        test_utils.cleanup()
+
+
+class TestPollingWatcher(unittest.TestCase):
+    def test_called_periodically(self):
+        self.watcher = file_watcher._PollingWatcher(
+            self.callback, 0.05, event_loop.get_shared_loop())
+
+        self.assertTrue(self.callback.wait())
+        self.assertTrue(self.callback.wait())
+
+    def test_stopped(self):
+        self.watcher = file_watcher._PollingWatcher(
+            self.callback, 0.05, event_loop.get_shared_loop())
+        self.watcher.stop()
+
+        self.assertFalse(self.callback.wait(0.2))
+
+    def setUp(self):
+        self.callback = _CallbackCounter()
+        self.watcher = None
+
+    def tearDown(self):
+        if self.watcher is not None:
+            self.watcher.stop()
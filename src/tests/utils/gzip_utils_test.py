@@ -0,0 +1,75 @@
+import gzip
+import os
+import unittest
+
+from parameterized import parameterized
+
+from tests import test_utils
+from utils import gzip_utils, file_utils
+from utils.gzip_utils import BlockedGzipReader, InvalidBlockedGzipException
+
+
+class TestBlockedGzip(unittest.TestCase):
+    def test_compressed_file_readable_by_gzip(self):
+        content = self._compress(b'some text\n' * 100, block_size=64)
+
+        with gzip.open(self.target_path, 'rb') as f:
+            self.assertEqual(content, f.read())
+
+    def test_read_all(self):
+        content = self._compress(b'some text\n' * 100, block_size=64)
+
+        with BlockedGzipReader(self.target_path) as reader:
+            self.assertEqual(len(content), reader.size())
+            self.assertEqual(content, reader.read(0, reader.size()))
+
+    @parameterized.expand([
+        (0, 10),
+        (60, 10),
+        (64, 64),
+        (100, 500),
+        (990, 100),
+        (2000, 10),
+    ])
+    def test_read_range(self, position, size):
+        content = self._compress(bytes(range(100)) * 10, block_size=64)
+
+        with BlockedGzipReader(self.target_path) as reader:
+            self.assertEqual(content[position:position + size], reader.read(position, size))
+
+    def test_empty_file(self):
+        self._compress(b'')
+
+        with BlockedGzipReader(self.target_path) as reader:
+            self.assertEqual(0, reader.size())
+            self.assertEqual(b'', reader.read(0, 10))
+
+        with gzip.open(self.target_path, 'rb') as f:
+            self.assertEqual(b'', f.read())
+
+    def test_content_multiple_of_block_size(self):
+        content = self._compress(b'x' * 128, block_size=64)
+
+        with BlockedGzipReader(self.target_path) as reader:
+            self.assertEqual(content, reader.read(0, 1000))
+
+    def test_not_blocked_gzip_file(self):
+        with gzip.open(self.target_path, 'wb') as f:
+            f.write(b'some text')
+
+        with BlockedGzipReader(self.target_path) as reader:
+            self.assertRaises(InvalidBlockedGzipException, reader.size)
+
+    def _compress(self, content, block_size=gzip_utils.DEFAULT_BLOCK_SIZE):
+        file_utils.write_file(self.source_path, content, byte_content=True)
+        gzip_utils.compress_file(self.source_path, self.target_path, block_size=block_size)
+        return content
+
+    def setUp(self):
+        test_utils.setup()
+
+        self.source_path = os.path.join(test_utils.temp_folder, 'source.txt')
+        self.target_path = os.path.join(test_utils.temp_folder, 'target.txt.gz')
+
+    def tearDown(self):
+        test_utils.cleanup()
@@ -0,0 +1,55 @@
+import time
+
+from tornado import testing, gen
+
+from web.ioloop_lag_monitor import IOLoopLagMonitor
+
+
+class IOLoopLagMonitorTest(testing.AsyncTestCase):
+    @testing.gen_test
+    def test_no_lag(self):
+        self.monitor.start(self.io_loop)
+
+        yield gen.sleep(0.1)
+
+        stats = self.monitor.get_stats()
+        self.assertGreater(stats.samples, 3)
+        self.assertLess(stats.max_ms, 50)
+
+    @testing.gen_test
+    def test_blocked_loop(self):
+        self.monitor.start(self.io_loop)
+
+        yield gen.sleep(0.03)
+        time.sleep(0.2)
+        yield gen.sleep(0.03)
+
+        stats = self.monitor.get_stats()
+        self.assertGreaterEqual(stats.max_ms, 150)
+        self.assertLess(stats.average_ms, stats.max_ms)
+
+    def test_stats_when_not_started(self):
+        stats = self.monitor.get_stats()
+
+        self.assertEqual((0.0, 0.0, 0.0, 0), tuple(stats))
+
+    @testing.gen_test
+    def test_stop(self):
+        self.monitor.start(self.io_loop)
+        yield gen.sleep(0.05)
+
+        self.monitor.stop()
+        samples = self.monitor.get_stats().samples
+
+        yield gen.sleep(0.05)
+        self.assertEqual(samples, self.monitor.get_stats().samples)
+
+    def setUp(self):
+        super().setUp()
+
+        self.monitor = IOLoopLagMonitor(interval_sec=0.01)
+
+    def tearDown(self):
+        self.monitor.stop()
+
+        super().tearDown()
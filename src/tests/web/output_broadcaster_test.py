@@ -0,0 +1,245 @@
+import json
+from unittest.mock import patch
+
+from tornado import testing, gen
+from tornado.concurrent import Future
+
+from react.observable import ReplayObservable
+from web.output_broadcaster import OutputBroadcasters, WebSocketWriter
+
+
+class _WebSocketMock:
+    def __init__(self, auto_flush=True):
+        self.ws_connection = object()
+        self.messages = []
+        self.close_code = None
+        self.close_reason = None
+        self.auto_flush = auto_flush
+        self.pending_futures = []
+
+    def write_message(self, message):
+        self.messages.append(message)
+
+        future = Future()
+        if self.auto_flush:
+            future.set_result(None)
+        else:
+            self.pending_futures.append(future)
+        return future
+
+    def close(self, code=None, reason=None):
+        self.close_code = code
+        self.close_reason = reason
+
+    def flush_pending(self):
+        futures = self.pending_futures
+        self.pending_futures = []
+        for future in futures:
+            future.set_result(None)
+
+    def get_output(self):
+        events = [json.loads(message) for message in self.messages]
+        return [event['data'] for event in events if event['event'] == 'output']
+
+
+class OutputBroadcasterTest(testing.AsyncTestCase):
+    @testing.gen_test
+    def test_replay_and_live_output(self):
+        self.output_stream.push('hello')
+        websocket = self.attach('123')
+
+        yield gen.sleep(0.01)
+        self.output_stream.push(' world')
+        yield gen.sleep(0.01)
+
+        self.assertEqual(['hello', ' world'], websocket.get_output())
+
+    @testing.gen_test
+    def test_encode_once_for_all_viewers(self):
+        with patch('web.output_broadcaster.wrap_to_server_event',
+                   side_effect=lambda event_type, data: json.dumps({'event': event_type, 'data': data})) as wrap_mock:
+            websockets = [self.attach('123') for _ in range(5)]
+
+            self.output_stream.push('abc')
+            self.output_stream.push('def')
+            yield gen.sleep(0.01)
+
+        self.assertEqual(2, wrap_mock.call_count)
+        for websocket in websockets:
+            self.assertEqual(['abc', 'def'], websocket.get_output())
+
+    @testing.gen_test
+    def test_encoded_output(self):
+        self.broadcasters = OutputBroadcasters(encoded=True)
+        websocket = self.attach('123')
+
+        self.output_stream.push(json.dumps({'event': 'output', 'data': 'abc'}))
+        yield gen.sleep(0.01)
+
+        self.assertEqual(['{"event": "output", "data": "abc"}'], websocket.messages)
+
+    @testing.gen_test
+    def test_coalesce_writes(self):
+        websocket = self.attach('123')
+        writer = self.writers[-1]
+
+        with patch.object(writer, '_flush', wraps=writer._flush) as flush_mock:
+            for i in range(10):
+                self.output_stream.push(str(i))
+            yield gen.sleep(0.01)
+
+        # one flush for the batch and one after it's sent
+        self.assertEqual(2, flush_mock.call_count)
+        self.assertEqual([str(i) for i in range(10)], websocket.get_output())
+
+    @testing.gen_test
+    def test_pause_slow_client(self):
+        slow_websocket = self.attach('123', auto_flush=False)
+        fast_websocket = self.attach('123')
+
+        self.output_stream.push('a')
+        yield gen.sleep(0.01)
+        self.output_stream.push('b')
+        self.output_stream.push('c')
+        yield gen.sleep(0.01)
+
+        self.assertEqual(['a'], slow_websocket.get_output())
+        self.assertEqual(['a', 'b', 'c'], fast_websocket.get_output())
+
+        slow_websocket.flush_pending()
+        yield gen.sleep(0.01)
+
+        self.assertEqual(['a', 'b', 'c'], slow_websocket.get_output())
+
+    @testing.gen_test
+    def test_close_when_flushed(self):
+        websocket = self.attach('123', auto_flush=False)
+
+        self.output_stream.push('a')
+        yield gen.sleep(0.01)
+        self.output_stream.push('b')
+        self.writers[-1].close_when_flushed(1000)
+        yield gen.sleep(0.01)
+
+        self.assertIsNone(websocket.close_code)
+
+        websocket.flush_pending()
+        yield gen.sleep(0.01)
+        websocket.flush_pending()
+        yield gen.sleep(0.01)
+
+        self.assertEqual(['a', 'b'], websocket.get_output())
+        self.assertEqual(1000, websocket.close_code)
+
+    @testing.gen_test
+    def test_direct_messages(self):
+        websocket = self.attach('123')
+
+        self.output_stream.push('a')
+        self.writers[-1].write(json.dumps({'event': 'file', 'data': 'x.txt'}))
+        yield gen.sleep(0.01)
+
+        self.assertEqual(['output', 'file'], [json.loads(message)['event'] for message in websocket.messages])
+
+    @testing.gen_test
+    def test_release_read_events_over_memory_limit(self):
+        self.broadcasters = OutputBroadcasters(memory_limit=100)
+        websocket1 = self.attach('123')
+
+        for i in range(10):
+            self.output_stream.push('x' * 20)
+            yield gen.sleep(0.01)
+
+        broadcaster = self.writers[-1].broadcaster
+        self.assertLess(len(broadcaster._events), 10)
+
+        websocket2 = self.attach('123')
+        yield gen.sleep(0.01)
+
+        self.assertIsNot(broadcaster, self.writers[-1].broadcaster)
+        self.assertEqual(['x' * 20] * 10, websocket1.get_output())
+        self.assertEqual(['x' * 20] * 10, websocket2.get_output())
+
+    @testing.gen_test
+    def test_detach_never_draining_client(self):
+        self.broadcasters = OutputBroadcasters(memory_limit=100)
+        stalled_websocket = self.attach('123', auto_flush=False)
+        fast_websocket = self.attach('123')
+        broadcaster = self.writers[0].broadcaster
+
+        for i in range(20):
+            self.output_stream.push('x' * 20)
+            yield gen.sleep(0.01)
+
+            self.assertLessEqual(broadcaster._size, 100 + len(json.dumps({'event': 'output', 'data': 'x' * 20})))
+
+        self.assertEqual(1013, stalled_websocket.close_code)
+        self.assertEqual(['x' * 20], stalled_websocket.get_output())
+        self.assertEqual(['x' * 20] * 20, fast_websocket.get_output())
+        self.assertEqual([self.writers[1]], broadcaster._writers)
+
+    @testing.gen_test
+    def test_detach_last_never_draining_client(self):
+        self.broadcasters = OutputBroadcasters(memory_limit=100)
+        websocket = self.attach('123', auto_flush=False)
+        broadcaster = self.writers[0].broadcaster
+
+        for i in range(20):
+            self.output_stream.push('x' * 20)
+            yield gen.sleep(0.01)
+
+        self.assertEqual(1013, websocket.close_code)
+        self.assertEqual([], broadcaster._events)
+
+        self.broadcasters.detach(self.writers[0])
+        self.assertEqual({}, self.broadcasters._broadcasters)
+        self.assertEqual([], self.output_stream.observers)
+
+    @testing.gen_test
+    def test_keep_not_paused_client_over_memory_limit(self):
+        self.broadcasters = OutputBroadcasters(memory_limit=100)
+        for i in range(10):
+            self.output_stream.push('x' * 20)
+
+        websocket = self.attach('123')
+        yield gen.sleep(0.01)
+
+        self.assertIsNone(websocket.close_code)
+        self.assertEqual(['x' * 20] * 10, websocket.get_output())
+
+    @testing.gen_test
+    def test_detach_last_writer(self):
+        self.attach('123')
+        yield gen.sleep(0.01)
+
+        self.broadcasters.detach(self.writers[-1])
+
+        self.assertEqual({}, self.broadcasters._broadcasters)
+        self.assertEqual([], self.output_stream.observers)
+
+    @testing.gen_test
+    def test_detach_not_last_writer(self):
+        self.attach('123')
+        websocket2 = self.attach('123')
+        yield gen.sleep(0.01)
+
+        self.broadcasters.detach(self.writers[0])
+        self.output_stream.push('abc')
+        yield gen.sleep(0.01)
+
+        self.assertEqual(['abc'], websocket2.get_output())
+
+    def attach(self, execution_id, auto_flush=True):
+        websocket = _WebSocketMock(auto_flush)
+        writer = WebSocketWriter(websocket, self.io_loop)
+        self.writers.append(writer)
+
+        self.broadcasters.attach(execution_id, self.output_stream, writer)
+        return websocket
+
+    def setUp(self):
+        super().setUp()
+
+        self.output_stream = ReplayObservable()
+        self.broadcasters = OutputBroadcasters()
+        self.writers = []
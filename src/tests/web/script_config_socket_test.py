@@ -1,5 +1,6 @@
 import json
 import os
+import time
 from urllib.parse import quote
 
 import tornado.concurrent
@@ -7,7 +8,7 @@ import tornado.escape
 import tornado.ioloop
 import tornado.web
 import tornado.websocket
-from tornado import testing, httpserver
+from tornado import testing, httpserver, gen
 
 from auth.authorization import Authorizer, ANY_USER, EmptyGroupProvider
 from auth.identification import IpBasedIdentification
@@ -64,7 +65,9 @@ class ScriptConfigSocketTest(testing.AsyncTestCase):
                           external_model_id='abcd')
 
     @testing.gen_test
-    def test_client_version(self):
+    def test_reload_model_when_config_changed(self):
+        self.config_service.start_watching()
+
         self.socket = yield self._connect('Test script 1')
 
         message1 = yield self.socket.read_message()
@@ -73,64 +76,127 @@ class ScriptConfigSocketTest(testing.AsyncTestCase):
         message2 = yield self.socket.read_message()
         self._assert_message_type(message2, 'preloadScript')
 
-        self.socket.write_message(json.dumps({
-            'event': 'parameterValue',
-            'data': {'parameter': 'file 1',
-                     'value': 'x',
-                     'clientStateVersion': 2}}))
+        self.script_config['description'] = 'some new description'
+        test_utils.write_script_config(self.script_config, 'test_script_1')
 
-        self.socket.write_message(json.dumps({
-            'event': 'parameterValue',
-            'data': {'parameter': 'text 1',
-                     'value': 'included',
-                     'clientStateVersion': 3}}))
+        response = yield self.socket.read_message()
+        self.assertIsNone(self.socket.close_reason)
 
-        self.socket.write_message(json.dumps({
-            'event': 'parameterValue',
-            'data': {'parameter': 'file 1',
-                     'value': 'z',
-                     'clientStateVersion': 4}}))
+        self._assert_message_type(response, 'reloadedConfig')
+        self.assertEqual('some new description', json.loads(response)['data']['description'])
 
-        self.socket.write_message(json.dumps({
-            'event': 'parameterValue',
-            'data': {'parameter': 'file 1',
-                     'value': 'z',
-                     'clientStateVersion': 5}}))
+    @testing.gen_test
+    def test_client_version(self):
+        self.socket = yield self._connect('Test script 1')
 
-        self.socket.write_message(json.dumps({
-            'event': 'parameterValue',
-            'data': {'parameter': 'text 1',
-                     'value': 'inc',
-                     'clientStateVersion': 6}}))
+        message1 = yield self.socket.read_message()
+        self._assert_message_type(message1, 'initialConfig')
 
-        self.socket.write_message(json.dumps({
-            'event': 'reloadModelValues',
-            'data': {'clientModelId': 'abcd',
-                     'parameterValues': {'list 1': 'Value a', 'file 1': 'y', 'list 2': 'y1.txt'},
-                     'clientStateVersion': 7}}))
+        message2 = yield self.socket.read_message()
+        self._assert_message_type(message2, 'preloadScript')
 
+        self._send_parameter_value('file 1', 'x', 2)
         self._assert_parameter_change((yield self.socket.read_message()),
                                       _list2(['x1.txt', 'x2.txt', 'x3.txt']), 2)
         self._assert_version_beat((yield self.socket.read_message()), 2)
 
+        self._send_parameter_value('text 1', 'included', 3)
         self._assert_parameter_added((yield self.socket.read_message()), _included_text2(), 3)
         self._assert_version_beat((yield self.socket.read_message()), 3)
 
+        self._send_parameter_value('file 1', 'z', 4)
         self._assert_parameter_change((yield self.socket.read_message()),
                                       _list2(['z1.txt', 'z2.txt', 'z3.txt']), 4)
         self._assert_version_beat((yield self.socket.read_message()), 4)
 
+        self._send_parameter_value('file 1', 'z', 5)
         self._assert_version_beat((yield self.socket.read_message()), 5)
 
+        self._send_parameter_value('text 1', 'inc', 6)
         self._assert_parameter_removed((yield self.socket.read_message()), _included_text2()['name'], 6)
         self._assert_version_beat((yield self.socket.read_message()), 6)
 
+        self.socket.write_message(json.dumps({
+            'event': 'reloadModelValues',
+            'data': {'clientModelId': 'abcd',
+                     'parameterValues': {'list 1': 'Value a', 'file 1': 'y', 'list 2': 'y1.txt'},
+                     'clientStateVersion': 7}}))
+
         response3 = yield self.socket.read_message()
         self.assert_model(response3, 'reloadedConfig',
                           list2_values=['y1.txt', 'y2.txt', 'y3.txt'],
                           external_model_id='abcd',
                           client_version=7)
 
+    @testing.gen_test
+    def test_client_version_when_fast_changes(self):
+        self.socket = yield self._connect('Test script 1')
+
+        message1 = yield self.socket.read_message()
+        self._assert_message_type(message1, 'initialConfig')
+
+        message2 = yield self.socket.read_message()
+        self._assert_message_type(message2, 'preloadScript')
+
+        self._send_parameter_value('file 1', 'x', 2)
+        self._send_parameter_value('file 1', 'y', 3)
+        self._send_parameter_value('file 1', 'z', 4)
+
+        self._assert_parameter_change((yield self.socket.read_message()),
+                                      _list2(['z1.txt', 'z2.txt', 'z3.txt']), 4)
+        self._assert_version_beat((yield self.socket.read_message()), 4)
+
+    @testing.gen_test
+    def test_pending_values_discarded_on_reload(self):
+        self.socket = yield self._connect('Test script 1')
+
+        message1 = yield self.socket.read_message()
+        self._assert_message_type(message1, 'initialConfig')
+
+        message2 = yield self.socket.read_message()
+        self._assert_message_type(message2, 'preloadScript')
+
+        self._send_parameter_value('file 1', 'x', 2)
+        self.socket.write_message(json.dumps({
+            'event': 'reloadModelValues',
+            'data': {'clientModelId': 'abcd',
+                     'parameterValues': {'list 1': 'Value a', 'file 1': 'y', 'list 2': 'y1.txt'},
+                     'clientStateVersion': 3}}))
+
+        response = yield self.socket.read_message()
+        self.assert_model(response, 'reloadedConfig',
+                          list2_values=['y1.txt', 'y2.txt', 'y3.txt'],
+                          external_model_id='abcd',
+                          client_version=3)
+
+    @testing.gen_test(timeout=10)
+    def test_slow_values_script_cancelled_by_new_value(self):
+        self.script_config['parameters'][3] = test_utils.create_script_param_config(
+            'list 2', type='list', values_script='sleep ${file 1}; echo ${file 1}', values_script_shell=True)
+        self.script_config['parameters'][2] = test_utils.create_script_param_config('file 1')
+        test_utils.write_script_config(self.script_config, 'test_script_1')
+
+        self.socket = yield self._connect('Test script 1')
+
+        message1 = yield self.socket.read_message()
+        self._assert_message_type(message1, 'initialConfig')
+
+        message2 = yield self.socket.read_message()
+        self._assert_message_type(message2, 'preloadScript')
+
+        start_time = time.time()
+
+        self._send_parameter_value('file 1', '30', 2)
+        yield gen.sleep(0.5)
+        self._send_parameter_value('file 1', '0.1', 3)
+
+        event = json.loads((yield self.socket.read_message()))
+        self.assertEqual('parameterChanged', event['event'])
+        self.assertEqual((['0.1'], 3), (event['data']['values'], event['data']['clientStateVersion']))
+        self._assert_version_beat((yield self.socket.read_message()), 3)
+
+        self.assertLess(time.time() - start_time, 5)
+
     @testing.gen_test
     def test_preload_script(self):
         self.socket = yield self._connect('Test script 1')
@@ -210,6 +276,13 @@ class ScriptConfigSocketTest(testing.AsyncTestCase):
             {'data': {'clientStateVersion': client_version}, 'event': 'clientStateVersionAccepted'},
             event)
 
+    def _send_parameter_value(self, parameter, value, client_version):
+        self.socket.write_message(json.dumps({
+            'event': 'parameterValue',
+            'data': {'parameter': parameter,
+                     'value': value,
+                     'clientStateVersion': client_version}}))
+
     def _assert_message_type(self, message, expected_type):
         event = json.loads(message)
 
@@ -235,6 +308,7 @@ class ScriptConfigSocketTest(testing.AsyncTestCase):
         application.identification = IpBasedIdentification(TrustedIpValidator(['127.0.0.1']), None)
         application.config_service = ConfigService(
             application.authorizer, test_utils.temp_folder, True, test_utils.process_invoker)
+        self.config_service = application.config_service
 
         server = httpserver.HTTPServer(application)
         socket, self.port = testing.bind_unused_port()
@@ -248,27 +322,28 @@ class ScriptConfigSocketTest(testing.AsyncTestCase):
                 test_utils.create_file(os.path.join('test1_files', dir, filename))
 
         test1_files_path = os.path.join(test_utils.temp_folder, 'test1_files')
-        test_utils.write_script_config(
-            {'name': 'Test script 1',
-             'script_path': 'ls',
-             'include': '${text 1}.json',
-             'preload_script': {
-                 'script': 'echo 123'
-             },
-             'parameters': [
-                 test_utils.create_script_param_config('text 1', required=True),
-                 test_utils.create_script_param_config('list 1', type='list',
-                                                       allowed_values=['A', 'B', 'C'],
-                                                       values_ui_mapping={'A': 'Value a', 'C': 'Customer'},
-                                                       default='C'),
-                 test_utils.create_script_param_config('file 1', type='server_file',
-                                                       file_dir=test1_files_path,
-                                                       ui_separator_type='line',
-                                                       ui_separator_title='Some title'),
-                 test_utils.create_script_param_config('list 2', type='list',
-                                                       values_script='ls ${file 1}')
-             ]},
-            'test_script_1')
+        self.script_config = {
+            'name': 'Test script 1',
+            'script_path': 'ls',
+            'include': '${text 1}.json',
+            'preload_script': {
+                'script': 'echo 123'
+            },
+            'parameters': [
+                test_utils.create_script_param_config('text 1', required=True),
+                test_utils.create_script_param_config('list 1', type='list',
+                                                      allowed_values=['A', 'B', 'C'],
+                                                      values_ui_mapping={'A': 'Value a', 'C': 'Customer'},
+                                                      default='C'),
+                test_utils.create_script_param_config('file 1', type='server_file',
+                                                      file_dir=test1_files_path,
+                                                      ui_separator_type='line',
+                                                      ui_separator_title='Some title'),
+                test_utils.create_script_param_config('list 2', type='list',
+                                                      values_script='ls ${file 1}')
+            ]
+        }
+        test_utils.write_script_config(self.script_config, 'test_script_1')
 
         test_utils.write_script_config(
             {
@@ -282,6 +357,8 @@ class ScriptConfigSocketTest(testing.AsyncTestCase):
         if self.socket:
             self.socket.close()
 
+        self.config_service.stop_watching()
+
         super().tearDown()
         test_utils.cleanup()
 
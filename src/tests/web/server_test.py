@@ -14,9 +14,11 @@ from tornado.web import create_signed_value
 
 from auth.authorization import Authorizer, ANY_USER, EmptyGroupProvider
 from config.config_service import ConfigService
+from execution.execution_service import PRIORITY_INTERACTIVE
 from features.file_download_feature import FileDownloadFeature
 from features.file_upload_feature import FileUploadFeature
 from files.user_file_storage import UserFileStorage
+from model.script_output_cache import ScriptOutputCache
 from model.server_conf import ServerConfig, XSRF_PROTECTION_TOKEN, XSRF_PROTECTION_HEADER
 from tests import test_utils
 from tests.test_utils import MockAuthenticator
@@ -94,6 +96,162 @@ class ServerTest(TestCase):
             {'name': 's3', 'group': None, 'parsing_failed': False}],
             response['scripts'])
 
+    def test_get_scripts_not_modified(self):
+        self.start_server(12345, '127.0.0.1')
+
+        test_utils.write_script_config({'name': 's1'}, 's1', self.runners_folder)
+
+        response = self._user_session.get('http://127.0.0.1:12345/scripts')
+        etag = response.headers['Etag']
+
+        response = self._user_session.get('http://127.0.0.1:12345/scripts', headers={'If-None-Match': etag})
+        self.assertEqual(304, response.status_code)
+
+        test_utils.write_script_config({'name': 's2'}, 's2', self.runners_folder)
+
+        response = self._user_session.get('http://127.0.0.1:12345/scripts', headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response.headers['Etag'])
+        self.assertCountEqual(['s1', 's2'], [script['name'] for script in response.json()['scripts']])
+
+    def test_get_conf_not_modified(self):
+        self.start_server(12345, '127.0.0.1')
+
+        response = self._user_session.get('http://127.0.0.1:12345/conf')
+        etag = response.headers['Etag']
+
+        response = self._user_session.get('http://127.0.0.1:12345/conf', headers={'If-None-Match': etag})
+        self.assertEqual(304, response.status_code)
+
+    def test_get_history_not_modified(self):
+        self.start_server(12345, '127.0.0.1')
+
+        self.execution_logging_service.get_history_version.return_value = 5
+        self.execution_logging_service.get_history_entries.return_value = []
+        self.execution_service.get_running_executions.return_value = ['1']
+
+        url = 'http://127.0.0.1:12345/history/execution_log/short'
+        response = self._user_session.get(url)
+        self.assertEqual(200, response.status_code)
+        etag = response.headers['Etag']
+
+        response = self._user_session.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(1, self.execution_logging_service.get_history_entries.call_count)
+
+        response = self._user_session.get(url + '?limit=10', headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+
+        self.execution_service.get_running_executions.return_value = []
+        response = self._user_session.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+
+        self.execution_service.get_running_executions.return_value = ['1']
+        self.execution_logging_service.get_history_version.return_value = 6
+        response = self._user_session.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+
+    def test_history_etag_changes_after_restart(self):
+        self.start_server(12345, '127.0.0.1')
+
+        self.execution_logging_service.get_history_version.return_value = 5
+        self.execution_logging_service.get_history_entries.return_value = []
+        self.execution_service.get_running_executions.return_value = []
+
+        url = 'http://127.0.0.1:12345/history/execution_log/short'
+        etag = self._user_session.get(url).headers['Etag']
+
+        with patch('web.server._STARTUP_NONCE', 'another_start'):
+            response = self._user_session.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+
+    def test_get_executing_script_config_not_modified(self):
+        self.start_server(12345, '127.0.0.1')
+
+        config = MagicMock()
+        config.name = 'my script'
+        config.parameters = []
+        self.execution_service.get_config.return_value = config
+        self.execution_service.get_user_parameter_values.return_value = {'p1': 'abc'}
+
+        url = 'http://127.0.0.1:12345/executions/config/123'
+        response = self._user_session.get(url)
+        self.assertEqual({'scriptName': 'my script', 'parameterValues': {'p1': 'abc'}}, response.json())
+        etag = response.headers['Etag']
+
+        response = self._user_session.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(304, response.status_code)
+
+        response = self._user_session.get('http://127.0.0.1:12345/executions/config/456',
+                                          headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+
+        with patch('web.server._STARTUP_NONCE', 'another_start'):
+            response = self._user_session.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+
+    def test_get_execution_status_when_queued(self):
+        self.start_server(12345, '127.0.0.1')
+
+        self.execution_service.get_queue_position.return_value = 2
+
+        response = self._user_session.get('http://127.0.0.1:12345/executions/status/123')
+        self.assertEqual('queued', response.text)
+
+        response = self._user_session.get('http://127.0.0.1:12345/executions/status/123?details=true')
+        self.assertEqual({'status': 'queued', 'queuePosition': 2}, response.json())
+
+    def test_get_execution_status_when_running(self):
+        self.start_server(12345, '127.0.0.1')
+
+        self.execution_service.get_queue_position.return_value = None
+        self.execution_service.is_running.return_value = True
+
+        response = self._user_session.get('http://127.0.0.1:12345/executions/status/123?details=true')
+        self.assertEqual({'status': 'running', 'queuePosition': None}, response.json())
+
+    def test_get_active_executions_with_details(self):
+        self.start_server(12345, '127.0.0.1')
+
+        self.execution_service.get_active_executions.return_value = ['1', '2']
+        self.execution_service.get_queue_position.side_effect = lambda execution_id, user: \
+            1 if execution_id == '2' else None
+
+        self.assertEqual(['1', '2'], self.request('get', 'http://127.0.0.1:12345/executions/active'))
+        self.assertEqual([{'id': '1', 'queuePosition': None}, {'id': '2', 'queuePosition': 1}],
+                         self.request('get', 'http://127.0.0.1:12345/executions/active?details=true'))
+
+    def test_get_history_entry_output(self):
+        self.start_server(12345, '127.0.0.1')
+
+        def read_log_range(log_range):
+            yield b'hello\n'
+            yield b'world'
+
+        log_range = MagicMock()
+        log_range.offset = 3
+        log_range.output_size = 14
+        self.execution_logging_service.find_log_range.return_value = log_range
+        self.execution_logging_service.read_log_range.side_effect = read_log_range
+
+        response = self._user_session.get('http://127.0.0.1:12345/history/execution_log/output/123?offset=3')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('hello\nworld', response.text)
+        self.assertEqual('3', response.headers['X-Output-Offset'])
+        self.assertEqual('14', response.headers['X-Output-Size'])
+        self.execution_logging_service.find_log_range.assert_called_once_with(
+            '123', offset=3, limit=None, tail_lines=None)
+
+    def test_get_history_entry_output_when_no_log(self):
+        self.start_server(12345, '127.0.0.1')
+
+        self.execution_logging_service.find_log_range.return_value = None
+
+        response = self._user_session.get('http://127.0.0.1:12345/history/execution_log/output/123')
+
+        self.assertEqual(404, response.status_code)
+
     @parameterized.expand([
         ('X-Forwarded-Proto',),
         ('X-Scheme',)])
@@ -152,6 +310,9 @@ class ServerTest(TestCase):
         self.assertEqual(start_response.status_code, 200)
         self.assertEqual(start_response.content, b'3')
 
+        start_args = self.execution_service.start_script.call_args[0]
+        self.assertEqual(PRIORITY_INTERACTIVE, start_args[2])
+
     def test_get_script_code(self):
         self.start_server(12345, '127.0.0.1')
 
@@ -166,6 +327,49 @@ class ServerTest(TestCase):
         self.assertEqual({'code': 'test text', 'file_path': os.path.abspath(script_path)},
                          response)
 
+    def test_get_script_config_by_admin(self):
+        self.start_server(12345, '127.0.0.1')
+
+        test_utils.write_script_config({'name': 's1', 'script_path': 'ls'}, 's1', self.runners_folder)
+
+        response = self.request('get', 'http://127.0.0.1:12345/admin/scripts/s1', self._admin_session)
+
+        self.assertEqual({'name': 's1', 'script_path': 'ls'}, response['config'])
+
+    def test_get_script_config_by_admin_when_missing(self):
+        self.start_server(12345, '127.0.0.1')
+
+        response = self._admin_session.get('http://127.0.0.1:12345/admin/scripts/s1')
+
+        self.assertEqual(404, response.status_code)
+
+    def test_get_admin_metrics(self):
+        self.start_server(12345, '127.0.0.1')
+
+        response = self.request('get', 'http://127.0.0.1:12345/admin/metrics', self._admin_session)
+
+        self.assertEqual({'currentMs', 'averageMs', 'maxMs', 'samples'}, set(response['ioloopLag'].keys()))
+        self.assertNotIn('scriptOutputCache', response)
+
+    def test_get_admin_metrics_with_script_output_cache(self):
+        script_output_cache = ScriptOutputCache(ttl_sec=60)
+        script_output_cache.invoke(test_utils.process_invoker, 'echo 1', shell=True)
+        script_output_cache.invoke(test_utils.process_invoker, 'echo 1', shell=True)
+
+        self.start_server(12345, '127.0.0.1', script_output_cache=script_output_cache)
+
+        response = self.request('get', 'http://127.0.0.1:12345/admin/metrics', self._admin_session)
+
+        self.assertEqual({'hits': 1, 'staleHits': 0, 'misses': 1, 'size': 1, 'hitRatio': 0.5},
+                         response['scriptOutputCache'])
+
+    def test_get_admin_metrics_when_not_admin(self):
+        self.start_server(12345, '127.0.0.1')
+
+        response = self._user_session.get('http://127.0.0.1:12345/admin/metrics')
+
+        self.assertEqual(403, response.status_code)
+
     def test_create_script_config(self):
         self.start_server(12345, '127.0.0.1')
 
@@ -272,7 +476,7 @@ class ServerTest(TestCase):
         response = self._user_session.get('http://127.0.0.1:12345/conf')
         self.assertEqual(response.status_code, 200)
 
-    def start_server(self, port, address, *, xsrf_protection=XSRF_PROTECTION_TOKEN):
+    def start_server(self, port, address, *, xsrf_protection=XSRF_PROTECTION_TOKEN, script_output_cache=None):
         file_download_feature = FileDownloadFeature(UserFileStorage(b'some_secret'), test_utils.temp_folder)
         config = ServerConfig()
         config.port = port
@@ -283,6 +487,8 @@ class ServerTest(TestCase):
         authorizer = Authorizer(ANY_USER, ['admin_user'], [], ['admin_user'], EmptyGroupProvider())
         execution_service = MagicMock()
         execution_service.start_script.return_value = 3
+        self.execution_service = execution_service
+        self.execution_logging_service = MagicMock()
 
         cookie_secret = b'cookie_secret'
 
@@ -294,8 +500,8 @@ class ServerTest(TestCase):
                     authorizer,
                     execution_service,
                     MagicMock(),
-                    MagicMock(),
-                    ConfigService(authorizer, self.conf_folder, True, test_utils.process_invoker),
+                    self.execution_logging_service,
+                    ConfigService(authorizer, self.conf_folder, True, test_utils.process_invoker, script_output_cache),
                     MagicMock(),
                     FileUploadFeature(UserFileStorage(cookie_secret), test_utils.temp_folder),
                     file_download_feature,
@@ -340,6 +546,8 @@ class ServerTest(TestCase):
                 socket.close()
             server._http_server._sockets.clear()
 
+        server._ioloop_lag_monitor.stop()
+
         self.kill_ioloop(io_loop)
 
         test_utils.cleanup()
@@ -0,0 +1,187 @@
+import json
+import os
+
+import tornado.httpserver
+import tornado.netutil
+import tornado.web
+import tornado.websocket
+from tornado import testing, gen
+
+from react.observable import ReplayObservable
+from tests import test_utils
+from web.output_broadcaster import OutputBroadcasters
+from web.shared_output import WorkerOutputSocket, WorkerExecutionSocketProxy, SharedOutputStreams, \
+    SHARED_OUTPUT_EVENT, is_shared_output_request
+from web.web_utils import wrap_to_server_event
+from web.worker_proxy import WorkerInfo
+
+
+class _ExecutionServiceMock:
+    def __init__(self):
+        self.output_streams = {}
+        self.finish_listeners = {}
+
+    def get_raw_output_stream(self, execution_id, user_id):
+        return self.output_streams.get(execution_id)
+
+    def get_owner(self, execution_id):
+        return 'user1'
+
+    def add_finish_listener(self, callback, execution_id):
+        if self.output_streams[execution_id].closed:
+            callback()
+            return
+
+        self.finish_listeners.setdefault(execution_id, []).append(callback)
+
+    def finish(self, execution_id):
+        self.output_streams[execution_id].close()
+
+        for listener in self.finish_listeners.get(execution_id, []):
+            listener()
+
+
+class _PrimaryExecutionSocket(tornado.websocket.WebSocketHandler):
+    def open(self, execution_id):
+        if not is_shared_output_request(self.request):
+            self.close(code=4001, reason='Output is not shared')
+            return
+
+        self.write_message(wrap_to_server_event(SHARED_OUTPUT_EVENT, execution_id))
+
+        io_loop = tornado.ioloop.IOLoop.current()
+        self.application.execution_service.add_finish_listener(
+            lambda: io_loop.add_callback(self._execution_finished), execution_id)
+
+    def _execution_finished(self):
+        self.write_message(wrap_to_server_event('file', 'result.txt'))
+        self.close(code=1000)
+
+
+class SharedOutputTest(testing.AsyncTestCase):
+    @testing.gen_test
+    def test_output_for_multiple_viewers(self):
+        self.output_stream.push('hello')
+
+        viewers = []
+        for i in range(3):
+            viewer = yield self.connect_viewer()
+            viewers.append(viewer)
+
+        for viewer in viewers:
+            message = yield viewer.read_message()
+            self.assertEqual({'event': 'output', 'data': 'hello'}, json.loads(message))
+
+        self.assertEqual(1, len(self.get_primary_output_writers()))
+
+    @testing.gen_test
+    def test_output_after_finish(self):
+        viewer = yield self.connect_viewer()
+
+        self.output_stream.push('abc')
+        self.output_stream.push('def')
+        yield gen.sleep(0.05)
+        self.execution_service.finish('123')
+
+        events = yield self.read_all(viewer)
+
+        self.assertEqual([('output', 'abc'), ('output', 'def')], [event for event in events if event[0] == 'output'])
+        self.assertIn(('file', 'result.txt'), events)
+        self.assertEqual(1000, viewer.close_code)
+
+    @testing.gen_test
+    def test_replay_finished_output(self):
+        self.output_stream.push('abc')
+        self.execution_service.finish('123')
+
+        viewer = yield self.connect_viewer()
+        events = yield self.read_all(viewer)
+
+        # output and other events are received via different connections
+        self.assertCountEqual([('output', 'abc'), ('file', 'result.txt')], events)
+        self.assertEqual(1000, viewer.close_code)
+
+    @testing.gen_test
+    def test_release_stream_after_last_viewer(self):
+        viewer1 = yield self.connect_viewer()
+        viewer2 = yield self.connect_viewer()
+        self.output_stream.push('abc')
+        yield gen.sleep(0.05)
+
+        viewer1.close()
+        yield gen.sleep(0.05)
+        self.assertEqual(['123'], list(self.shared_output_streams._streams.keys()))
+
+        viewer2.close()
+        yield gen.sleep(0.05)
+        self.assertEqual({}, self.shared_output_streams._streams)
+        self.assertEqual([], self.get_primary_output_writers())
+
+    @testing.gen_test
+    def test_output_socket_rejects_not_workers(self):
+        url = 'ws://127.0.0.1:' + str(self.primary_port) + '/workers/output/123'
+        socket = yield tornado.websocket.websocket_connect(url)
+
+        message = yield socket.read_message()
+
+        self.assertIsNone(message)
+        self.assertEqual(1008, socket.close_code)
+
+    def connect_viewer(self):
+        return tornado.websocket.websocket_connect(
+            'ws://127.0.0.1:' + str(self.secondary_port) + '/executions/io/123')
+
+    async def read_all(self, viewer):
+        events = []
+        while True:
+            message = await viewer.read_message()
+            if message is None:
+                return events
+
+            event = json.loads(message)
+            events.append((event['event'], event['data']))
+
+    def get_primary_output_writers(self):
+        broadcasters = self.primary_application.output_broadcasters._broadcasters
+        return [writer for broadcaster in broadcasters.values() for writer in broadcaster._writers]
+
+    def setUp(self):
+        super().setUp()
+        test_utils.setup()
+
+        sockets_folder = test_utils.create_dir('workers')
+
+        self.output_stream = ReplayObservable()
+        self.execution_service = _ExecutionServiceMock()
+        self.execution_service.output_streams['123'] = self.output_stream
+
+        self.primary_application = tornado.web.Application([
+            (r'/executions/io/(.*)', _PrimaryExecutionSocket),
+            (r'/workers/output/(.*)', WorkerOutputSocket)])
+        self.primary_application.worker = WorkerInfo(0, 2, sockets_folder)
+        self.primary_application.execution_service = self.execution_service
+        self.primary_application.output_broadcasters = OutputBroadcasters()
+
+        self.primary_server = tornado.httpserver.HTTPServer(self.primary_application)
+        self.primary_server.add_socket(tornado.netutil.bind_unix_socket(os.path.join(sockets_folder, 'worker-0.sock')))
+        (primary_socket, self.primary_port) = testing.bind_unused_port()
+        self.primary_server.add_socket(primary_socket)
+
+        secondary_worker = WorkerInfo(1, 2, sockets_folder)
+        self.shared_output_streams = SharedOutputStreams(secondary_worker)
+
+        secondary_application = tornado.web.Application([(r'/executions/io/(.*)', WorkerExecutionSocketProxy)])
+        secondary_application.worker = secondary_worker
+        secondary_application.shared_output_streams = self.shared_output_streams
+
+        self.secondary_server = tornado.httpserver.HTTPServer(secondary_application)
+        (secondary_socket, self.secondary_port) = testing.bind_unused_port()
+        self.secondary_server.add_socket(secondary_socket)
+
+    def tearDown(self):
+        self.secondary_server.stop()
+        self.primary_server.stop()
+
+        test_utils.cleanup()
+
+        super().tearDown()
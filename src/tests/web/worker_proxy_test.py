@@ -0,0 +1,267 @@
+import json
+import os
+import unittest
+from unittest.mock import patch
+
+import tornado.httpserver
+import tornado.netutil
+import tornado.web
+import tornado.websocket
+from tornado import testing, gen
+from tornado.concurrent import Future
+from tornado.httpclient import HTTPRequest
+
+from tests import test_utils
+from web.worker_proxy import WorkerInfo, WorkerProxyHandler, WorkerWebSocketProxy, tag_local_id, \
+    find_owner_index
+from web.xheader_app_wrapper import autoapply_xheaders
+
+
+class _EchoHandler(tornado.web.RequestHandler):
+    def get(self, *args):
+        self._echo()
+
+    def post(self, *args):
+        self._echo()
+
+    def check_xsrf_cookie(self):
+        pass
+
+    def _echo(self):
+        self.set_header('X-Result', 'from primary')
+        self.set_cookie('cookie1', 'a')
+        self.set_cookie('cookie2', 'b')
+
+        self.write(json.dumps({'method': self.request.method,
+                               'body': self.request.body.decode('utf-8'),
+                               'remote_ip': self.request.remote_ip,
+                               'custom_header': self.request.headers.get('X-Custom')}))
+
+
+@tornado.web.stream_request_body
+class _StreamingHandler(tornado.web.RequestHandler):
+    first_chunk_received = None
+
+    def prepare(self):
+        self.received_size = 0
+
+    def data_received(self, chunk):
+        self.received_size += len(chunk)
+        if not _StreamingHandler.first_chunk_received.done():
+            _StreamingHandler.first_chunk_received.set_result(None)
+
+    def check_xsrf_cookie(self):
+        pass
+
+    def post(self):
+        self.write(str(self.received_size))
+
+
+class _MissingHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.set_status(404)
+        self.write('not here')
+
+
+class _EchoSocket(tornado.websocket.WebSocketHandler):
+    def on_message(self, message):
+        if message == 'close':
+            self.close(code=4000, reason='bye')
+            return
+
+        if message == 'flood':
+            for i in range(3):
+                self.write_message('message ' + str(i))
+            return
+
+        self.write_message('echo: ' + message)
+
+
+class WorkerProxyTest(testing.AsyncTestCase):
+    @testing.gen_test
+    def test_get(self):
+        response = yield self.fetch('/proxied/echo', headers={'X-Custom': 'abc'})
+
+        self.assertEqual(200, response.code)
+        self.assertEqual('from primary', response.headers.get('X-Result'))
+        self.assertEqual({'method': 'GET', 'body': '', 'remote_ip': '127.0.0.1', 'custom_header': 'abc'},
+                         json.loads(response.body))
+
+    @testing.gen_test
+    def test_post(self):
+        response = yield self.fetch('/proxied/echo', method='POST', body='some data')
+
+        self.assertEqual(200, response.code)
+        body = json.loads(response.body)
+        self.assertEqual(('POST', 'some data'), (body['method'], body['body']))
+
+    @testing.gen_test
+    def test_stream_post_body(self):
+        _StreamingHandler.first_chunk_received = Future()
+
+        async def produce_body(write):
+            await write(b'x' * 1024)
+            # the rest is sent only, when the primary worker got the beginning, i.e. the body is not buffered
+            await gen.with_timeout(self.io_loop.time() + 5, _StreamingHandler.first_chunk_received)
+            await write(b'y' * 1024 * 1024)
+
+        response = yield self.fetch('/proxied/stream',
+                                    method='POST',
+                                    body_producer=produce_body,
+                                    headers={'Content-Length': str(1024 + 1024 * 1024)})
+
+        self.assertEqual(200, response.code)
+        self.assertEqual(str(1024 + 1024 * 1024), response.body.decode('utf-8'))
+
+    @testing.gen_test
+    def test_stream_chunked_post_body(self):
+        _StreamingHandler.first_chunk_received = Future()
+
+        async def produce_body(write):
+            for i in range(10):
+                await write(b'x' * 1000)
+
+        response = yield self.fetch('/proxied/stream', method='POST', body_producer=produce_body)
+
+        self.assertEqual(200, response.code)
+        self.assertEqual('10000', response.body.decode('utf-8'))
+
+    @testing.gen_test
+    def test_cookies(self):
+        response = yield self.fetch('/proxied/echo')
+
+        cookies = response.headers.get_list('Set-Cookie')
+        self.assertEqual(2, len(cookies))
+
+    @testing.gen_test
+    def test_error_status(self):
+        response = yield self.fetch('/proxied/missing')
+
+        self.assertEqual(404, response.code)
+        self.assertEqual(b'not here', response.body)
+
+    @testing.gen_test
+    def test_worker_not_available(self):
+        response = yield self.fetch('/unavailable/echo')
+
+        self.assertEqual(502, response.code)
+
+    @testing.gen_test
+    def test_websocket(self):
+        socket = yield tornado.websocket.websocket_connect(self.get_url('/proxied/socket', 'ws'))
+
+        socket.write_message('hello')
+        response = yield socket.read_message()
+        self.assertEqual('echo: hello', response)
+
+        socket.close()
+
+    @testing.gen_test
+    def test_websocket_wait_slow_client(self):
+        sent_messages = []
+
+        def write_message(handler, message, binary=False):
+            sent_messages.append(message)
+            # the client never reads the message
+            return Future()
+
+        with patch.object(WorkerWebSocketProxy, 'write_message', write_message):
+            socket = yield tornado.websocket.websocket_connect(self.get_url('/proxied/socket', 'ws'))
+            socket.write_message('flood')
+            yield gen.sleep(0.1)
+
+        self.assertEqual(['message 0'], sent_messages)
+        socket.close()
+
+    @testing.gen_test
+    def test_websocket_closed_by_primary(self):
+        socket = yield tornado.websocket.websocket_connect(self.get_url('/proxied/socket', 'ws'))
+
+        socket.write_message('close')
+        response = yield socket.read_message()
+
+        self.assertIsNone(response)
+        self.assertEqual((4000, 'bye'), (socket.close_code, socket.close_reason))
+
+    def fetch(self, path, **kwargs):
+        request = HTTPRequest(self.get_url(path), **kwargs)
+        return tornado.httpclient.AsyncHTTPClient().fetch(request, raise_error=False)
+
+    def get_url(self, path, protocol='http'):
+        return protocol + '://127.0.0.1:' + str(self.port) + path
+
+    def setUp(self):
+        super().setUp()
+        test_utils.setup()
+
+        sockets_folder = test_utils.create_dir('workers')
+
+        primary_application = tornado.web.Application([(r'/proxied/echo', _EchoHandler),
+                                                       (r'/proxied/missing', _MissingHandler),
+                                                       (r'/proxied/stream', _StreamingHandler),
+                                                       (r'/proxied/socket', _EchoSocket)])
+        autoapply_xheaders(primary_application)
+        primary_application.worker = WorkerInfo(0, 2, sockets_folder)
+
+        self.primary_server = tornado.httpserver.HTTPServer(primary_application)
+        self.primary_server.add_socket(tornado.netutil.bind_unix_socket(os.path.join(sockets_folder, 'worker-0.sock')))
+
+        secondary_application = tornado.web.Application([
+            (r'/proxied/socket', WorkerWebSocketProxy),
+            (r'/proxied/.*', WorkerProxyHandler),
+            (r'/unavailable/.*', WorkerProxyHandler, {'worker_index': 5})])
+        secondary_application.worker = WorkerInfo(1, 2, sockets_folder)
+
+        self.secondary_server = tornado.httpserver.HTTPServer(secondary_application)
+        (socket, self.port) = testing.bind_unused_port()
+        self.secondary_server.add_socket(socket)
+
+    def tearDown(self):
+        self.secondary_server.stop()
+        self.primary_server.stop()
+
+        test_utils.cleanup()
+
+        super().tearDown()
+
+
+class _ApplicationMock:
+    def __init__(self, worker):
+        self.worker = worker
+
+
+class WorkerIdTest(unittest.TestCase):
+    def test_tag_id_when_single_process(self):
+        application = _ApplicationMock(None)
+
+        self.assertEqual('abc', tag_local_id(application, 'abc'))
+
+    def test_tag_id_when_multiple_workers(self):
+        application = _ApplicationMock(WorkerInfo(2, 4, 'workers'))
+
+        self.assertEqual('2-abc', tag_local_id(application, 'abc'))
+
+    def test_find_owner_when_another_worker(self):
+        application = _ApplicationMock(WorkerInfo(2, 4, 'workers'))
+
+        self.assertEqual(1, find_owner_index(application, '1-abc'))
+
+    def test_find_owner_when_current_worker(self):
+        application = _ApplicationMock(WorkerInfo(2, 4, 'workers'))
+
+        self.assertIsNone(find_owner_index(application, '2-abc'))
+
+    def test_find_owner_when_unknown_worker(self):
+        application = _ApplicationMock(WorkerInfo(2, 4, 'workers'))
+
+        self.assertIsNone(find_owner_index(application, '7-abc'))
+
+    def test_find_owner_when_not_tagged(self):
+        application = _ApplicationMock(WorkerInfo(2, 4, 'workers'))
+
+        self.assertIsNone(find_owner_index(application, 'e2b7c1d0-1234'))
+
+    def test_find_owner_when_single_process(self):
+        application = _ApplicationMock(None)
+
+        self.assertIsNone(find_owner_index(application, '1-abc'))
@@ -1,3 +1,6 @@
+import codecs
+
+
 def decode(data, encoding):
     try:
         return data.decode(encoding)
@@ -32,7 +35,8 @@ def _decode_utf8_with_mixes(data):
         if next_bytes_count:
             valid = True
             for offset in range(0, next_bytes_count):
-                if not (128 <= data[index + offset + 1] <= 192):
+                next_index = index + offset + 1
+                if (next_index >= len(data)) or not (128 <= data[next_index] <= 192):
                     valid = False
                     break
 
@@ -46,3 +50,67 @@ def _decode_utf8_with_mixes(data):
         new_data.extend(converted_bytes)
 
     return new_data.decode('utf-8', errors='replace')
+
+
+class Utf8MixedIncrementalDecoder:
+    """
+    Incremental version of decode(data, 'utf-8'): multibyte characters can be split between chunks,
+    so incomplete trailing sequence is kept until the next chunk
+    """
+
+    def __init__(self):
+        self._pending = b''
+
+    def decode(self, data, final=False):
+        data = self._pending + data
+        self._pending = b''
+
+        if not final:
+            split_index = _find_incomplete_utf8_tail(data)
+            self._pending = data[split_index:]
+            data = data[:split_index]
+
+        if not data:
+            return ''
+
+        return decode(data, 'utf-8')
+
+    def reset(self):
+        self._pending = b''
+
+    def getstate(self):
+        return self._pending, 0
+
+    def setstate(self, state):
+        self._pending = state[0]
+
+
+def _find_incomplete_utf8_tail(data):
+    for length in range(1, min(4, len(data) + 1)):
+        char = data[-length]
+
+        # continuation byte
+        if 128 <= char <= 191:
+            continue
+
+        expected_length = 1
+        if 192 <= char <= 223:
+            expected_length = 2
+        elif 224 <= char <= 239:
+            expected_length = 3
+        elif 240 <= char <= 247:
+            expected_length = 4
+
+        if expected_length > length:
+            return len(data) - length
+
+        break
+
+    return len(data)
+
+
+def create_incremental_decoder(encoding):
+    if encoding.lower() in ('utf-8', 'utf8'):
+        return Utf8MixedIncrementalDecoder()
+
+    return codecs.getincrementaldecoder(encoding)(errors='replace')
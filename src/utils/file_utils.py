@@ -189,11 +189,18 @@ def to_filename(txt):
     return txt.replace('/', '_')
 
 
-def create_unique_filename(preferred_path, retries=9999999):
+def create_unique_filename(preferred_path, retries=9999999, reserved_suffixes=()):
+    """
+    :param reserved_suffixes: a path is considered taken, if the path with any of these suffixes exists
+        (e.g. a compressed version of the file)
+    """
     original_filename = os.path.basename(preferred_path)
     folder = os.path.dirname(preferred_path)
 
-    if not os.path.exists(preferred_path):
+    def is_taken(path):
+        return os.path.exists(path) or any(os.path.exists(path + suffix) for suffix in reserved_suffixes)
+
+    if not is_taken(preferred_path):
         return preferred_path
 
     i = 0
@@ -206,11 +213,11 @@ def create_unique_filename(preferred_path, retries=9999999):
         if len(filename_split) > 1:
             extension = filename_split[1]
 
-    while os.path.exists(preferred_path) and i < retries:
+    while is_taken(preferred_path) and i < retries:
         preferred_path = os.path.join(folder, name + '_' + str(i) + extension)
         i += 1
 
-    if os.path.exists(preferred_path):
+    if is_taken(preferred_path):
         raise FileExistsException("Couldn't create unique filename for " + original_filename)
 
     return preferred_path
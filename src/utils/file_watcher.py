@@ -0,0 +1,214 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+
+from react import event_loop
+from utils import os_utils
+
+LOGGER = logging.getLogger('script_server.file_watcher')
+
+DEFAULT_POLL_PERIOD_SEC = 2.0
+
+# several file events usually come together (e.g. truncate + write), so they are reported once
+_DEBOUNCE_SEC = 0.1
+
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+
+_WATCH_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO \
+              | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+_READ_SIZE = 64 * 1024
+
+
+def watch_folder(folder, callback, poll_period_sec=DEFAULT_POLL_PERIOD_SEC):
+    """
+    Calls callback() from the shared event loop, when something in the folder (including subfolders) could change.
+    The callback doesn't get the exact changes, so it should check the folder state itself.
+
+    inotify is used on linux, otherwise (or if it's not available) callback is called periodically.
+    :return: watcher, which should be stopped, when not needed anymore
+    """
+    loop = event_loop.get_shared_loop()
+
+    if os_utils.is_linux():
+        try:
+            watcher = _InotifyWatcher(folder, callback, loop)
+            LOGGER.info('Watching ' + folder + ' using inotify')
+            return watcher
+        except:
+            LOGGER.exception('Failed to watch ' + folder + ' using inotify, falling back to polling')
+
+    LOGGER.info('Watching ' + folder + ' every ' + str(poll_period_sec) + ' seconds')
+    return _PollingWatcher(callback, poll_period_sec, loop)
+
+
+class _PollingWatcher:
+    def __init__(self, callback, period_sec, loop: event_loop.EventLoop):
+        self.precise = False
+
+        self._callback = callback
+        self._period_sec = period_sec
+        self._loop = loop
+        self._stopped = False
+
+        self._timer = loop.call_later(period_sec, self._poll)
+
+    def _poll(self):
+        if self._stopped:
+            return
+
+        try:
+            self._callback()
+        finally:
+            self._timer = self._loop.call_later(self._period_sec, self._poll)
+
+    def stop(self):
+        if self._stopped:
+            return
+
+        self._stopped = True
+        self._timer.cancel()
+
+
+class _InotifyWatcher:
+    def __init__(self, folder, callback, loop: event_loop.EventLoop):
+        # precise watchers report all the changes, so there is no need to check the folder without notifications
+        self.precise = True
+
+        self._folder = folder
+        self._callback = callback
+        self._loop = loop
+        self._stopped = False
+        self._notify_timer = None
+
+        self._libc = _load_libc()
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise _errno_to_os_error('inotify_init1')
+
+        self._watched_paths = {}
+
+        try:
+            self._add_watches(folder)
+        except:
+            os.close(self._fd)
+            raise
+
+        loop.call_soon(self._loop.add_reader, self._fd, self._read_events)
+
+    def _add_watches(self, root_folder):
+        for (folder, _, _) in os.walk(root_folder):
+            try:
+                self._add_watch(folder)
+            except FileNotFoundError:
+                # folder was removed during walking
+                continue
+
+    def _add_watch(self, folder):
+        watch_descriptor = self._libc.inotify_add_watch(self._fd, os.fsencode(folder), _WATCH_MASK)
+        if watch_descriptor < 0:
+            raise _errno_to_os_error('inotify_add_watch(' + folder + ')')
+
+        self._watched_paths[watch_descriptor] = folder
+
+    def _read_events(self):
+        try:
+            data = os.read(self._fd, _READ_SIZE)
+        except BlockingIOError:
+            return
+
+        changed = False
+        new_folders = []
+
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            (watch_descriptor, mask, _, name_length) = _EVENT_HEADER.unpack_from(data, offset)
+            name_start = offset + _EVENT_HEADER.size
+            name = data[name_start:name_start + name_length].rstrip(b'\0')
+            offset = name_start + name_length
+
+            if mask & _IN_IGNORED:
+                self._watched_paths.pop(watch_descriptor, None)
+                continue
+
+            if mask & _IN_Q_OVERFLOW:
+                LOGGER.warning('Too many changes in ' + self._folder + ', some of them are lost')
+
+            changed = True
+
+            if (mask & _IN_ISDIR) and (mask & (_IN_CREATE | _IN_MOVED_TO)):
+                parent_folder = self._watched_paths.get(watch_descriptor)
+                if parent_folder is not None:
+                    new_folders.append(os.path.join(parent_folder, os.fsdecode(name)))
+
+        for folder in new_folders:
+            try:
+                self._add_watches(folder)
+            except:
+                LOGGER.exception('Failed to watch ' + folder)
+
+        if changed:
+            self._schedule_notification()
+
+    def _schedule_notification(self):
+        if (self._notify_timer is not None) or self._stopped:
+            return
+
+        self._notify_timer = self._loop.call_later(_DEBOUNCE_SEC, self._notify)
+
+    def _notify(self):
+        self._notify_timer = None
+
+        if not self._stopped:
+            self._callback()
+
+    def stop(self):
+        if self._stopped:
+            return
+
+        self._stopped = True
+
+        if self._notify_timer is not None:
+            self._notify_timer.cancel()
+
+        self._loop.call_soon(self._close)
+
+    def _close(self):
+        try:
+            self._loop.remove_reader(self._fd)
+        except (KeyError, ValueError):
+            pass
+
+        os.close(self._fd)
+
+
+def _load_libc():
+    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_init1.restype = ctypes.c_int
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    libc.inotify_add_watch.restype = ctypes.c_int
+
+    return libc
+
+
+def _errno_to_os_error(function_name):
+    error_code = ctypes.get_errno()
+    return OSError(error_code, function_name + ' failed: ' + os.strerror(error_code))
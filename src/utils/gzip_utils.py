@@ -0,0 +1,178 @@
+import bisect
+import struct
+import zlib
+
+GZIP_EXTENSION = '.gz'
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+# Blocked gzip: a file is a sequence of independent gzip members (i.e. a valid gzip file, readable by any gzip tool).
+# Each member has an extra field with its compressed and uncompressed sizes, so members can be located without
+# decompression and any byte range is read by decompressing only the covering blocks
+_HEADER = struct.Struct('<2sBBIBBH2sHII')
+_TRAILER = struct.Struct('<II')
+_GZIP_MAGIC = b'\x1f\x8b'
+_DEFLATE_METHOD = 8
+_FLAG_EXTRA = 4
+_UNKNOWN_OS = 255
+_SUBFIELD_ID = b'SB'
+_SUBFIELD_LENGTH = 8
+_EXTRA_LENGTH = 4 + _SUBFIELD_LENGTH
+
+
+class InvalidBlockedGzipException(Exception):
+    pass
+
+
+def is_gzip_file(file_path):
+    return file_path.lower().endswith(GZIP_EXTENSION)
+
+
+def compress_file(source_path, target_path, block_size=DEFAULT_BLOCK_SIZE, compression_level=6):
+    with open(source_path, 'rb') as source, open(target_path, 'wb') as target:
+        first_block = True
+
+        while True:
+            data = source.read(block_size)
+            # empty file is still stored as a single (empty) member, to keep it a valid gzip file
+            if not data and not first_block:
+                break
+
+            target.write(_create_member(data, compression_level))
+            first_block = False
+
+            if len(data) < block_size:
+                break
+
+
+def _create_member(data, compression_level):
+    compressor = zlib.compressobj(compression_level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    deflated = compressor.compress(data) + compressor.flush()
+
+    member_size = _HEADER.size + len(deflated) + _TRAILER.size
+    header = _HEADER.pack(_GZIP_MAGIC, _DEFLATE_METHOD, _FLAG_EXTRA, 0, 0, _UNKNOWN_OS,
+                          _EXTRA_LENGTH, _SUBFIELD_ID, _SUBFIELD_LENGTH, member_size, len(data))
+    trailer = _TRAILER.pack(zlib.crc32(data), len(data) & 0xffffffff)
+
+    return header + deflated + trailer
+
+
+class BlockedGzipReader:
+    """
+    Random access reader for files, created by compress_file.
+    Block table is built lazily by reading member headers only.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._file = open(file_path, 'rb')
+
+        self._block_starts = None
+        self._blocks = None
+        self._cached_block_index = None
+        self._cached_block_data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def size(self):
+        self._load_blocks()
+
+        if not self._blocks:
+            return 0
+
+        (_, _, data_size) = self._blocks[-1]
+        return self._block_starts[-1] + data_size
+
+    def read(self, position, size):
+        self._load_blocks()
+
+        result = []
+        end = position + size
+        block_index = max(bisect.bisect_right(self._block_starts, position) - 1, 0)
+
+        while (position < end) and (block_index < len(self._blocks)):
+            data = self._read_block(block_index)
+            block_start = self._block_starts[block_index]
+
+            part = data[position - block_start:end - block_start]
+            if part:
+                result.append(part)
+                position += len(part)
+
+            block_index += 1
+
+        return b''.join(result)
+
+    def _load_blocks(self):
+        if self._blocks is not None:
+            return
+
+        block_starts = []
+        blocks = []
+        file_position = 0
+        data_position = 0
+
+        self._file.seek(0)
+        while True:
+            header_bytes = self._file.read(_HEADER.size)
+            if not header_bytes:
+                break
+
+            (member_size, data_size) = self._parse_header(header_bytes)
+
+            block_starts.append(data_position)
+            blocks.append((file_position, member_size, data_size))
+
+            file_position += member_size
+            data_position += data_size
+            self._file.seek(file_position)
+
+        self._block_starts = block_starts
+        self._blocks = blocks
+
+    def _parse_header(self, header_bytes):
+        if len(header_bytes) < _HEADER.size:
+            raise InvalidBlockedGzipException('Unexpected end of file ' + self.file_path)
+
+        (magic, method, flags, _, _, _, extra_length, subfield_id, subfield_length, member_size, data_size) \
+            = _HEADER.unpack(header_bytes)
+
+        if (magic != _GZIP_MAGIC) \
+                or (method != _DEFLATE_METHOD) \
+                or (flags != _FLAG_EXTRA) \
+                or (extra_length != _EXTRA_LENGTH) \
+                or (subfield_id != _SUBFIELD_ID) \
+                or (subfield_length != _SUBFIELD_LENGTH) \
+                or (member_size < _HEADER.size + _TRAILER.size):
+            raise InvalidBlockedGzipException(self.file_path + ' is not a blocked gzip file')
+
+        return member_size, data_size
+
+    def _read_block(self, block_index):
+        if self._cached_block_index == block_index:
+            return self._cached_block_data
+
+        (file_position, member_size, data_size) = self._blocks[block_index]
+
+        self._file.seek(file_position + _HEADER.size)
+        member_bytes = self._file.read(member_size - _HEADER.size)
+        if len(member_bytes) != member_size - _HEADER.size:
+            raise InvalidBlockedGzipException('Unexpected end of file ' + self.file_path)
+
+        data = zlib.decompress(member_bytes[:-_TRAILER.size], -zlib.MAX_WBITS)
+
+        (crc, _) = _TRAILER.unpack(member_bytes[-_TRAILER.size:])
+        if (len(data) != data_size) or (zlib.crc32(data) != crc):
+            raise InvalidBlockedGzipException('Corrupted block in ' + self.file_path)
+
+        self._cached_block_index = block_index
+        self._cached_block_data = data
+
+        return data
@@ -1,7 +1,10 @@
 import logging
 import os
 import shlex
+import signal
 import subprocess
+import threading
+from contextlib import contextmanager
 
 from utils import file_utils
 from utils import os_utils
@@ -23,15 +26,30 @@ class ProcessInvoker:
 
         env_vars = self._env_vars.build_env_vars(environment_variables)
 
+        cancellation_token = getattr(_cancellation_scope, 'token', None)
+        if cancellation_token is not None:
+            cancellation_token.raise_if_cancelled()
+
         p = subprocess.Popen(command,
                              stdout=subprocess.PIPE,
                              stderr=subprocess.PIPE,
                              cwd=work_dir,
                              env=env_vars,
                              universal_newlines=True,
-                             shell=shell)
+                             shell=shell,
+                             # so that cancellation can kill the whole process group, including shell children
+                             start_new_session=(cancellation_token is not None) and not os_utils.is_win())
+
+        if cancellation_token is None:
+            (output, error) = p.communicate()
+        else:
+            cancellation_token._add_process(p)
+            try:
+                (output, error) = p.communicate()
+            finally:
+                cancellation_token._remove_process(p)
 
-        (output, error) = p.communicate()
+            cancellation_token.raise_if_cancelled()
 
         result_code = p.returncode
         if result_code != 0:
@@ -43,6 +61,70 @@ class ProcessInvoker:
         return output
 
 
+class CancellationToken:
+    """
+    Allows to stop ProcessInvoker invocations, which are started inside cancellable_invocations(token) scope.
+    Running processes are killed and the invocations raise InvocationCancelledException.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._processes = set()
+        self.cancelled = False
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            processes = list(self._processes)
+
+        for process in processes:
+            _kill_process(process)
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise InvocationCancelledException()
+
+    def _add_process(self, process):
+        with self._lock:
+            if not self.cancelled:
+                self._processes.add(process)
+                return
+
+        _kill_process(process)
+
+    def _remove_process(self, process):
+        with self._lock:
+            self._processes.discard(process)
+
+
+_cancellation_scope = threading.local()
+
+
+@contextmanager
+def cancellable_invocations(token: CancellationToken):
+    previous_token = getattr(_cancellation_scope, 'token', None)
+    _cancellation_scope.token = token
+    try:
+        yield
+    finally:
+        _cancellation_scope.token = previous_token
+
+
+def _kill_process(process):
+    if process.poll() is not None:
+        return
+
+    try:
+        if os_utils.is_win():
+            process.kill()
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    except:
+        LOGGER.exception('Failed to kill process ' + str(process.pid))
+
+
 def split_command(script_command, working_directory=None):
     if ' ' in script_command:
         if _is_file_path(script_command, working_directory):
@@ -98,3 +180,8 @@ class ExecutionException(Exception):
         self.stdout = stdout
         self.stderr = stderr
         self.exit_code = exit_code
+
+
+class InvocationCancelledException(Exception):
+    def __init__(self):
+        super().__init__('Invocation was cancelled')
@@ -0,0 +1,69 @@
+import logging
+from collections import deque
+from typing import NamedTuple
+
+import tornado.ioloop
+
+LOGGER = logging.getLogger('script_server.ioloop_lag_monitor')
+
+
+class LagStats(NamedTuple):
+    current_ms: float
+    average_ms: float
+    max_ms: float
+    samples: int
+
+
+class IOLoopLagMonitor:
+    """
+    Measures, how late IOLoop callbacks are executed: a callback is scheduled every interval
+    and the lag is the difference between the actual and the scheduled execution time.
+
+    Near zero lag means, that no handler blocks the loop.
+    """
+
+    def __init__(self, interval_sec=0.5, window_size=120, warning_threshold_sec=0.5):
+        self._interval_sec = interval_sec
+        self._warning_threshold_sec = warning_threshold_sec
+        self._samples = deque(maxlen=window_size)
+
+        self._io_loop = None
+        self._timeout = None
+        self._expected_time = None
+
+    def start(self, io_loop=None):
+        if io_loop is None:
+            io_loop = tornado.ioloop.IOLoop.current()
+
+        self._io_loop = io_loop
+        self._schedule()
+
+    def stop(self):
+        if (self._io_loop is None) or (self._timeout is None):
+            return
+
+        self._io_loop.remove_timeout(self._timeout)
+        self._timeout = None
+
+    def get_stats(self):
+        samples = list(self._samples)
+        if not samples:
+            return LagStats(0.0, 0.0, 0.0, 0)
+
+        return LagStats(current_ms=samples[-1] * 1000,
+                        average_ms=sum(samples) / len(samples) * 1000,
+                        max_ms=max(samples) * 1000,
+                        samples=len(samples))
+
+    def _schedule(self):
+        self._expected_time = self._io_loop.time() + self._interval_sec
+        self._timeout = self._io_loop.call_at(self._expected_time, self._measure)
+
+    def _measure(self):
+        lag = max(0.0, self._io_loop.time() - self._expected_time)
+        self._samples.append(lag)
+
+        if lag > self._warning_threshold_sec:
+            LOGGER.warning('IOLoop was blocked for ' + str(round(lag * 1000)) + 'ms')
+
+        self._schedule()
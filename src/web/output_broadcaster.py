@@ -0,0 +1,297 @@
+import logging
+import threading
+
+from tornado.websocket import WebSocketClosedError
+
+from web.web_utils import wrap_to_server_event
+
+LOGGER = logging.getLogger('script_server.output_broadcaster')
+
+# limits a single flush, so that a long backlog doesn't block the event loop
+MAX_BATCH_SIZE = 256 * 1024
+
+# used, when max_output_memory_mb is not configured, so that a stalled client cannot pin the memory forever
+DEFAULT_MEMORY_LIMIT = 64 * 1024 * 1024
+
+# "Try Again Later": the client was too slow and can reconnect to replay the output
+SLOW_CLIENT_CLOSE_CODE = 1013
+
+
+class OutputBroadcaster:
+    """
+    Converts output chunks of an execution to server events once and shares them between all the attached writers.
+    Each writer reads events from its own position, so a slow client doesn't delay the others.
+
+    When memory_limit is exceeded, events, which were read by all the writers, are released.
+    After that, new writers cannot attach (they should replay the output with their own broadcaster).
+    If it's still exceeded, paused writers, which are more than memory_limit behind, are detached and closed,
+    so a client, which never drains its connection, doesn't keep the output in memory
+
+    If encoded is True, output_stream contains already encoded server events (e.g. from another worker)
+    """
+
+    def __init__(self, output_stream, memory_limit=None, encoded=False):
+        self._output_stream = output_stream
+        self._encoded = encoded
+        self._memory_limit = memory_limit if memory_limit is not None else DEFAULT_MEMORY_LIMIT
+
+        self._lock = threading.Lock()
+        self._events = []
+        # position of self._events[0] in the whole output
+        self._offset = 0
+        self._size = 0
+        self._writers = []
+        self._subscribed = False
+
+    def attach(self, writer):
+        """
+        :return: False, if the beginning of the output is already released
+        """
+        with self._lock:
+            if self._offset > 0:
+                return False
+
+            writer.set_broadcaster(self, 0)
+            self._writers.append(writer)
+
+            subscribe = not self._subscribed
+            self._subscribed = True
+
+        if subscribe:
+            # replays the whole output
+            self._output_stream.subscribe(self)
+        else:
+            writer.notify()
+
+        return True
+
+    def detach(self, writer):
+        """
+        :return: True, if there are no writers left
+        """
+        with self._lock:
+            if writer in self._writers:
+                self._writers.remove(writer)
+
+            if self._writers:
+                return False
+
+            self._events = []
+            self._size = 0
+
+        self._output_stream.unsubscribe(self)
+        return True
+
+    def on_next(self, output):
+        event = output if self._encoded else wrap_to_server_event('output', output)
+
+        with self._lock:
+            if not self._writers:
+                # all the writers were detached, nobody can read the event
+                self._offset += 1
+                return
+
+            self._events.append(event)
+            self._size += len(event)
+
+            if self._size > self._memory_limit:
+                self._release_read_events()
+
+                if self._size > self._memory_limit:
+                    self._detach_stalled_writers()
+
+            writers = list(self._writers)
+
+        for writer in writers:
+            writer.notify()
+
+    def on_close(self):
+        pass
+
+    def _release_read_events(self):
+        if not self._writers:
+            self._offset += len(self._events)
+            self._events = []
+            self._size = 0
+            return
+
+        min_position = min(writer.position for writer in self._writers)
+        released_count = min_position - self._offset
+        if released_count <= 0:
+            return
+
+        self._size -= sum(len(event) for event in self._events[:released_count])
+        del self._events[:released_count]
+        self._offset = min_position
+
+    def _detach_stalled_writers(self):
+        for writer in list(self._writers):
+            # not paused writers are being flushed right now (e.g. after the initial replay)
+            if not writer.is_paused():
+                continue
+
+            unread_size = sum(len(event) for event in self._events[writer.position - self._offset:])
+            if unread_size <= self._memory_limit:
+                continue
+
+            LOGGER.warning('Client is ' + str(unread_size) + ' bytes behind the output, closing its connection')
+            self._writers.remove(writer)
+            writer.abort(SLOW_CLIENT_CLOSE_CODE, 'Client is too slow')
+
+        self._release_read_events()
+
+    def read_events(self, position, max_size=MAX_BATCH_SIZE):
+        """
+        :return: (events, next_position)
+        """
+        with self._lock:
+            start = position - self._offset
+
+            events = []
+            size = 0
+            for event in self._events[start:]:
+                if events and (size + len(event) > max_size):
+                    break
+
+                events.append(event)
+                size += len(event)
+
+            return events, position + len(events)
+
+
+class OutputBroadcasters:
+    """
+    Keeps a broadcaster per execution, while there are attached writers
+    """
+
+    def __init__(self, memory_limit=None, encoded=False):
+        self._memory_limit = memory_limit
+        self._encoded = encoded
+        self._broadcasters = {}
+        self._lock = threading.Lock()
+
+    def attach(self, execution_id, output_stream, writer):
+        with self._lock:
+            broadcaster = self._broadcasters.get(execution_id)
+            if broadcaster is None:
+                broadcaster = OutputBroadcaster(output_stream, self._memory_limit, self._encoded)
+                self._broadcasters[execution_id] = broadcaster
+
+            if broadcaster.attach(writer):
+                return
+
+        LOGGER.info('Output of #' + execution_id + ' is partially released, replaying it separately')
+        OutputBroadcaster(output_stream, self._memory_limit, self._encoded).attach(writer)
+
+    def detach(self, writer):
+        broadcaster = writer.broadcaster
+        if broadcaster is None:
+            return
+
+        with self._lock:
+            if not broadcaster.detach(writer):
+                return
+
+            for execution_id, existing in list(self._broadcasters.items()):
+                if existing is broadcaster:
+                    del self._broadcasters[execution_id]
+
+
+class WebSocketWriter:
+    """
+    Writes messages and broadcasted events to a websocket.
+    Messages, which arrive in the meantime, are written in a single event loop callback.
+    While the previous batch is not sent to the client, writing is paused
+    and the client continues from its position afterwards.
+    """
+
+    def __init__(self, websocket, io_loop):
+        self._websocket = websocket
+        self._io_loop = io_loop
+
+        self.broadcaster = None  # type: OutputBroadcaster
+        self.position = 0
+
+        self._lock = threading.Lock()
+        self._messages = []
+        self._flush_scheduled = False
+        self._write_future = None
+        self._close_code = None
+        self._aborted = False
+
+    def set_broadcaster(self, broadcaster, position):
+        self.broadcaster = broadcaster
+        self.position = position
+
+    def write(self, message):
+        with self._lock:
+            self._messages.append(message)
+
+        self.notify()
+
+    def close_when_flushed(self, code):
+        self._close_code = code
+        self.notify()
+
+    def is_paused(self):
+        return self._write_future is not None
+
+    def abort(self, code, reason):
+        """
+        Stops reading broadcasted events and closes the websocket without waiting for pending messages
+        """
+        self._aborted = True
+        self._io_loop.add_callback(self._close_aborted, code, reason)
+
+    def _close_aborted(self, code, reason):
+        if self._websocket.ws_connection is not None:
+            self._websocket.close(code=code, reason=reason)
+
+    def notify(self):
+        with self._lock:
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+
+        self._io_loop.add_callback(self._flush)
+
+    def _flush(self):
+        with self._lock:
+            self._flush_scheduled = False
+
+        if (self._websocket.ws_connection is None) or self._aborted:
+            return
+
+        if self._write_future is not None:
+            # the client is slow, continue, when the previous batch is sent
+            return
+
+        batch = []
+        if self.broadcaster is not None:
+            (batch, self.position) = self.broadcaster.read_events(self.position)
+
+        with self._lock:
+            batch.extend(self._messages)
+            self._messages = []
+
+        if not batch:
+            if self._close_code is not None:
+                self._websocket.close(code=self._close_code)
+            return
+
+        try:
+            for message in batch:
+                future = self._websocket.write_message(message)
+        except WebSocketClosedError:
+            return
+
+        self._write_future = future
+        future.add_done_callback(self._on_batch_written)
+
+    def _on_batch_written(self, future):
+        self._write_future = None
+
+        if future.cancelled() or (future.exception() is not None):
+            return
+
+        self.notify()
@@ -3,6 +3,7 @@ import functools
 import json
 import logging.config
 import uuid
+from collections import OrderedDict
 from concurrent.futures.thread import ThreadPoolExecutor
 
 import tornado.concurrent
@@ -19,14 +20,18 @@ from model import external_model
 from model.external_model import parameter_to_external
 from model.model_helper import read_bool
 from model.script_config import ConfigModel
-from utils.process_utils import ExecutionException
+from utils.process_utils import ExecutionException, CancellationToken, cancellable_invocations
 from web.web_auth_utils import check_authorization
 from web.web_utils import wrap_to_server_event, inject_user
+from web.worker_proxy import tag_local_id
 
 LOGGER = logging.getLogger('web.script_config_socket')
 
 active_config_models = {}
 
+# fast typing produces a value per key press, only the last one is worth evaluation
+_PARAMETER_VALUES_DEBOUNCE_SEC = 0.1
+
 
 class ScriptConfigSocket(tornado.websocket.WebSocketHandler):
     user: User
@@ -39,7 +44,7 @@ class ScriptConfigSocket(tornado.websocket.WebSocketHandler):
         self.config_model = None
         self.config_name = None
         self.user = None
-        self.config_id = str(uuid.uuid4())
+        self.config_id = tag_local_id(application, str(uuid.uuid4()))
 
         self.init_with_values = read_bool(self.get_query_argument('initWithValues', default='false'))
 
@@ -48,6 +53,13 @@ class ScriptConfigSocket(tornado.websocket.WebSocketHandler):
         self._parameter_events_queue = []
         self._latest_client_state_version = None
 
+        self._pending_parameter_values = OrderedDict()
+        self._pending_client_state_version = None
+        self._evaluation_timer = None
+        self._evaluation_token = None
+        # parameters, which dependants' evaluation was cancelled (accessed only from the executor)
+        self._cancelled_parameters = set()
+
     @check_authorization
     @inject_user
     @gen.coroutine
@@ -56,6 +68,8 @@ class ScriptConfigSocket(tornado.websocket.WebSocketHandler):
         self.user = user
         self.ioloop = tornado.ioloop.IOLoop.current()
 
+        self.application.config_service.add_change_listener(self._on_configs_changed)
+
         if self.init_with_values:
             return
 
@@ -70,25 +84,18 @@ class ScriptConfigSocket(tornado.websocket.WebSocketHandler):
             data = message.get('data')
 
             if type == 'parameterValue':
-                param = data.get('parameter')
-                set_parameter_func = functools.partial(
-                    self._set_parameter_value,
-                    param,
+                self._queue_parameter_value(
+                    data.get('parameter'),
                     data.get('value'),
                     data.get('clientStateVersion'))
-
-                def handle_future_exception(result):
-                    if result.exception():
-                        LOGGER.exception(f'Failed to set parameter {param} value', exc_info=result.exception())
-
-                future = self._start_task(set_parameter_func)
-                future.add_done_callback(handle_future_exception)
-
                 return
             elif type == 'reloadModelValues':
                 parameter_values = data.get('parameterValues')
                 external_id = data.get('clientModelId')
 
+                # the whole model is replaced, so pending values are obsolete
+                self._discard_pending_values()
+
                 yield self._prepare_and_send_model(parameter_values=parameter_values,
                                                    external_id=external_id,
                                                    event_type='reloadedConfig',
@@ -118,15 +125,116 @@ class ScriptConfigSocket(tornado.websocket.WebSocketHandler):
 
         return future
 
-    def _set_parameter_value(self, parameter, value, client_state_version):
+    def _queue_parameter_value(self, parameter, value, client_state_version):
+        self._pending_parameter_values.pop(parameter, None)
+        self._pending_parameter_values[parameter] = value
+        self._pending_client_state_version = client_state_version
+
+        # the running evaluation is superseded by the newer client state
+        if self._evaluation_token is not None:
+            self._evaluation_token.cancel()
+
+        if self._evaluation_timer is not None:
+            self.ioloop.remove_timeout(self._evaluation_timer)
+
+        self._evaluation_timer = self.ioloop.call_later(
+            _PARAMETER_VALUES_DEBOUNCE_SEC,
+            self._evaluate_pending_values)
+
+    def _evaluate_pending_values(self):
+        self._evaluation_timer = None
+
+        if (self._evaluation_token is not None) or (not self._pending_parameter_values):
+            # will be called again, when the running evaluation finishes
+            return
+
+        parameter_values = self._pending_parameter_values
+        self._pending_parameter_values = OrderedDict()
+
+        token = CancellationToken()
+        self._evaluation_token = token
+
+        set_parameters_func = functools.partial(
+            self._set_parameter_values,
+            parameter_values,
+            self._pending_client_state_version,
+            token)
+
+        def on_finished(future):
+            if future.exception():
+                LOGGER.exception('Failed to set parameter values', exc_info=future.exception())
+
+            self._evaluation_token = None
+            if self._pending_parameter_values and (self._evaluation_timer is None):
+                self._evaluate_pending_values()
+
+        future = self._start_task(set_parameters_func)
+        future.add_done_callback(on_finished)
+
+    def _set_parameter_values(self, parameter_values, client_state_version, token):
         self._latest_client_state_version = client_state_version
-        self.config_model.set_param_value(parameter, value)
+
+        changed_parameters = set()
+
+        with cancellable_invocations(token):
+            for parameter, value in parameter_values.items():
+                old_value = self.config_model.parameter_values.get(parameter)
+                try:
+                    self.config_model.set_param_value(parameter, value)
+                except Exception:
+                    LOGGER.exception(f'Failed to set parameter {parameter} value')
+
+                if self.config_model.parameter_values.get(parameter) != old_value:
+                    changed_parameters.add(parameter)
+
+            if token.cancelled:
+                self._cancelled_parameters.update(parameter_values.keys())
+                return
+
+            # dependants of changed parameters are already re-evaluated
+            outdated_parameters = self._cancelled_parameters - changed_parameters
+            if outdated_parameters:
+                self.config_model.reload_dependant_values(outdated_parameters)
+
+            if token.cancelled:
+                self._cancelled_parameters.update(parameter_values.keys())
+                return
+
+        self._cancelled_parameters.clear()
         self._send_parameter_event('clientStateVersionAccepted', {})
 
+    def _discard_pending_values(self):
+        self._pending_parameter_values.clear()
+
+        if self._evaluation_timer is not None:
+            self.ioloop.remove_timeout(self._evaluation_timer)
+            self._evaluation_timer = None
+
+        if self._evaluation_token is not None:
+            self._evaluation_token.cancel()
+
     def on_close(self):
+        if self.user is not None:
+            self.application.config_service.remove_change_listener(self._on_configs_changed)
+            self._discard_pending_values()
+
         if self.config_id in active_config_models:
             del active_config_models[self.config_id]
 
+    def _on_configs_changed(self, changed_names):
+        if self.config_name.strip() in changed_names:
+            self.ioloop.add_callback(self._reload_changed_config)
+
+    @gen.coroutine
+    def _reload_changed_config(self):
+        if (self.config_model is None) or (self.ws_connection is None):
+            return
+
+        parameter_values = {name: value.user_value for name, value in self.config_model.parameter_values.items()}
+
+        LOGGER.info('Script config ' + self.config_name + ' changed, reloading the model')
+        yield self._prepare_and_send_model(parameter_values=parameter_values, event_type='reloadedConfig')
+
     def safe_write(self, message):
         if self.ws_connection is not None:
             self.ioloop.add_callback(self.write_message, message)
@@ -186,6 +294,7 @@ class ScriptConfigSocket(tornado.websocket.WebSocketHandler):
                                                                             skip_invalid_parameters=skip_invalid_parameters)
 
                 socket._parameter_events_queue.clear()
+                socket._cancelled_parameters.clear()
                 return model
 
             config_model = yield (self._start_task(load_model))
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import asyncio
+import hashlib
 import json
 import logging.config
 import os
@@ -7,12 +8,15 @@ import signal
 import ssl
 import time
 import urllib
+import uuid
+from concurrent.futures.thread import ThreadPoolExecutor
 from urllib.parse import urlencode
 
 import tornado.concurrent
 import tornado.escape
 import tornado.httpserver as httpserver
 import tornado.ioloop
+import tornado.netutil
 import tornado.routing
 import tornado.web
 import tornado.websocket
@@ -23,13 +27,13 @@ from communications.alerts_service import AlertsService
 from config.config_service import ConfigService, ConfigNotAllowedException, InvalidAccessException, \
     CorruptConfigFileException
 from config.exceptions import InvalidConfigException
-from execution.execution_service import ExecutionService
+from execution.execution_service import ExecutionService, PRIORITY_INTERACTIVE
 from execution.logging import ExecutionLoggingService
 from features.file_download_feature import FileDownloadFeature
 from features.file_upload_feature import FileUploadFeature
 from model import external_model
 from model.external_model import to_short_execution_log, to_long_execution_log
-from model.model_helper import is_empty, InvalidFileException, AccessProhibitedException
+from model.model_helper import is_empty, InvalidFileException, AccessProhibitedException, read_bool
 from model.parameter_config import WrongParameterUsageException
 from model.script_config import InvalidValueException, ParameterNotFoundException
 from model.server_conf import ServerConfig, XSRF_PROTECTION_TOKEN, XSRF_PROTECTION_DISABLED, XSRF_PROTECTION_HEADER
@@ -41,15 +45,23 @@ from utils.exceptions.missing_arg_exception import MissingArgumentException
 from utils.exceptions.not_found_exception import NotFoundException
 from utils.tornado_utils import respond_error, redirect_relative, get_form_file
 from web.script_config_socket import ScriptConfigSocket, active_config_models
+from web.ioloop_lag_monitor import IOLoopLagMonitor
+from web.output_broadcaster import OutputBroadcasters, WebSocketWriter
 from web.streaming_form_reader import StreamingFormReader
 from web.web_auth_utils import check_authorization, check_authorization_sync
 from web.web_utils import wrap_to_server_event, identify_user, inject_user, get_user
+from web.shared_output import SharedOutputStreams, WorkerOutputSocket, WorkerExecutionSocketProxy, \
+    SHARED_OUTPUT_EVENT, is_shared_output_request
+from web.worker_proxy import WorkerInfo, WorkerProxyHandler, find_owner_index, proxy_request
 from web.xheader_app_wrapper import autoapply_xheaders
 
 BYTES_IN_MB = 1024 * 1024
 
 LOGGER = logging.getLogger('web_server')
 
+# history versions and execution ids are reused after restart, so their etags should differ between server starts
+_STARTUP_NONCE = uuid.uuid4().hex
+
 
 def requires_admin_rights(func):
     def wrapper(self, *args, **kwargs):
@@ -116,6 +128,28 @@ class BaseRequestHandler(tornado.web.RequestHandler):
 
         respond_error(self, status_code, self._reason)
 
+    def check_not_modified(self, *version_parts):
+        """
+        Sets a strong Etag, built from the version parts, and responds with 304, if the client has the same version.
+        Should be called before building the response, so that repeated requests are cheap.
+        :return: True, if the response is not modified and shouldn't be written
+        """
+        etag = hashlib.sha1(repr(version_parts).encode('utf-8')).hexdigest()
+        self.set_header('Etag', '"' + etag + '"')
+
+        if self.check_etag_header():
+            self.set_status(304)
+            return True
+
+        return False
+
+    def run_blocking(self, func, *args):
+        """
+        Runs func in the bounded pool for blocking operations (file system, process spawning),
+        so that IOLoop stays responsive for other requests and websockets
+        """
+        return tornado.ioloop.IOLoop.current().run_in_executor(self.application.blocking_executor, func, *args)
+
 
 class BaseStaticHandler(tornado.web.StaticFileHandler):
     def set_default_headers(self):
@@ -125,20 +159,29 @@ class BaseStaticHandler(tornado.web.StaticFileHandler):
 class GetServerConf(BaseRequestHandler):
     @check_authorization
     def get(self):
-        self.write(external_model.server_conf_to_external(
-            self.application.server_config,
-            self.application.server_version))
+        server_config = self.application.server_config
+        server_version = self.application.server_version
+
+        if self.check_not_modified(server_config.title, server_config.enable_script_titles, server_version):
+            return
+
+        self.write(external_model.server_conf_to_external(server_config, server_version))
 
 
 class GetScripts(BaseRequestHandler):
     @check_authorization
     @inject_user
-    def get(self, user):
+    async def get(self, user):
         mode = self.get_query_argument('mode', default=None)
 
-        configs = self.application.config_service.list_configs(user, mode)
+        visible_configs = await self.run_blocking(self.application.config_service.list_visible_configs, user, mode)
 
-        scripts = [{'name': conf.name, 'group': conf.group, 'parsing_failed': conf.parsing_failed} for conf in configs]
+        # user specific lists are cached, so the etag is known without building the response
+        if self.check_not_modified(mode, visible_configs.etag):
+            return
+
+        scripts = [{'name': conf.name, 'group': conf.group, 'parsing_failed': conf.parsing_failed}
+                   for conf in visible_configs.configs]
 
         self.write(json.dumps({'scripts': scripts}))
 
@@ -185,9 +228,9 @@ class AdminUpdateScriptEndpoint(BaseRequestHandler):
 class AdminScriptEndpoint(BaseRequestHandler):
     @requires_admin_rights
     @inject_user
-    def get(self, user, script_name):
+    async def get(self, user, script_name):
         try:
-            config = self.application.config_service.load_config(script_name, user)
+            config = await self.run_blocking(self.application.config_service.load_config, script_name, user)
         except ConfigNotAllowedException:
             LOGGER.warning('Admin access to the script "' + script_name + '" is denied for ' + user.get_audit_name())
             respond_error(self, 403, 'Access to the script is denied')
@@ -203,9 +246,9 @@ class AdminScriptEndpoint(BaseRequestHandler):
 
     @requires_admin_rights
     @inject_user
-    def delete(self, user, script_name):
+    async def delete(self, user, script_name):
         try:
-            self.application.config_service.delete_config(user, script_name)
+            await self.run_blocking(self.application.config_service.delete_config, user, script_name)
         except ConfigNotAllowedException:
             LOGGER.warning(
                 f'Admin access to the script "{script_name}" is denied for {user.get_audit_name()}'
@@ -220,6 +263,33 @@ class AdminScriptEndpoint(BaseRequestHandler):
             raise tornado.web.HTTPError(403, reason=str(e)) from e
 
 
+class AdminMetricsEndpoint(BaseRequestHandler):
+    @requires_admin_rights
+    def get(self):
+        lag_stats = self.application.ioloop_lag_monitor.get_stats()
+
+        metrics = {
+            'ioloopLag': {
+                'currentMs': round(lag_stats.current_ms, 3),
+                'averageMs': round(lag_stats.average_ms, 3),
+                'maxMs': round(lag_stats.max_ms, 3),
+                'samples': lag_stats.samples
+            }
+        }
+
+        cache_stats = self.application.config_service.get_script_output_cache_stats()
+        if cache_stats is not None:
+            metrics['scriptOutputCache'] = {
+                'hits': cache_stats.hits,
+                'staleHits': cache_stats.stale_hits,
+                'misses': cache_stats.misses,
+                'size': cache_stats.size,
+                'hitRatio': round(cache_stats.hit_ratio, 3)
+            }
+
+        self.write(json.dumps(metrics))
+
+
 class AdminGetScriptCodeEndpoint(BaseRequestHandler):
     @requires_admin_rights
     @inject_user
@@ -262,6 +332,9 @@ class ScriptStreamSocket(tornado.websocket.WebSocketHandler):
         super().__init__(application, request, **kwargs)
 
         self.executor = None
+        self.writer = None
+        # another worker reads the output via its shared output stream, so only other events are sent here
+        self.shared_output = is_shared_output_request(request)
 
     @check_authorization
     @inject_user
@@ -275,13 +348,39 @@ class ScriptStreamSocket(tornado.websocket.WebSocketHandler):
             return
 
         self.ioloop = tornado.ioloop.IOLoop.current()
+        self.writer = WebSocketWriter(self, self.ioloop)
 
         self.write_message(wrap_to_server_event('input', 'your input >>'))
 
         user_id = identify_user(self)
 
+        def dequeued(started):
+            self.ioloop.add_callback(self._on_dequeued, execution_id, user_id, started)
+
+        if execution_service.add_dequeue_listener(execution_id, dequeued):
+            return
+
+        self._attach_to_execution(execution_id, user_id)
+
+    def _on_dequeued(self, execution_id, user_id, started):
+        if self.ws_connection is None:
+            return
+
+        if not started:
+            self.close(code=1000)
+            return
+
+        self.executor = self.application.execution_service.get_active_executor(execution_id, get_user(self))
+        self._attach_to_execution(execution_id, user_id)
+
+    def _attach_to_execution(self, execution_id, user_id):
+        execution_service = self.application.execution_service
+
         output_stream = execution_service.get_raw_output_stream(execution_id, user_id)
-        pipe_output_to_http(output_stream, self.safe_write)
+        if self.shared_output:
+            self.writer.write(wrap_to_server_event(SHARED_OUTPUT_EVENT, execution_id))
+        else:
+            self.application.output_broadcasters.attach(execution_id, output_stream, self.writer)
 
         file_download_feature = self.application.file_download_feature
         web_socket = self
@@ -306,22 +405,29 @@ class ScriptStreamSocket(tornado.websocket.WebSocketHandler):
                 connection.ping_callback.stop()
 
             output_stream.wait_close(timeout=5)
-            web_socket.ioloop.add_callback(web_socket.close, code=1000)
+            web_socket.writer.close_when_flushed(code=1000)
 
         file_download_feature.subscribe_on_inline_images(execution_id, self.send_inline_image)
 
         execution_service.add_finish_listener(finished, execution_id)
 
     def on_message(self, text):
+        if self.executor is None:
+            LOGGER.warning('Execution is not started yet, ignoring input')
+            return
+
         self.executor.write_to_input(text)
 
     def on_close(self):
         audit_name = get_audit_name_from_request(self)
         LOGGER.info(audit_name + ' disconnected')
 
+        if self.writer is not None:
+            self.application.output_broadcasters.detach(self.writer)
+
     def safe_write(self, message):
         if self.ws_connection is not None:
-            self.ioloop.add_callback(self.write_message, message)
+            self.writer.write(message)
 
     def send_inline_image(self, original_path, download_path):
         self.safe_write(wrap_to_server_event(
@@ -377,7 +483,7 @@ class ScriptExecute(StreamUploadRequestHandler):
         super().__init__(application, request, **kwargs)
 
     @inject_user
-    def post(self, user):
+    async def post(self, user):
         script_name = None
 
         audit_name = user.get_audit_name()
@@ -388,7 +494,8 @@ class ScriptExecute(StreamUploadRequestHandler):
 
             script_name = execution_info.script
 
-            config_model = self.application.config_service.load_config_model(script_name, user)
+            config_model = await self.run_blocking(
+                self.application.config_service.load_config_model, script_name, user)
 
             if not config_model:
                 message = 'Script with name "' + str(script_name) + '" not found'
@@ -405,9 +512,7 @@ class ScriptExecute(StreamUploadRequestHandler):
             all_audit_names = user.audit_names
             LOGGER.info('Calling script %s. User %s', script_name, all_audit_names)
 
-            config_model.set_all_param_values(parameter_values)
-
-            execution_id = self.application.execution_service.start_script(config_model, user)
+            execution_id = await self.run_blocking(self._start_script, config_model, parameter_values, user)
 
             self.write(str(execution_id))
 
@@ -450,6 +555,11 @@ class ScriptExecute(StreamUploadRequestHandler):
 
             respond_error(self, 500, result)
 
+    def _start_script(self, config_model, parameter_values, user):
+        config_model.set_all_param_values(parameter_values)
+
+        return self.application.execution_service.start_script(config_model, user, PRIORITY_INTERACTIVE)
+
 
 class GetActiveExecutionIds(BaseRequestHandler):
     @check_authorization
@@ -459,6 +569,14 @@ class GetActiveExecutionIds(BaseRequestHandler):
 
         active_executions = execution_service.get_active_executions(user_id)
 
+        if read_bool(self.get_query_argument('details', default='false')):
+            user = get_user(self)
+            details = [{'id': execution_id,
+                        'queuePosition': execution_service.get_queue_position(execution_id, user)}
+                       for execution_id in active_executions]
+            self.write(json.dumps(details))
+            return
+
         self.write(json.dumps(active_executions))
 
 
@@ -468,6 +586,10 @@ class GetExecutingScriptConfig(BaseRequestHandler):
     def get(self, user, execution_id):
         config = self.application.execution_service.get_config(execution_id, user)
 
+        # config and values of an execution never change
+        if self.check_not_modified(_STARTUP_NONCE, execution_id):
+            return
+
         values = dict(self.application.execution_service.get_user_parameter_values(execution_id))
 
         for parameter in config.parameters:
@@ -492,8 +614,20 @@ class GetExecutionStatus(BaseRequestHandler):
     @check_authorization
     @inject_user
     def get(self, user, execution_id):
-        running = self.application.execution_service.is_running(execution_id, user)
-        self.write(external_model.running_flag_to_status(running))
+        execution_service = self.application.execution_service
+
+        queue_position = execution_service.get_queue_position(execution_id, user)
+        if queue_position is not None:
+            status = external_model.STATUS_QUEUED
+        else:
+            running = execution_service.is_running(execution_id, user)
+            status = external_model.running_flag_to_status(running)
+
+        if read_bool(self.get_query_argument('details', default='false')):
+            self.write({'status': status, 'queuePosition': queue_position})
+            return
+
+        self.write(status)
 
 
 class AuthorizedStaticFileHandler(BaseStaticHandler):
@@ -546,13 +680,19 @@ class ScriptParameterListFiles(BaseRequestHandler):
 
     @check_authorization
     @inject_user
-    def get(self, user, script_name, parameter_name):
+    async def get(self, user, script_name, parameter_name):
         id = self.get_query_argument('id')
 
         if not id:
             respond_error(self, 400, 'Model id is not specified')
             return
 
+        owner_index = find_owner_index(self.application, id)
+        if owner_index is not None:
+            # the model was created by a websocket of another worker
+            await proxy_request(self, owner_index)
+            return
+
         if id not in active_config_models:
             respond_error(self, 400, 'Model with id=' + str(id) + ' does not exist')
             return
@@ -576,7 +716,7 @@ class ScriptParameterListFiles(BaseRequestHandler):
 
         path = self.get_query_arguments('path')
         try:
-            files = config_model.list_files_for_param(parameter_name, path)
+            files = await self.run_blocking(config_model.list_files_for_param, parameter_name, path)
             self.write(json.dumps(files))
 
         except ParameterNotFoundException as e:
@@ -683,11 +823,34 @@ class GetShortHistoryEntriesHandler(BaseRequestHandler):
     @check_authorization
     @inject_user
     def get(self, user):
-        history_entries = self.application.execution_logging_service.get_history_entries(user.user_id)
-        running_script_ids = []
-        for entry in history_entries:
-            if self.application.execution_service.is_running(entry.id, user):
-                running_script_ids.append(entry.id)
+        arguments = {name: self.get_query_argument(name) for name in self.request.query_arguments}
+        try:
+            query = external_model.to_history_query(arguments)
+        except ValueError as e:
+            respond_error(self, 400, str(e))
+            return
+
+        logging_service = self.application.execution_logging_service
+        running_script_ids = set(self.application.execution_service.get_running_executions())
+
+        if self.check_not_modified(_STARTUP_NONCE,
+                                   logging_service.get_history_version(),
+                                   user.user_id,
+                                   sorted(arguments.items()),
+                                   sorted(running_script_ids)):
+            return
+
+        history_entries = logging_service.get_history_entries(
+            user.user_id,
+            history_filter=query.history_filter,
+            sort_by=query.sort_by,
+            descending=query.descending,
+            offset=query.offset,
+            limit=query.limit)
+
+        if (query.limit is not None) or query.offset:
+            total_count = logging_service.count_history_entries(user.user_id, history_filter=query.history_filter)
+            self.set_header('X-Total-Count', str(total_count))
 
         short_logs = to_short_execution_log(history_entries, running_script_ids)
         self.write(json.dumps(short_logs))
@@ -720,6 +883,73 @@ class GetLongHistoryEntryHandler(BaseRequestHandler):
         self.write(json.dumps(long_log))
 
 
+class GetHistoryEntryOutputHandler(BaseRequestHandler):
+    @check_authorization
+    @inject_user
+    async def get(self, user, execution_id):
+        if is_empty(execution_id):
+            respond_error(self, 400, 'Execution id is not specified')
+            return
+
+        logging_service = self.application.execution_logging_service
+
+        try:
+            history_entry = await self.run_blocking(logging_service.find_history_entry, execution_id, user.user_id)
+        except AccessProhibitedException:
+            respond_error(self, 403, 'Access to execution #' + str(execution_id) + ' is prohibited')
+            return
+
+        if history_entry is None:
+            respond_error(self, 400, 'No history found for id ' + execution_id)
+            return
+
+        try:
+            offset = self._read_int_argument('offset', default=0)
+            limit = self._read_int_argument('limit')
+            tail_lines = self._read_int_argument('tail')
+        except ValueError as e:
+            respond_error(self, 400, str(e))
+            return
+
+        log_range = await self.run_blocking(
+            lambda: logging_service.find_log_range(execution_id, offset=offset, limit=limit, tail_lines=tail_lines))
+        if log_range is None:
+            respond_error(self, 404, 'No log found for execution ' + execution_id)
+            return
+
+        self.set_header('Content-Type', 'text/plain; charset=utf-8')
+        self.set_header('X-Output-Offset', str(log_range.offset))
+        self.set_header('X-Output-Size', str(log_range.output_size))
+
+        # gzipped logs are decompressed while reading, so every chunk is read outside of IOLoop
+        chunks = logging_service.read_log_range(log_range)
+        try:
+            while True:
+                chunk = await self.run_blocking(next, chunks, None)
+                if chunk is None:
+                    break
+
+                self.write(chunk)
+                await self.flush()
+        finally:
+            chunks.close()
+
+    def _read_int_argument(self, name, default=None):
+        value = self.get_query_argument(name, default=None)
+        if is_empty(value):
+            return default
+
+        try:
+            result = int(value)
+        except ValueError:
+            raise ValueError(name + ' should be an integer, but was ' + value)
+
+        if result < 0:
+            raise ValueError(name + ' should be >= 0')
+
+        return result
+
+
 @tornado.web.stream_request_body
 class AddSchedule(StreamUploadRequestHandler):
 
@@ -753,22 +983,15 @@ class AddSchedule(StreamUploadRequestHandler):
         self.write(json.dumps({'id': id}))
 
 
-def pipe_output_to_http(output_stream, write_callback):
-    class OutputToHttpListener:
-        def on_next(self, output):
-            write_callback(wrap_to_server_event('output', output))
-
-        def on_close(self):
-            pass
-
-    output_stream.subscribe(OutputToHttpListener())
-
-
 def intercept_stop_when_running_scripts(io_loop, execution_service):
     def signal_handler(signum, frame):
         can_stop = True
 
-        running_processes = execution_service.get_running_executions()
+        if execution_service is not None:
+            running_processes = execution_service.get_running_executions()
+        else:
+            running_processes = []
+
         if len(running_processes) > 0:
             try:
                 user_input = input('Some scripts are still running. Do you want to stop server anyway? Y/N: \n')
@@ -794,6 +1017,7 @@ def intercept_stop_when_running_scripts(io_loop, execution_service):
 
 
 _http_server = None
+_ioloop_lag_monitor = None
 
 
 def init(server_config: ServerConfig,
@@ -810,7 +1034,8 @@ def init(server_config: ServerConfig,
          server_version,
          conf_folder,
          *,
-         start_server=True):
+         start_server=True,
+         worker: WorkerInfo = None):
     ssl_context = None
     if server_config.is_ssl():
         ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
@@ -839,6 +1064,7 @@ def init(server_config: ServerConfig,
                 (r'/executions/status/(.*)', GetExecutionStatus),
                 (r'/history/execution_log/short', GetShortHistoryEntriesHandler),
                 (r'/history/execution_log/long/(.*)', GetLongHistoryEntryHandler),
+                (r'/history/execution_log/output/(.*)', GetHistoryEntryOutputHandler),
                 (r'/schedule', AddSchedule),
                 (r'/auth/info', AuthInfoHandler),
                 (r'/result_files/(.*)',
@@ -847,8 +1073,21 @@ def init(server_config: ServerConfig,
                 (r'/admin/scripts', AdminUpdateScriptEndpoint),
                 (r'/admin/scripts/([^/]+)', AdminScriptEndpoint),
                 (r'/admin/scripts/([^/]*)/code', AdminGetScriptCodeEndpoint),
+                (r'/admin/metrics', AdminMetricsEndpoint),
                 (r"/", ProxiedRedirectHandler, {"url": "/index.html"})]
 
+    if (worker is not None) and worker.is_primary:
+        handlers.append((r'/workers/output/(.*)', WorkerOutputSocket))
+
+    if (worker is not None) and (not worker.is_primary):
+        # executions, schedules and history are managed by the primary worker only,
+        # but the output is shared with the other workers, and they fan it out to their viewers
+        handlers = [(r'/executions/io/(.*)', WorkerExecutionSocketProxy),
+                    (r'/executions/.*', WorkerProxyHandler),
+                    (r'/history/.*', WorkerProxyHandler),
+                    (r'/schedule', WorkerProxyHandler),
+                    (r'/result_files/.*', WorkerProxyHandler)] + handlers
+
     if auth.is_enabled():
         handlers.append((r'/login', LoginHandler))
         handlers.append((r'/auth/config', AuthConfigHandler))
@@ -874,6 +1113,10 @@ def init(server_config: ServerConfig,
     application = tornado.web.Application(handlers, **settings)
     autoapply_xheaders(application)
 
+    output_memory_limit = None
+    if server_config.max_output_memory_mb is not None:
+        output_memory_limit = server_config.max_output_memory_mb * 1024 * 1024
+
     application.auth = auth
 
     application.server_config = server_config
@@ -883,12 +1126,18 @@ def init(server_config: ServerConfig,
     application.file_download_feature = file_download_feature
     application.file_upload_feature = file_upload_feature
     application.execution_service = execution_service
+    application.output_broadcasters = OutputBroadcasters(output_memory_limit)
+    if (worker is not None) and (not worker.is_primary):
+        application.shared_output_streams = SharedOutputStreams(worker, output_memory_limit)
     application.schedule_service = schedule_service
     application.execution_logging_service = execution_logging_service
     application.config_service = config_service
     application.alerts_service = alerts_service
     application.identification = identification
+    application.worker = worker
     application.max_request_size_mb = server_config.max_request_size_mb
+    application.blocking_executor = ThreadPoolExecutor(max_workers=server_config.handler_workers,
+                                                       thread_name_prefix='request-handler')
 
     if os_utils.is_win() and env_utils.is_min_version('3.8'):
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
@@ -899,12 +1148,27 @@ def init(server_config: ServerConfig,
         application,
         ssl_options=ssl_context,
         max_buffer_size=10 * BYTES_IN_MB)
-    _http_server.listen(server_config.port, address=server_config.address)
+    if worker is not None:
+        # all the workers accept connections on the same port, the kernel balances them
+        sockets = tornado.netutil.bind_sockets(server_config.port, address=server_config.address, reuse_port=True)
+        _http_server.add_sockets(sockets)
+
+        worker_server = httpserver.HTTPServer(application, max_buffer_size=10 * BYTES_IN_MB)
+        worker_socket = tornado.netutil.bind_unix_socket(worker.get_socket_path(worker.index), mode=0o600)
+        worker_server.add_socket(worker_socket)
+    else:
+        _http_server.listen(server_config.port, address=server_config.address)
+
+    global _ioloop_lag_monitor
+    _ioloop_lag_monitor = IOLoopLagMonitor()
+    _ioloop_lag_monitor.start(io_loop)
+    application.ioloop_lag_monitor = _ioloop_lag_monitor
 
     intercept_stop_when_running_scripts(io_loop, execution_service)
 
     http_protocol = 'https' if server_config.ssl else 'http'
-    print('Server is running on: %s://%s:%s' % (http_protocol, server_config.address, server_config.port))
+    if (worker is None) or worker.is_primary:
+        print('Server is running on: %s://%s:%s' % (http_protocol, server_config.address, server_config.port))
 
     if start_server:
         io_loop.start()
@@ -0,0 +1,251 @@
+import json
+import logging
+
+import tornado.ioloop
+import tornado.websocket
+from tornado.concurrent import Future
+
+from react.observable import ReplayObservable
+from web.output_broadcaster import OutputBroadcasters, WebSocketWriter
+from web.worker_proxy import WorkerInfo, WorkerWebSocketProxy, PRIMARY_WORKER_INDEX, connect_worker_websocket, \
+    is_worker_request
+
+LOGGER = logging.getLogger('script_server.shared_output')
+
+# set by a worker, when it reads the output of the execution via its shared output stream
+SHARED_OUTPUT_HEADER = 'X-Script-Server-Shared-Output'
+
+# sent by the primary worker instead of the output, when the execution is started
+SHARED_OUTPUT_EVENT = 'shared-output'
+
+_SHARED_OUTPUT_PATH = '/workers/output/'
+
+
+def is_shared_output_request(request):
+    return is_worker_request(request) and (request.headers.get(SHARED_OUTPUT_HEADER) == 'true')
+
+
+class WorkerOutputSocket(tornado.websocket.WebSocketHandler):
+    """
+    Streams output events of an execution from the primary worker to another worker.
+    The events are encoded once and shared with all the local viewers (see OutputBroadcasters).
+    Only other workers (via their unix sockets) can connect
+    """
+
+    def __init__(self, application, request, **kwargs):
+        super().__init__(application, request, **kwargs)
+
+        self.writer = None
+
+    def open(self, execution_id):
+        if not is_worker_request(self.request):
+            LOGGER.warning('Shared output of #' + execution_id + ' is requested not by a worker')
+            self.close(code=1008, reason='Only workers can read shared output')
+            return
+
+        execution_service = self.application.execution_service
+        output_stream = execution_service.get_raw_output_stream(execution_id,
+                                                                execution_service.get_owner(execution_id))
+        if output_stream is None:
+            self.close(code=1011, reason='Execution #' + execution_id + ' is not started')
+            return
+
+        self.writer = WebSocketWriter(self, tornado.ioloop.IOLoop.current())
+        self.application.output_broadcasters.attach(execution_id, output_stream, self.writer)
+
+        writer = self.writer
+
+        def finished():
+            output_stream.wait_close(timeout=5)
+            writer.close_when_flushed(code=1000)
+
+        execution_service.add_finish_listener(finished, execution_id)
+
+    def on_close(self):
+        if self.writer is not None:
+            self.application.output_broadcasters.detach(self.writer)
+
+
+class _SharedOutputStream:
+    """
+    Receives encoded output events of an execution from the primary worker and replays them to the local viewers
+    """
+
+    def __init__(self, key, execution_id, worker: WorkerInfo, memory_limit):
+        self.key = key
+        self.execution_id = execution_id
+        self.observable = ReplayObservable(memory_limit)
+        self.users = 0
+
+        self.close_code = None
+        self.close_reason = None
+        self.closed_future = Future()
+
+        self._worker = worker
+        self._upstream = None
+        self._disposed = False
+
+    @property
+    def failed(self):
+        return self.closed_future.done() and (self.close_code != 1000)
+
+    async def read_upstream(self):
+        try:
+            upstream = await connect_worker_websocket(
+                self._worker, PRIMARY_WORKER_INDEX, _SHARED_OUTPUT_PATH + self.execution_id)
+        except:
+            LOGGER.exception('Failed to connect to shared output of #' + self.execution_id)
+            self._finish(1011, 'Worker is not available')
+            return
+
+        if self._disposed:
+            upstream.close()
+            return
+
+        self._upstream = upstream
+
+        while True:
+            message = await upstream.read_message()
+            if message is None:
+                self._finish(upstream.close_code, upstream.close_reason)
+                return
+
+            self.observable.push(message)
+
+    def _finish(self, code, reason):
+        self.close_code = code
+        self.close_reason = reason
+        self.observable.close()
+
+        if not self.closed_future.done():
+            self.closed_future.set_result(None)
+
+    def dispose(self):
+        self._disposed = True
+
+        if self._upstream is not None:
+            self._upstream.close()
+
+        self.observable.dispose()
+
+
+class SharedOutputStreams:
+    """
+    Used by non-primary workers in the multi-process mode.
+    Keeps a single connection to the primary worker per execution, while the execution has local viewers,
+    and fans its output out to them. So the primary worker sends every chunk once per worker
+    and the viewers are served by all the worker processes
+    """
+
+    def __init__(self, worker: WorkerInfo, memory_limit=None):
+        self._worker = worker
+        self._memory_limit = memory_limit
+
+        self._streams = {}
+        self._broadcasters = OutputBroadcasters(memory_limit, encoded=True)
+        self._sequence = 0
+
+    def attach(self, execution_id, writer: WebSocketWriter) -> _SharedOutputStream:
+        stream = self._streams.get(execution_id)
+        if (stream is None) or stream.failed:
+            self._sequence += 1
+            stream = _SharedOutputStream(str(self._sequence), execution_id, self._worker, self._memory_limit)
+            self._streams[execution_id] = stream
+            tornado.ioloop.IOLoop.current().add_callback(stream.read_upstream)
+
+        stream.users += 1
+        self._broadcasters.attach(stream.key, stream.observable, writer)
+        return stream
+
+    def detach(self, stream: _SharedOutputStream, writer: WebSocketWriter):
+        self._broadcasters.detach(writer)
+
+        stream.users -= 1
+        if stream.users > 0:
+            return
+
+        stream.dispose()
+        if self._streams.get(stream.execution_id) is stream:
+            del self._streams[stream.execution_id]
+
+
+class WorkerExecutionSocketProxy(WorkerWebSocketProxy):
+    """
+    /executions/io socket of non-primary workers.
+    Authorization, input and all the events, except the output, are passed via the primary worker socket.
+    The output is read from the shared output stream of this worker
+    """
+
+    def initialize(self, worker_index=PRIMARY_WORKER_INDEX):
+        super().initialize(worker_index)
+
+        self._writer = None
+        self._execution_id = None
+        self._shared_stream = None  # type: _SharedOutputStream
+        self._upstream_finished = False
+
+    async def open(self, execution_id):
+        self._execution_id = execution_id
+        self._writer = WebSocketWriter(self, tornado.ioloop.IOLoop.current())
+
+        await super().open(execution_id)
+
+    def get_upstream_headers(self):
+        headers = super().get_upstream_headers()
+        headers[SHARED_OUTPUT_HEADER] = 'true'
+        return headers
+
+    async def on_upstream_message(self, message):
+        if _is_shared_output_event(message):
+            self._attach_shared_output()
+            return
+
+        self._writer.write(message)
+
+    def _attach_shared_output(self):
+        if self._shared_stream is not None:
+            return
+
+        shared_output_streams = self.application.shared_output_streams
+        self._shared_stream = shared_output_streams.attach(self._execution_id, self._writer)
+        self._shared_stream.closed_future.add_done_callback(lambda _: self._on_shared_stream_closed())
+
+    def _on_shared_stream_closed(self):
+        stream = self._shared_stream
+        if stream is None:
+            return
+
+        if stream.close_code != 1000:
+            LOGGER.warning('Shared output of #' + self._execution_id + ' is closed with code ' + str(stream.close_code))
+            self.close(code=1011, reason='Output stream is interrupted')
+            return
+
+        if self._upstream_finished:
+            self._writer.close_when_flushed(1000)
+
+    def on_upstream_closed(self, code, reason):
+        if code != 1000:
+            self.close(code=code, reason=reason)
+            return
+
+        # the execution is finished, but the shared stream can be still delivering the output
+        self._upstream_finished = True
+        stream = self._shared_stream
+        if (stream is None) or stream.closed_future.done():
+            self._writer.close_when_flushed(1000)
+
+    def on_close(self):
+        super().on_close()
+
+        if self._shared_stream is not None:
+            self.application.shared_output_streams.detach(self._shared_stream, self._writer)
+
+
+def _is_shared_output_event(message):
+    if not isinstance(message, str):
+        return False
+
+    try:
+        return json.loads(message).get('event') == SHARED_OUTPUT_EVENT
+    except ValueError:
+        return False
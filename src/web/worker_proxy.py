@@ -0,0 +1,388 @@
+import asyncio
+import logging
+import os
+import socket
+from typing import NamedTuple
+
+import tornado.httpclient
+import tornado.httputil
+import tornado.ioloop
+import tornado.netutil
+import tornado.process
+import tornado.queues
+import tornado.simple_httpclient
+import tornado.web
+import tornado.websocket
+from tornado.websocket import WebSocketClosedError
+
+from utils import file_utils
+from web.xheader_app_wrapper import WORKER_REMOTE_IP_HEADER, is_unix_socket_context
+
+LOGGER = logging.getLogger('script_server.worker_proxy')
+
+PRIMARY_WORKER_INDEX = 0
+
+_WORKER_HOST_PREFIX = 'worker-'
+
+# these headers describe a single connection and shouldn't be passed through
+_HOP_BY_HOP_HEADERS = {'Connection', 'Keep-Alive', 'Transfer-Encoding', 'Content-Length', 'Upgrade',
+                       'Proxy-Connection', 'Te', 'Trailer'}
+
+_WEBSOCKET_HEADERS = {'Sec-Websocket-Key', 'Sec-Websocket-Version', 'Sec-Websocket-Extensions',
+                      'Sec-Websocket-Accept', 'Sec-Websocket-Protocol'}
+
+# number of request body chunks, which can wait for sending to the target worker
+_BODY_QUEUE_SIZE = 4
+
+
+class WorkerInfo(NamedTuple):
+    """
+    Describes the current process in the multi-process mode.
+
+    The primary worker owns executions, schedules and the history: they are not shared between the processes,
+    and other workers proxy execution and history requests to the primary worker.
+    Other workers serve everything else (static files, script configs, parameter values, admin endpoints)
+    and execution output websockets: the output is read once per execution from the primary worker
+    and fanned out to the local viewers (see web.shared_output).
+    Each worker listens on a unix socket in sockets_folder, so that workers can proxy requests to each other.
+    """
+    index: int
+    count: int
+    sockets_folder: str
+
+    @property
+    def is_primary(self):
+        return self.index == PRIMARY_WORKER_INDEX
+
+    def get_socket_path(self, index):
+        return os.path.join(self.sockets_folder, _WORKER_HOST_PREFIX + str(index) + '.sock')
+
+
+def fork_workers(count, temp_folder):
+    """
+    Forks count worker processes. Should be called before any IOLoop or thread is created.
+    See WorkerInfo for the responsibilities of the workers.
+    The parent process never returns from this function: it restarts failed workers and exits after all of them.
+    :return: WorkerInfo of the current (forked) process
+    """
+    sockets_folder = os.path.join(temp_folder, 'workers')
+    file_utils.prepare_folder(sockets_folder)
+
+    index = tornado.process.fork_processes(count)
+    return WorkerInfo(index, count, sockets_folder)
+
+
+def get_worker(application):
+    """
+    :return: WorkerInfo or None, if the server runs in a single process
+    """
+    return getattr(application, 'worker', None)
+
+
+def tag_local_id(application, id):
+    """
+    Adds the current worker index to an id of a process-local object,
+    so that requests for this object can be routed to the owning worker
+    """
+    worker = get_worker(application)
+    if worker is None:
+        return id
+
+    return str(worker.index) + '-' + id
+
+
+def find_owner_index(application, tagged_id):
+    """
+    :return: index of the worker, which owns the object or None, if it's the current worker
+    """
+    worker = get_worker(application)
+    if (worker is None) or (not tagged_id):
+        return None
+
+    (index_part, separator, _) = tagged_id.partition('-')
+    if (not separator) or (not index_part.isdigit()):
+        return None
+
+    index = int(index_part)
+    if (index == worker.index) or (index >= worker.count):
+        return None
+
+    return index
+
+
+class _WorkerSocketResolver(tornado.netutil.Resolver):
+    def initialize(self, worker: WorkerInfo):
+        self._worker = worker
+
+    async def resolve(self, host, port, family=socket.AF_UNSPEC):
+        if not host.startswith(_WORKER_HOST_PREFIX):
+            raise IOError('Unknown worker: ' + host)
+
+        index = int(host[len(_WORKER_HOST_PREFIX):])
+        return [(socket.AF_UNIX, self._worker.get_socket_path(index))]
+
+
+_http_clients = {}
+
+
+def _get_http_client(worker: WorkerInfo):
+    client = _http_clients.get(worker)
+    if client is None:
+        client = tornado.simple_httpclient.SimpleAsyncHTTPClient(
+            force_instance=True,
+            resolver=_WorkerSocketResolver(worker=worker))
+        _http_clients[worker] = client
+
+    return client
+
+
+def _build_forwarded_headers(request, excluded_headers):
+    headers = tornado.httputil.HTTPHeaders()
+    for name, value in request.headers.get_all():
+        if name in excluded_headers:
+            continue
+        headers.add(name, value)
+
+    headers[WORKER_REMOTE_IP_HEADER] = request.remote_ip
+    headers['X-Scheme'] = request.protocol
+    return headers
+
+
+def _build_worker_url(scheme, worker_index, uri):
+    return scheme + '://' + _WORKER_HOST_PREFIX + str(worker_index) + uri
+
+
+def is_worker_request(request):
+    """
+    :return: True, if the request is sent by another worker (via the worker unix socket)
+    """
+    return is_unix_socket_context(request.connection.context)
+
+
+def connect_worker_websocket(worker: WorkerInfo, worker_index, uri, headers=None):
+    """
+    :return: future of tornado WebSocketClientConnection to the websocket of another worker
+    """
+    request = tornado.httpclient.HTTPRequest(_build_worker_url('ws', worker_index, uri), headers=headers)
+
+    return tornado.websocket.websocket_connect(request, resolver=_WorkerSocketResolver(worker=worker))
+
+
+async def proxy_request(handler: tornado.web.RequestHandler, worker_index, body=None, body_producer=None):
+    """
+    Passes the request to another worker and streams its response back to the client
+    :param body_producer: see tornado HTTPRequest, used for streaming the request body
+    """
+    request = handler.request
+    worker = get_worker(handler.application)
+
+    if (body is None) and (body_producer is None) and (request.method in ('POST', 'PUT', 'PATCH')):
+        body = b''
+
+    headers = _build_forwarded_headers(request, _HOP_BY_HOP_HEADERS)
+    if (body_producer is not None) and ('Content-Length' in request.headers):
+        # otherwise the body is sent in chunked encoding
+        headers['Content-Length'] = request.headers['Content-Length']
+
+    headers_state = {'headers': tornado.httputil.HTTPHeaders(), 'applied': False}
+
+    def header_callback(line):
+        if line.startswith('HTTP/'):
+            # could be called several times, e.g. for "100 Continue"
+            start_line = tornado.httputil.parse_response_start_line(line.strip())
+            handler.set_status(start_line.code, start_line.reason)
+            headers_state['headers'] = tornado.httputil.HTTPHeaders()
+
+        elif line.strip():
+            headers_state['headers'].parse_line(line)
+
+        elif not headers_state['applied'] and (handler.get_status() != 100):
+            headers_state['applied'] = True
+            _apply_response_headers(handler, headers_state['headers'])
+
+    def streaming_callback(chunk):
+        handler.write(chunk)
+        handler.flush()
+
+    proxied_request = tornado.httpclient.HTTPRequest(
+        _build_worker_url('http', worker_index, request.uri),
+        method=request.method,
+        headers=headers,
+        body=body,
+        body_producer=body_producer,
+        follow_redirects=False,
+        decompress_response=False,
+        allow_nonstandard_methods=True,
+        request_timeout=0,
+        header_callback=header_callback,
+        streaming_callback=streaming_callback)
+
+    try:
+        response = await _get_http_client(worker).fetch(proxied_request, raise_error=False)
+        error = response.error if (response.code == 599) else None
+    except Exception as e:
+        # e.g. the worker socket doesn't exist
+        error = e
+
+    if error is not None:
+        LOGGER.warning('Failed to proxy ' + request.uri + ' to worker #' + str(worker_index) + ': ' + str(error))
+        if not headers_state['applied']:
+            handler.clear()
+            handler.set_status(502)
+            handler.write('Worker #' + str(worker_index) + ' is not available')
+
+
+def _apply_response_headers(handler, headers):
+    for name in headers.keys():
+        handler.clear_header(name)
+
+    for name, value in headers.get_all():
+        if name in _HOP_BY_HOP_HEADERS:
+            continue
+        handler.add_header(name, value)
+
+
+@tornado.web.stream_request_body
+class WorkerProxyHandler(tornado.web.RequestHandler):
+    """
+    Passes requests to the primary worker.
+    Request body is streamed to the target worker, while it's being received, so it's not kept in memory.
+    Authentication, authorization and XSRF checks are done by the target worker
+    """
+    SUPPORTED_METHODS = ('GET', 'HEAD', 'POST', 'DELETE', 'PATCH', 'PUT')
+
+    def initialize(self, worker_index=PRIMARY_WORKER_INDEX):
+        self._worker_index = worker_index
+        self._body_queue = None
+        self._body_aborted = False
+        self._proxy_future = None
+
+    def prepare(self):
+        max_request_size_mb = getattr(self.application, 'max_request_size_mb', None)
+        if max_request_size_mb:
+            self.request.connection.set_max_body_size(max_request_size_mb * 1024 * 1024)
+
+        headers = self.request.headers
+        if ('Content-Length' in headers) or ('Transfer-Encoding' in headers):
+            self._body_queue = tornado.queues.Queue(maxsize=_BODY_QUEUE_SIZE)
+            self._proxy_future = asyncio.ensure_future(
+                proxy_request(self, self._worker_index, body_producer=self._produce_body))
+
+    async def data_received(self, chunk):
+        # the client is not read, until the chunk is taken by the target worker connection
+        await self._put_body_chunk(chunk)
+
+    async def _put_body_chunk(self, chunk):
+        if self._proxy_future.done():
+            # the target worker failed or responded without reading the whole body
+            return
+
+        put_future = self._body_queue.put(chunk)
+        await asyncio.wait([put_future, self._proxy_future], return_when=asyncio.FIRST_COMPLETED)
+
+    async def _produce_body(self, write):
+        while True:
+            chunk = await self._body_queue.get()
+            if self._body_aborted:
+                raise IOError('Client closed the connection')
+
+            if chunk is None:
+                return
+
+            await write(chunk)
+
+    def on_connection_close(self):
+        super().on_connection_close()
+
+        if self._body_queue is not None:
+            self._body_aborted = True
+            if not self._body_queue.full():
+                self._body_queue.put_nowait(None)
+
+    def check_xsrf_cookie(self):
+        pass
+
+    def compute_etag(self):
+        # Etag is passed from the target worker
+        return None
+
+    async def _proxy(self, *args):
+        if self._proxy_future is None:
+            await proxy_request(self, self._worker_index)
+            return
+
+        # end of the body
+        await self._put_body_chunk(None)
+        await self._proxy_future
+
+    get = _proxy
+    head = _proxy
+    post = _proxy
+    delete = _proxy
+    patch = _proxy
+    put = _proxy
+
+
+class WorkerWebSocketProxy(tornado.websocket.WebSocketHandler):
+    """
+    Connects to the same websocket on the primary worker and passes messages in both directions.
+    The next upstream message is read only after the previous one is sent to the client,
+    so a slow client slows down the upstream connection, instead of buffering messages in this worker
+    """
+
+    def initialize(self, worker_index=PRIMARY_WORKER_INDEX):
+        self._worker_index = worker_index
+        self._upstream = None
+        self._closed = False
+
+    def get_upstream_headers(self):
+        return _build_forwarded_headers(self.request, _HOP_BY_HOP_HEADERS | _WEBSOCKET_HEADERS)
+
+    async def open(self, *args):
+        worker = get_worker(self.application)
+
+        try:
+            upstream = await connect_worker_websocket(
+                worker, self._worker_index, self.request.uri, self.get_upstream_headers())
+        except:
+            LOGGER.exception('Failed to connect to worker #' + str(self._worker_index) + ': ' + self.request.uri)
+            self.close(code=1011, reason='Worker is not available')
+            return
+
+        if self._closed:
+            upstream.close()
+            return
+
+        self._upstream = upstream
+        tornado.ioloop.IOLoop.current().add_callback(self._relay_upstream, upstream)
+
+    async def _relay_upstream(self, upstream):
+        while True:
+            message = await upstream.read_message()
+            if message is None:
+                self.on_upstream_closed(upstream.close_code, upstream.close_reason)
+                return
+
+            if self.ws_connection is None:
+                return
+
+            try:
+                await self.on_upstream_message(message)
+            except WebSocketClosedError:
+                return
+
+    async def on_upstream_message(self, message):
+        await self.write_message(message, binary=isinstance(message, bytes))
+
+    def on_upstream_closed(self, code, reason):
+        self.close(code=code, reason=reason)
+
+    def on_message(self, message):
+        if self._upstream is not None:
+            self._upstream.write_message(message, binary=isinstance(message, bytes))
+
+    def on_close(self):
+        self._closed = True
+
+        if self._upstream is not None:
+            self._upstream.close()
@@ -1,5 +1,9 @@
+import socket
 import types
 
+# set by other workers in the multi-process mode, when they proxy requests via unix sockets
+WORKER_REMOTE_IP_HEADER = 'X-Script-Server-Remote-Ip'
+
 
 def _start_request_decorator(func):
     def wrapper(self, *args, **kwargs):
@@ -22,11 +26,21 @@ def _headers_received_decorator(func):
         if proto_header in ('http', 'https'):
             self.request_conn.context.protocol = proto_header
 
+        context = self.request_conn.context
+        if is_unix_socket_context(context):
+            # only local workers can connect to the unix socket, so the header can be trusted
+            context.remote_ip = headers.get(WORKER_REMOTE_IP_HEADER, '0.0.0.0')
+
         return func(start_line, headers, *args, **kwargs)
 
     return wrapper
 
 
+def is_unix_socket_context(context):
+    unix_family = getattr(socket, 'AF_UNIX', None)
+    return (unix_family is not None) and (getattr(context, 'address_family', None) == unix_family)
+
+
 def _decorate(obj, method_name, decorator):
     original_method = getattr(obj, method_name)
     new_method = types.MethodType(decorator(original_method), obj)